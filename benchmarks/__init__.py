@@ -0,0 +1,4 @@
+"""Offline, reproducible benchmarks of the scraper and of the data layer.
+
+The wiki pages are recorded once (or generated) into a fixture set, and replayed by a local HTTP server with
+configurable latency, bandwidth and errors. Run python -m benchmarks --help for the commands."""
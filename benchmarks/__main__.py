@@ -0,0 +1,191 @@
+"""Command line of the benchmarks.
+
+    python -m benchmarks record fixtures/wiki                  Record the wiki's NPC pages once
+    python -m benchmarks synth fixtures/10k --npcs 10000       Generate a synthetic fixture set
+    python -m benchmarks serve fixtures/wiki --latency 0.05    Serve a fixture set in place of the wiki
+    python -m benchmarks serve fixtures/wiki --rate-limit 20   ... which throttles requests beyond 20 per second
+    python -m benchmarks verify --fixtures fixtures/wiki       Check the scraper against a replayed fixture set
+    python -m benchmarks verify --check revalidation           ... running only some of the checks
+    python -m benchmarks run --fixtures fixtures/wiki          Run the benchmark suites
+    python -m benchmarks run --compare quick                   ... and compare them against a saved baseline"""
+
+import sys
+import json
+import argparse
+import tempfile
+
+from scraper.scraping import BASE_URL, DEFAULT_PARSER, PARSERS
+from benchmarks.checks import CHECKS
+from benchmarks.baselines import save_baseline, load_baseline, compare, regressions, print_comparison
+from benchmarks.fixtures import Fixtures, record_wiki, generate_synthetic
+from benchmarks.measure import run_isolated
+from benchmarks.replay import Phase, ReplayServer
+from benchmarks.suites import PROFILES, SUITES, cases
+
+
+def record(args) -> int:
+    fixtures = record_wiki(args.directory, base_url=args.base_url, max_workers=args.workers, parser=args.parser)
+    print(f'Recorded {len(fixtures)} pages of {fixtures.source} into {args.directory}')
+    return 0
+
+
+def synth(args) -> int:
+    template = Fixtures(args.template) if args.template else None
+    fixtures = generate_synthetic(args.directory, args.npcs, seed=args.seed, template=template,
+                                  page_size=args.page_size)
+    print(f'Generated {len(fixtures)} pages into {args.directory}')
+    return 0
+
+
+def serve(args) -> int:
+    server = ReplayServer(Fixtures(args.directory), port=args.port, latency=args.latency, jitter=args.jitter,
+                          bandwidth=args.bandwidth, error_rate=args.error_rate, error_status=args.error_status,
+                          retry_after=args.retry_after, seed=args.seed, rate_limit=args.rate_limit,
+                          capacity=args.capacity, script=[Phase(**phase) for phase in json.loads(args.script)])
+    print(f'Serving {args.directory} on {server.base_url}', flush=True)  # Read by replay_server_process
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def verify(args) -> int:
+    with tempfile.TemporaryDirectory(prefix='npc-fixtures-') as synthetic_dir:
+        fixture_dir = args.fixtures
+        if fixture_dir is None:
+            print(f'Generating {args.npcs} synthetic NPC pages (pass --fixtures to use a recording)...')
+            generate_synthetic(synthetic_dir, args.npcs)
+            fixture_dir = synthetic_dir
+
+        failed = 0
+        for name in args.check or CHECKS:
+            print(f'\n{name}')
+            problems = CHECKS[name](fixture_dir)
+            for problem in problems:
+                print(f'  FAILED: {problem}')
+            print(f'  {"FAILED" if problems else "OK"}')
+            failed += bool(problems)
+
+    if failed:
+        print(f'\n{failed} checks failed.')
+        return 1
+    print('\nAll checks passed.')
+    return 0
+
+
+def _print_results(results):
+    for result in results:
+        metrics = '  '.join(f'{metric}={value:.4g}' for metric, value in result.metrics.items())
+        print(f'  {result.name:<44} {metrics}', flush=True)
+
+
+def run(args) -> int:
+    profile = PROFILES[args.profile]
+    suites = args.suite or SUITES
+
+    with tempfile.TemporaryDirectory(prefix='npc-fixtures-') as synthetic_dir:
+        fixture_dir = args.fixtures
+        if fixture_dir is None:
+            print(f'Generating {profile.fixture_npcs} synthetic NPC pages (pass --fixtures to use a recording)...')
+            generate_synthetic(synthetic_dir, profile.fixture_npcs)
+            fixture_dir = synthetic_dir
+        fixtures_source = Fixtures(fixture_dir).source
+
+        results = []
+        suite = None
+        for case in cases(fixture_dir, profile):
+            if case.suite not in suites:
+                continue
+            if case.suite != suite:
+                suite = case.suite
+                print(f'\n{suite}')
+            try:
+                case_results = run_isolated(case.function, **case.kwargs)
+            except ImportError as exc:  # Optional dependency (e.g. PyQt6 or pyarrow) missing
+                print(f'\nSkipped {case.function.__name__}: {exc}')
+                continue
+            _print_results(case_results)
+            results += case_results
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump([result._asdict() for result in results], file, indent=1)
+    if args.save_baseline:
+        print(f'\nSaved the baseline to {save_baseline(args.save_baseline, results, args.profile, fixtures_source)}')
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        changes = compare(results, baseline)
+        print_comparison(changes, args.threshold, baseline)
+        regressed = regressions(changes, args.threshold)
+        if regressed:
+            print(f'\n{len(regressed)} metrics regressed by more than {args.threshold:.0%}.')
+            return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('record', help='record the wiki pages into a fixture set')
+    command.add_argument('directory')
+    command.add_argument('--base-url', default=BASE_URL, help='wiki base url')
+    command.add_argument('-w', '--workers', type=int, default=4, help='pages downloaded concurrently (default: 4)')
+    command.add_argument('--parser', choices=PARSERS, default=DEFAULT_PARSER, help='HTML parsing backend')
+    command.set_defaults(function=record)
+
+    command = commands.add_parser('synth', help='generate a synthetic fixture set')
+    command.add_argument('directory')
+    command.add_argument('--npcs', type=int, required=True, help='synthetic NPC pages')
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--template', metavar='DIR', help='fixture set whose NPC pages the synthetic ones copy')
+    command.add_argument('--page-size', type=int, default=100_000, help='bytes of generated markup per page')
+    command.set_defaults(function=synth)
+
+    command = commands.add_parser('serve', help='serve a fixture set in place of the wiki')
+    command.add_argument('directory')
+    command.add_argument('--port', type=int, default=0, help='port (default: any free port)')
+    command.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    command.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds, at random')
+    command.add_argument('--bandwidth', type=float, help='bytes per second per connection (default: unlimited)')
+    command.add_argument('--error-rate', type=float, default=0.0, help='fraction of the requests answered with errors')
+    command.add_argument('--error-status', type=int, default=503, help='status of the errors (default: 503)')
+    command.add_argument('--retry-after', type=int, default=0, help='Retry-After seconds of the errors and 429s')
+    command.add_argument('--rate-limit', type=float, help='requests per second served, the others get 429s')
+    command.add_argument('--capacity', type=int, help='requests served at once, the others queue')
+    command.add_argument('--script', default='[]',
+                         help='JSON list of phases changing the latency, rate_limit and capacity over time, e.g. '
+                              '\'[{"duration": 5, "rate_limit": 10}, {"duration": 5, "latency": 0.3}]\'')
+    command.add_argument('--seed', type=int, default=0)
+    command.set_defaults(function=serve)
+
+    command = commands.add_parser('verify', help='check the scraper against a replayed fixture set: that every '
+                                                 'source scrapes the same NPCs, that each page is fetched once, '
+                                                 'that cached pages are revalidated and that killed scrapes resume')
+    command.add_argument('--fixtures', metavar='DIR', help='fixture set (default: a generated synthetic one)')
+    command.add_argument('--check', action='append', choices=CHECKS, help='only run this check (repeatable)')
+    command.add_argument('--npcs', type=int, default=300, help='synthetic NPC pages (default: 300)')
+    command.set_defaults(function=verify)
+
+    command = commands.add_parser('run', help='run the benchmark suites')
+    command.add_argument('--fixtures', metavar='DIR', help='fixture set (default: a generated synthetic one)')
+    command.add_argument('--profile', choices=PROFILES, default='quick', help='sizes and repetitions')
+    command.add_argument('--suite', action='append', choices=SUITES, help='only run this suite (repeatable)')
+    command.add_argument('--output', metavar='FILE', help='write the results to a JSON file')
+    command.add_argument('--save-baseline', metavar='NAME', help='save the results as a named baseline')
+    command.add_argument('--compare', metavar='NAME', help='compare the results against a named baseline')
+    command.add_argument('--threshold', type=float, default=0.2,
+                         help='slowdown flagged as a regression (default: 0.2, i.e. 20%%)')
+    command.set_defaults(function=run)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.function(args)
+    except RuntimeError as exc:
+        print(f'Error: {exc}', file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
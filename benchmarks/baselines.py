@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import platform
+import datetime
+from typing import List, NamedTuple
+
+from benchmarks.measure import Result
+
+
+# Directory of the saved baselines, one <name>.json file each
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# Metrics that describe a case rather than measure it, never compared
+_INFORMATIVE_METRICS = {'npcs', 'failed_pages', 'retries', 'throttled', 'efficiency'}
+
+
+class Change(NamedTuple):
+    """The change of one metric of one case against the baseline. ratio > 1 is a slowdown (or a growth in size), for
+    every metric, whichever direction is better."""
+    suite: str
+    name: str
+    metric: str
+    baseline: float
+    current: float
+    ratio: float
+
+
+def _baseline_path(name: str) -> str:
+    return name if name.endswith('.json') else os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def machine_info() -> dict:
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+
+def save_baseline(name: str, results: List[Result], profile: str, fixtures_source: str) -> str:
+    """Save the results as the named baseline (or to the passed .json path) and return its path."""
+
+    path = _baseline_path(name)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    baseline = {'profile': profile, 'fixtures': fixtures_source, 'machine': machine_info(),
+                'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'results': [result._asdict() for result in results]}
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(baseline, file, indent=1)
+    return path
+
+
+def load_baseline(name: str) -> dict:
+    path = _baseline_path(name)
+    if not os.path.exists(path):
+        raise RuntimeError(f'No baseline named {name} ({path}).')
+    with open(path, encoding='utf-8') as file:
+        baseline = json.load(file)
+    baseline['results'] = [Result(**result) for result in baseline['results']]
+    return baseline
+
+
+def compare(results: List[Result], baseline: dict) -> List[Change]:
+    """Return the change of every metric of the results that the baseline also has."""
+
+    baseline_metrics = {(result.suite, result.name): result.metrics for result in baseline['results']}
+    changes = []
+    for result in results:
+        for metric, current in result.metrics.items():
+            previous = baseline_metrics.get((result.suite, result.name), {}).get(metric)
+            if previous is None or metric in _INFORMATIVE_METRICS or not previous or not current:
+                continue
+            ratio = previous / current if metric.endswith('_per_s') else current / previous
+            changes.append(Change(result.suite, result.name, metric, previous, current, ratio))
+    return changes
+
+
+def regressions(changes: List[Change], threshold: float) -> List[Change]:
+    """The changes that are slowdowns (or growths) by more than the threshold (0.2 for 20%)."""
+    return [change for change in changes if change.ratio > 1 + threshold]
+
+
+def print_comparison(changes: List[Change], threshold: float, baseline: dict, stream=sys.stdout):
+    """Print the changes of the throughput, p99 and memory metrics, flagging the regressions."""
+
+    machine = baseline['machine']
+    if machine != machine_info():
+        print(f"Note: the baseline was recorded on another machine ({machine['platform']}, Python "
+              f"{machine['python']}, {machine['cpus']} CPUs); expect differences.", file=stream)
+
+    print(f"\n{'Case':<56} {'Metric':<16} {'Baseline':>10} {'Current':>10} {'Change':>8}", file=stream)
+    for change in changes:
+        if not change.metric.endswith(('_per_s', 'p99_ms', '_mb')):
+            continue
+        flag = '  REGRESSION' if change.ratio > 1 + threshold else ''
+        print(f'{change.suite + ": " + change.name:<56.56} {change.metric:<16} {change.baseline:>10.4g} '
+              f'{change.current:>10.4g} {(1 / change.ratio - 1) * 100:>+7.1f}%{flag}', file=stream)
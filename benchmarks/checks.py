@@ -0,0 +1,230 @@
+import os
+import time
+import signal
+import tempfile
+import multiprocessing
+from collections import Counter
+from contextlib import redirect_stdout
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from scraper.http_cache import DEFAULT_CACHE_TTL, ResponseCache
+from scraper.http_client import HttpClient
+from scraper.instrumentation import Tracer, COUNTER_BYTES_DOWNLOADED, COUNTER_REQUESTS
+from scraper.journal import CrawlJournal
+from scraper.scraping import DEFAULT_SOURCE, PARSER_LXML_STREAM, SOURCES, SOURCE_HTML, PAGE_RESUMED, \
+    read_terraria_wiki
+from benchmarks.fixtures import Fixtures
+from benchmarks.replay import ReplayServer, replay_server_process
+
+
+def _scrape(base_url: str, source: str = DEFAULT_SOURCE, cache: Optional[ResponseCache] = None, offline: bool = False,
+            **kwargs):
+    """Scrape the replay server from one source, without any cache unless one is passed, passing kwargs on to
+    read_terraria_wiki. Returns the NPCs, the tracer and the PageResults of the run. The scraper's report of its steps
+    is silenced."""
+
+    tracer = Tracer()
+    client = HttpClient(tracer=tracer, cache=cache, offline=offline)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        try:
+            pages = read_terraria_wiki(base_url, client=client, incremental=False, tracer=tracer, source=source,
+                                       **kwargs)
+            next(pages)
+            results = []
+            while True:
+                try:
+                    results.append(next(pages))
+                except StopIteration as stop:
+                    return stop.value, tracer, results
+        finally:
+            client.close()
+
+
+def check_sources(fixture_dir: str) -> List[str]:
+    """Scrape the fixtures from every source, and check that they yield the same NPCs."""
+
+    records = {}
+    with replay_server_process(fixture_dir) as base_url:
+        for source in SOURCES:
+            npcs, tracer, _ = _scrape(base_url, source)
+            records[source] = [npc.record for npc in npcs]
+            print(f'  {source}: {len(npcs)} NPCs, {tracer.counters.get(COUNTER_REQUESTS, 0)} requests, '
+                  f'{tracer.counters.get(COUNTER_BYTES_DOWNLOADED, 0) / 2 ** 20:.2f} MB downloaded')
+
+    (reference_source, reference), *others = records.items()
+    problems = []
+    for source, source_records in others:
+        if len(source_records) != len(reference):
+            problems.append(f'{source}: {len(source_records)} NPCs, {reference_source}: {len(reference)}')
+        for record, reference_record in zip(source_records, reference):
+            if record != reference_record:
+                problems.append(f'{source}: {record.name} differs from {reference_source} ({reference_record.name})')
+    return problems
+
+
+def _requests(server: ReplayServer) -> Counter:
+    """The requests the server answered, by (method, page key)."""
+    requests = Counter()
+    for (method, key, _), count in server.response_counts().items():
+        requests[method, key] += count
+    return requests
+
+
+def _examples(items) -> str:
+    items = sorted(items)
+    return ', '.join(map(str, items[:3])) + (f' and {len(items) - 3} more' if len(items) > 3 else '')
+
+
+def check_single_fetch(fixture_dir: str) -> List[str]:
+    """Scrape the web pages of the fixtures in each scraping mode, and check that every page is requested exactly
+    once, with a GET, and that the run counts each of those requests."""
+
+    fixtures = Fixtures(fixture_dir)
+    expected = Counter({('GET', key): 1 for key in fixtures.pages})
+    modes = {'serial': {},
+             '4 workers, lxml-stream parser': dict(max_workers=4, parser=PARSER_LXML_STREAM),
+             '4 workers, 2 parser processes': dict(max_workers=4, parse_processes=2)}
+
+    problems = []
+    for mode, kwargs in modes.items():
+        with ReplayServer(fixtures) as server:
+            npcs, tracer, _ = _scrape(server.base_url, SOURCE_HTML, **kwargs)
+        requests = _requests(server)
+        counted = tracer.counters.get(COUNTER_REQUESTS, 0)
+        print(f'  {mode}: {len(npcs)} NPCs, {sum(requests.values())} requests ({counted} counted) for '
+              f'{len(fixtures)} pages')
+
+        repeated = [key for (method, key), count in requests.items() if count > 1]
+        missing = [key for method, key in expected if (method, key) not in requests]
+        unexpected = [f'{method} {key}' for method, key in requests if (method, key) not in expected]
+        if repeated:
+            problems.append(f'{mode}: {len(repeated)} pages requested more than once: {_examples(repeated)}')
+        if missing:
+            problems.append(f'{mode}: {len(missing)} pages never requested: {_examples(missing)}')
+        if unexpected:
+            problems.append(f'{mode}: unexpected requests: {_examples(unexpected)}')
+        if counted != sum(requests.values()):
+            problems.append(f'{mode}: {counted} requests counted, {sum(requests.values())} served')
+    return problems
+
+
+def check_revalidation(fixture_dir: str) -> List[str]:
+    """Scrape the fixtures from every source through a response cache, cold, warm, once the cache expired, after an
+    edit of one page (web pages only) and offline, and check which requests were downloaded (200) or revalidated
+    (304) by each run."""
+
+    fixtures = Fixtures(fixture_dir)
+    edited = fixtures.npc_keys[0]
+    runs = [  # Label, cache TTL, offline, expected (200, 304) responses from the requests of a cold run
+        ('cold cache', DEFAULT_CACHE_TTL, False, lambda requests: (requests, 0)),
+        ('warm cache', DEFAULT_CACHE_TTL, False, lambda requests: (0, 0)),
+        ('expired cache', 0, False, lambda requests: (0, requests)),
+        (f'expired cache, {edited} edited', 0, False, lambda requests: (1, requests - 1)),
+        ('offline', 0, True, lambda requests: (0, 0)),
+    ]
+
+    problems = []
+    for source in SOURCES:
+        print(f'  {source}:')
+        # A cold scrape of the web pages requests every page; the API requests depend on the batches, and the edit
+        # only changes the ETag of a web page, so it is only checked for the web pages
+        cold_requests = len(fixtures) if source == SOURCE_HTML else None
+        reference = None
+        with tempfile.TemporaryDirectory(prefix='npc-cache-') as cache_dir, ReplayServer(fixtures) as server:
+            for label, ttl, offline, expected in runs:
+                if label.endswith('edited'):
+                    if source != SOURCE_HTML:
+                        continue
+                    server.fixtures.pages[edited] = {**fixtures.pages[edited], 'etag': '"edited"'}
+                before = server.response_counts()
+                npcs, tracer, _ = _scrape(server.base_url, source, cache=ResponseCache(cache_dir, ttl=ttl),
+                                          offline=offline)
+                statuses = Counter()
+                for (_, _, status), count in (server.response_counts() - before).items():
+                    statuses[status] += count
+                print(f'    {label}: {statuses[200]} x 200, {statuses[304]} x 304, '
+                      f'{tracer.counters.get(COUNTER_BYTES_DOWNLOADED, 0) / 2 ** 20:.2f} MB downloaded')
+
+                if cold_requests is None:
+                    cold_requests = statuses[200]
+                expected_ok, expected_not_modified = expected(cold_requests)
+                if (statuses[200], statuses[304]) != (expected_ok, expected_not_modified):
+                    problems.append(f'{source}, {label}: {statuses[200]} x 200 and {statuses[304]} x 304, expected '
+                                    f'{expected_ok} x 200 and {expected_not_modified} x 304')
+                if sum(statuses.values()) != statuses[200] + statuses[304]:
+                    problems.append(f'{source}, {label}: unexpected responses: {dict(statuses)}')
+                records = [npc.record for npc in npcs]
+                reference = records if reference is None else reference
+                if records != reference:
+                    problems.append(f'{source}, {label}: the NPCs differ from those of the cold run')
+    return problems
+
+
+def _journaled_scrape(base_url: str, journal_path: str, kwargs: dict):
+    """Scrape the replay server into a crawl journal (in a process check_resume() kills partway)."""
+    _scrape(base_url, SOURCE_HTML, journal=CrawlJournal(journal_path), **kwargs)
+
+
+def check_resume(fixture_dir: str) -> List[str]:
+    """Kill the process of a journaled scrape of the web pages of the fixtures once it requested half of the NPC
+    pages, resume it, and check that the resumed run only requests the pages the killed one did not journal, yields
+    the journaled ones as resumed, returns the NPCs of an uninterrupted scrape and deletes the journal."""
+
+    fixtures = Fixtures(fixture_dir)
+    npc_keys = fixtures.npc_keys
+    context = multiprocessing.get_context('spawn')
+    modes = {'serial': {}, '4 workers': dict(max_workers=4)}
+
+    with ReplayServer(fixtures) as server:
+        reference = [npc.record for npc in _scrape(server.base_url, SOURCE_HTML)[0]]
+
+    problems = []
+    with tempfile.TemporaryDirectory(prefix='npc-journal-') as journal_dir:
+        for mode, kwargs in modes.items():
+            journal_path = os.path.join(journal_dir, 'crawl.journal')
+
+            with ReplayServer(fixtures, latency=0.01) as server:  # Pages take long enough for the kill to come partway
+                base_url = server.base_url
+                process = context.Process(target=_journaled_scrape, args=(base_url, journal_path, kwargs))
+                process.start()
+                try:
+                    deadline = time.monotonic() + 60
+                    while process.is_alive() and time.monotonic() < deadline:
+                        if sum(_requests(server)[('GET', key)] for key in npc_keys) >= len(npc_keys) // 2:
+                            break
+                        time.sleep(0.005)
+                finally:
+                    process.kill()
+                    process.join()
+            if process.exitcode != -signal.SIGKILL:
+                problems.append(f'{mode}: the scrape was not killed partway (exit code {process.exitcode})')
+                continue
+
+            # A new server on the same port (the journal is kept for the same base url), so that the requests the
+            # killed process left in flight are not counted as requests of the resumed run
+            with ReplayServer(fixtures, port=urlsplit(base_url).port) as server:
+                npcs, _, results = _scrape(base_url, SOURCE_HTML, journal=CrawlJournal(journal_path), **kwargs)
+                requested = _requests(server)
+            resumed = {npc_keys[result.index] for result in results if result.status == PAGE_RESUMED}
+            expected = Counter({('GET', key): 1 for key in fixtures.pages if key not in resumed})
+            print(f'  {mode}: killed, then resumed {len(resumed)} of {len(npc_keys)} NPC pages with '
+                  f'{sum(requested.values())} requests')
+
+            if not 0 < len(resumed) < len(npc_keys):
+                problems.append(f'{mode}: {len(resumed)} of {len(npc_keys)} pages resumed')
+            if requested != expected:
+                again = [key for method, key in requested if key in resumed]
+                problems.append(f'{mode}: {sum(requested.values())} requests, expected '
+                                f'{sum(expected.values())} (one per page not journaled)' +
+                                (f'; journaled pages requested again: {_examples(again)}' if again else ''))
+            if [npc.record for npc in npcs] != reference:
+                problems.append(f'{mode}: the resumed NPCs differ from those of an uninterrupted scrape')
+            if os.path.exists(journal_path):
+                problems.append(f'{mode}: the journal was kept after the resumed run completed')
+    return problems
+
+
+# The checks of the verify command, by name
+CHECKS = {'sources': check_sources, 'single-fetch': check_single_fetch, 'revalidation': check_revalidation,
+          'resume': check_resume}
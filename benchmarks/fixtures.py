@@ -0,0 +1,252 @@
+import os
+import re
+import json
+import random
+import hashlib
+import datetime
+from html import escape
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pandas import DataFrame
+
+from terraria.npcs import NPC, PreferenceStore
+from scraper.http_client import HttpClient
+from scraper.scraping import BASE_URL, NPCS_URL, DEFAULT_PARSER, find_npc_urls
+
+
+MANIFEST = 'manifest.json'
+FIXTURES_VERSION = 1
+
+# Biomes the synthetic NPCs pick their preferences from
+SYNTHETIC_BIOMES = ('Forest', 'Hallow', 'Underground', 'Desert', 'Snow', 'Jungle', 'Ocean', 'Mushroom')
+
+# Syllables of the synthetic NPC names. Names are capitalized single words, so that glued cell values split the way
+# they do on the wiki (e.g. 'BakoriMunate' -> 'Bakori, Munate').
+_SYLLABLES = ('ba', 'ko', 'ri', 'mu', 'te', 'lo', 'shi', 'na', 'vo', 'ze', 'pa', 'du')
+
+
+def wiki_path(title: str) -> str:
+    """The path of a wiki page under wiki/, as the wiki links it (spaces become underscores)."""
+    return escape(title.replace(' ', '_'))
+
+
+def page_key(path: str) -> str:
+    """The key of a page in a fixture set: its url path relative to the wiki's base url, without leading slashes."""
+    return path.split('?', 1)[0].lstrip('/')
+
+
+class Fixtures:
+    """A set of recorded (or synthetic) wiki pages on disk: the wiki/NPCs index page and every NPC page it links to.
+
+    The directory holds a manifest.json, mapping the key of each page (see page_key()) to the file holding its body,
+    its content type and an ETag, plus a pages/ directory with the bodies."""
+
+    def __init__(self, fixture_dir: str):
+        self.fixture_dir = fixture_dir
+        with open(os.path.join(fixture_dir, MANIFEST), encoding='utf-8') as file:
+            manifest = json.load(file)
+        if manifest.get('version') != FIXTURES_VERSION:
+            raise RuntimeError(f'Unsupported fixtures version in {fixture_dir}.')
+        self.source = manifest['source']
+        self.created = manifest['created']
+        self.pages: Dict[str, dict] = manifest['pages']  # key -> {'file', 'content_type', 'etag'}, in wiki order
+
+    def __len__(self):
+        return len(self.pages)
+
+    @property
+    def npc_keys(self) -> List[str]:
+        """The keys of the NPC pages, in the order of the NPCs on the index page."""
+        return [key for key in self.pages if key != NPCS_URL]
+
+    def content(self, key: str) -> bytes:
+        with open(os.path.join(self.fixture_dir, self.pages[key]['file']), 'rb') as file:
+            return file.read()
+
+    def npc_pages(self) -> List[Tuple[str, bytes]]:
+        """Return the (key, body) of every NPC page."""
+        return [(key, self.content(key)) for key in self.npc_keys]
+
+
+class FixtureWriter:
+    """Writes the pages of a new fixture set. Call close() once every page has been added."""
+
+    def __init__(self, fixture_dir: str, source: str):
+        self.fixture_dir = fixture_dir
+        self.source = source
+        self.pages = {}
+        os.makedirs(os.path.join(fixture_dir, 'pages'), exist_ok=True)
+
+    def add(self, path: str, content: bytes, content_type: str = 'text/html; charset=utf-8'):
+        key = page_key(path)
+        digest = hashlib.sha256(content).hexdigest()
+        file = f'pages/{digest[:32]}.html'
+        with open(os.path.join(self.fixture_dir, file), 'wb') as out:
+            out.write(content)
+        self.pages[key] = {'file': file, 'content_type': content_type, 'etag': f'"{digest[:32]}"'}
+
+    def close(self) -> Fixtures:
+        manifest = {'version': FIXTURES_VERSION, 'source': self.source,
+                    'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                    'pages': self.pages}
+        with open(os.path.join(self.fixture_dir, MANIFEST), 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=1)
+        return Fixtures(self.fixture_dir)
+
+
+def record_wiki(fixture_dir: str, base_url: str = BASE_URL, max_workers: int = 4,
+                parser: str = DEFAULT_PARSER) -> Fixtures:
+    """Download the wiki/NPCs index page and every NPC page it links to once, and save them as a fixture set."""
+
+    client = HttpClient(max_connections_per_host=max_workers)  # No cache: record what the wiki serves right now
+
+    def fetch(path: str):
+        response = client.get(base_url + path)
+        response.raise_for_status()
+        return response
+
+    try:
+        index = fetch(NPCS_URL)
+        npc_urls = find_npc_urls(index, parser)
+        if npc_urls is None:
+            raise RuntimeError(f'No NPC links found on {base_url + NPCS_URL}.')
+
+        writer = FixtureWriter(fixture_dir, source=base_url)
+        writer.add(NPCS_URL, index.content, index.headers.get('Content-Type', 'text/html'))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for npc_url, page in zip(npc_urls, executor.map(fetch, npc_urls)):
+                writer.add(npc_url, page.content, page.headers.get('Content-Type', 'text/html'))
+        return writer.close()
+    finally:
+        client.close()
+
+
+def synthetic_names(count: int) -> List[str]:
+    """Return count distinct, capitalized single word NPC names."""
+
+    names = []
+    for i in range(count):
+        syllables, i = [], i + len(_SYLLABLES)  # Start at two syllables
+        while i:
+            i, digit = divmod(i, len(_SYLLABLES))
+            syllables.append(_SYLLABLES[digit])
+        names.append(''.join(syllables).capitalize())
+    return names
+
+
+def synthetic_preferences(names: Sequence[str], seed: int = 0) -> Dict[str, Dict[str, Tuple[List[str], List[str]]]]:
+    """Pick the living preferences of every named NPC: name -> {liking level: (biomes, neighbors)}. Like on the wiki,
+    each NPC loves or likes a couple of biomes and neighbors, and dislikes or hates a couple of others."""
+
+    rng = random.Random(seed)
+    preferences = {}
+    for name in names:
+        biomes = rng.sample(SYNTHETIC_BIOMES, 3)
+        candidates = rng.sample(names, min(7, len(names)))
+        neighbors = [other for other in candidates if other != name][:6]
+        preferences[name] = {
+            'Loves': ([], neighbors[:1]),
+            'Likes': (biomes[:1], neighbors[1:3]),
+            'Dislikes': (biomes[1:2], neighbors[3:5]),
+            'Hates': (biomes[2:3] if rng.random() < 0.5 else [], neighbors[5:6]),
+        }
+    return preferences
+
+
+def synthetic_tables(count: int, seed: int = 0) -> List[Tuple[str, DataFrame]]:
+    """Return the (name, normalized living preferences table) of count synthetic NPCs, without any HTML, for the
+    benchmarks of the in-memory stages."""
+
+    names = synthetic_names(count)
+    tables = []
+    for name, levels in synthetic_preferences(names, seed).items():
+        data = {'Biome': [', '.join(biomes) or NPC.not_available for biomes, _ in levels.values()],
+                'Neighbor': [', '.join(neighbors) or NPC.not_available for _, neighbors in levels.values()]}
+        tables.append((name, DataFrame(data, index=list(levels), dtype=object)))
+    return tables
+
+
+def synthetic_npcs(count: int, seed: int = 0) -> List[NPC]:
+    store = PreferenceStore()  # Shared by the NPCs, like the NPCs of a scrape
+    return [NPC(name, table, store=store) for name, table in synthetic_tables(count, seed)]
+
+
+def _cell_html(values: Sequence[str]) -> str:
+    # The wiki separates the linked values of a cell with zero width spaces only, so they come out glued together
+    return '\u200b'.join(f'<a href="/wiki/{wiki_path(value)}" title="{escape(value)}">{escape(value)}</a>'
+                         for value in values)
+
+
+def _table_html(levels: Dict[str, Tuple[List[str], List[str]]]) -> str:
+    rows = ''.join(f'<tr><th>{level}</th><td>{_cell_html(biomes)}</td><td>{_cell_html(neighbors)}</td></tr>'
+                   for level, (biomes, neighbors) in levels.items())
+    return (f'<table class="terraria living-preferences"><tbody><tr><th></th><th>Biome</th><th>Neighbor</th></tr>'
+            f'{rows}</tbody></table>')
+
+
+def _filler(rng: random.Random, size: int) -> str:
+    """Article-like markup of about size characters."""
+
+    paragraphs = []
+    while size > 0:
+        words = ' '.join(rng.choice(_SYLLABLES) * rng.randint(1, 3) for _ in range(rng.randint(40, 120)))
+        paragraph = f'<p>{words} <a href="/wiki/Item_{rng.randint(0, 9999)}">link</a>.</p>\n'
+        paragraphs.append(paragraph)
+        size -= len(paragraph)
+    return ''.join(paragraphs)
+
+
+def _npc_page_html(name: str, table: str, rng: random.Random, page_size: int) -> bytes:
+    # The preferences table sits about 40% into the article, like on the wiki
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{escape(name)} | Terraria Wiki</title></head>'
+            f'<body><h1 id="firstHeading" class="page-header__title">{escape(name)}</h1>'
+            f'<div class="mw-parser-output">{_filler(rng, page_size * 2 // 5)}{table}'
+            f'{_filler(rng, page_size * 3 // 5)}</div></body></html>').encode('utf-8')
+
+
+def _index_html(names: Sequence[str]) -> bytes:
+    links = ''.join(f'<div class="i"><a href="/wiki/{wiki_path(name)}" title="{escape(name)}">{escape(name)}</a></div>'
+                    for name in names)
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>NPCs | Terraria Wiki</title></head><body>'
+            f'<div class="infobox"><div class="title">NPCs</div><div class="npcs">{links}</div></div>'
+            f'</body></html>').encode('utf-8')
+
+
+_HEADING = re.compile(r'(<h1[^>]*id="firstHeading"[^>]*>).*?(</h1>)', re.DOTALL)
+_TABLE = re.compile(r'<table class="terraria living-preferences".*?</table>', re.DOTALL)
+
+
+def generate_synthetic(fixture_dir: str, npc_count: int, seed: int = 0, template: Optional[Fixtures] = None,
+                       page_size: int = 100_000) -> Fixtures:
+    """Generate a fixture set of npc_count synthetic NPC pages (plus the index linking to them), to benchmark the
+    scraper at scales the wiki does not have.
+
+    The NPCs without living preferences on the wiki are included once each, with pages without a preferences table.
+    NPC pages are about page_size bytes of generated markup, or, with a template fixture set (e.g. a recording), copies
+    of its NPC pages with the heading and the preferences table replaced."""
+
+    rng = random.Random(seed)
+    names = synthetic_names(npc_count)
+    preferences = synthetic_preferences(names, seed)
+    no_preferences = list(NPC.npcs_with_no_living_preferences())
+
+    templates = []
+    if template is not None:
+        templates = [page.decode('utf-8') for _, page in template.npc_pages()]
+        templates = [page for page in templates if _HEADING.search(page) and _TABLE.search(page)]
+        if not templates:
+            raise RuntimeError('The template fixtures have no NPC page with a preferences table.')
+
+    writer = FixtureWriter(fixture_dir, source=f'synthetic:{npc_count}:{seed}')
+    writer.add(NPCS_URL, _index_html(names + no_preferences))
+    for i, name in enumerate(names + no_preferences):
+        table = _table_html(preferences[name]) if name in preferences else ''
+        if templates:
+            page = templates[i % len(templates)]
+            page = _HEADING.sub(lambda match: f'{match.group(1)}{escape(name)}{match.group(2)}', page, count=1)
+            page = _TABLE.sub(lambda match: table, page, count=1).encode('utf-8')
+        else:
+            page = _npc_page_html(name, table, rng, page_size)
+        writer.add(f'wiki/{name.replace(" ", "_")}', page)
+    return writer.close()
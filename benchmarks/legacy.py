@@ -0,0 +1,81 @@
+"""Reference copies of implementations the scraper has since replaced, kept to benchmark the replacements against.
+Not used by the application."""
+
+import math
+import re
+from typing import Iterable, Optional
+
+from pandas import DataFrame
+
+
+def legacy_clean(table: DataFrame) -> DataFrame:
+    """The per-cell .loc cleanup loop the parser used before normalize_preferences."""
+
+    preferences = table.copy()
+    first_col = preferences.loc[:, preferences.columns[0]]
+    preferences.rename(mapper={k: v for k, v in zip(preferences.index, first_col)}, inplace=True)
+    del preferences[preferences.columns[0]]
+
+    for i in preferences.index:
+        for j in preferences.columns:
+            item = preferences.loc[i, j]
+            if type(item) is float and math.isnan(item):
+                preferences.loc[i, j] = 'N/A'
+            elif type(item) is str:
+                formatted = item.replace('\u200b', '').strip()
+                formatted = re.sub(r"([a-z])([A-Z])", r'\1, \2', formatted)
+                preferences.loc[i, j] = formatted
+    return preferences
+
+
+class LegacyNPC:
+    """The NPC class before the compact preference store: it keeps its DataFrame, and every accessor scans it."""
+
+    def __init__(self, name: str, living_preferences: Optional[DataFrame] = None):
+        self.name = name
+        self.living_preferences = living_preferences
+
+    def _first(self, column: str, levels):
+        for level in levels:
+            cell = self.living_preferences[column][level]
+            if cell != 'N/A':
+                return [s.strip() for s in cell.split(', ')]
+        return ['N/A']
+
+    @property
+    def favorite_biomes(self):
+        if self.living_preferences is None:
+            return ['N/A']
+        return self._first('Biome', list(self.living_preferences.index))
+
+    @property
+    def favorite_neighbors(self):
+        if self.living_preferences is None:
+            return ['N/A']
+        return self._first('Neighbor', list(self.living_preferences.index))
+
+    @property
+    def least_favorite_biomes(self):
+        if self.living_preferences is None:
+            return ['N/A']
+        return self._first('Biome', reversed(list(self.living_preferences.index)))
+
+    @property
+    def least_favorite_neighbors(self):
+        if self.living_preferences is None:
+            return ['N/A']
+        return self._first('Neighbor', reversed(list(self.living_preferences.index)))
+
+
+def legacy_stats(npcs: Iterable) -> dict:
+    """The dictionary counting loops AppWindow.generate_stats used before PreferenceStats."""
+
+    counts = {'favorite_biomes': {}, 'favorite_neighbors': {}, 'least_favorite_biomes': {},
+              'least_favorite_neighbors': {}}
+    for npc in npcs:
+        for accessor, accessor_counts in counts.items():
+            for value in getattr(npc, accessor):
+                if value not in accessor_counts.keys():
+                    accessor_counts[value] = 0
+                accessor_counts[value] += 1
+    return counts
@@ -0,0 +1,77 @@
+"""Reference copies of the tables screen the GUI has since replaced, kept to benchmark the replacement against. Not used
+by the application. Requires PyQt6."""
+
+from typing import Iterable
+
+from pandas import DataFrame
+from PyQt6 import QtWidgets
+from PyQt6.QtCore import Qt, QAbstractTableModel
+from PyQt6.QtWidgets import QWidget, QTableView, QLabel, QGridLayout
+
+from gui_lib.quick_layouts import QuickVBox
+
+
+class LegacyDataFrameTableModel(QAbstractTableModel):
+    """The table model of every NPC table before GroupedTableModel: it adapts the NPC's DataFrame, and indexes it on
+    every data() call."""
+
+    def __init__(self, df: DataFrame):
+        super().__init__()
+        self._df = df
+
+    def rowCount(self, parent=None):
+        return self._df.shape[0]
+
+    def columnCount(self, parent=None):
+        return self._df.shape[1]
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if index.isValid():
+            if role in {Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole}:
+                return str(self._df.iloc[index.row(), index.column()])
+        return None
+
+    def headerData(self, col, orientation, role):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self._df.columns[col]
+        elif orientation == Qt.Orientation.Vertical and role == Qt.ItemDataRole.DisplayRole:
+            return self._df.index[col]
+        else:
+            return None
+
+
+class LegacyTableScreen(QWidget):
+    """The tables screen before the single grouped view: a label and a table view per NPC, in a three column grid."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+
+        self.tables_count = 0  # The amount of currently displayed tables
+        self.grid = QGridLayout(self)
+        self.grid.setSpacing(15)
+        self.grid.setContentsMargins(30, 0, 30, 0)
+
+    def add_table(self, table_title: str, table_model: QAbstractTableModel):
+        """Add a table to be displayed in this view."""
+
+        label = QLabel(table_title, self)  # Create a table name label
+        table = QTableView(self)  # Create a table view
+        table.setModel(table_model)  # Assign the table model to the table view
+        table.setMinimumSize(300, 200)  # Restrict minimum size
+        table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Stretch)  # Allow column stretch
+
+        # Add to layout
+        i = self.tables_count // 3  # Determine row position
+        j = self.tables_count % 3  # Determine col position
+        self.grid.addLayout(QuickVBox().add(label, table), i, j)  # Add to grid layout
+        self.tables_count += 1  # Increment amount of tables we are currently displaying
+
+
+def legacy_populate_tables_screen(screen: LegacyTableScreen, npcs: Iterable):
+    """The way the GUI filled the tables screen: a DataFrame model per NPC, added one after the other."""
+
+    for npc in npcs:
+        # Get the npc's living preferences data frame if there is one, or create a dummy empty data frame
+        df = npc.living_preferences if npc.living_preferences is not None else DataFrame()
+        table_model = LegacyDataFrameTableModel(df)  # Create a table model from the data frame
+        screen.add_table(npc.name, table_model)  # Add the table to the tables screen
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Result(NamedTuple):
+    """The metrics of one benchmark case. Metric names ending in '_per_s' are better when higher, all others (times in
+    milliseconds, sizes in MB) when lower."""
+    suite: str
+    name: str
+    metrics: Dict[str, float]
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """The q-th percentile (0-100) of the values, by the nearest rank."""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q / 100), len(ordered) - 1)]
+
+
+def timing_metrics(samples: Sequence[float], unit: str = 'items', items: Optional[int] = None) -> Dict[str, float]:
+    """Summarize per call timings (in seconds) into p50, p99 and mean latencies and a throughput in units per second.
+    items is the amount of units processed by all the samples together (one per sample by default)."""
+
+    total = sum(samples)
+    items = len(samples) if items is None else items
+    return {'p50_ms': percentile(samples, 50) * 1000, 'p99_ms': percentile(samples, 99) * 1000,
+            'mean_ms': total / len(samples) * 1000, f'{unit}_per_s': items / total if total else float('inf')}
+
+
+def time_calls(function: Callable, arguments: Sequence = (None,), repeat: int = 1, warmup: bool = True) -> List[float]:
+    """Call the function once per argument (without an argument for None), repeat times over, and return the duration
+    of every call in seconds. The first pass is an untimed warmup."""
+
+    samples = []
+    for i in range(repeat + warmup):
+        for argument in arguments:
+            start = time.perf_counter()
+            function() if argument is None else function(argument)
+            if i >= warmup:
+                samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_rss_mb() -> Optional[float]:
+    """The peak resident set size of the current process so far, in MB (None where it is not available)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # Bytes on macOS, KB elsewhere
+
+
+def _isolated_call(function: Callable, kwargs: dict):
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):  # The scraper reports its steps on stdout
+        results = function(**kwargs)
+    return results, peak_rss_mb()
+
+
+def run_isolated(function: Callable, **kwargs) -> List[Result]:
+    """Run a benchmark case function in a fresh interpreter, so that its peak RSS is its own and no state (imports,
+    caches) leaks between cases. Adds the peak RSS to the metrics of every result."""
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        results, peak = executor.submit(_isolated_call, function, kwargs).result()
+    if peak is None:
+        return results
+    return [result._replace(metrics={**result.metrics, 'peak_rss_mb': peak}) for result in results]
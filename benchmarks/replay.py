@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import random
+import threading
+import subprocess
+from collections import Counter
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qsl
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+from scraper.scheduler import TokenBucket
+from scraper.mediawiki import API_PATH
+from benchmarks.fixtures import Fixtures, page_key
+from benchmarks.wiki_api import WikiAPI
+
+
+# Size of the chunks bodies are written in when the bandwidth is limited
+_CHUNK_SIZE = 16 * 1024
+
+# Seconds worth of requests a rate limited server accepts in a burst
+_RATE_LIMIT_BURST = 0.5
+
+
+class Phase(NamedTuple):
+    """A stretch of a ReplayServer script: for duration seconds, the server has these settings (None keeps its own)."""
+    duration: float
+    latency: Optional[float] = None
+    rate_limit: Optional[float] = None
+    capacity: Optional[int] = None
+
+
+class ReplayServer:
+    """A local HTTP server replaying a fixture set in place of the wiki, so that the scraper can be benchmarked
+    offline. Point read_terraria_wiki at base_url.
+
+    Every response can be delayed by latency seconds (plus up to jitter seconds), and bodies can be throttled to
+    bandwidth bytes per second (per connection). With an error_rate, that fraction of the requests is answered with
+    error_status instead (503 by default, with a Retry-After of retry_after seconds), picked with a seeded random
+    generator. ETags are served, and conditional requests answered with 304 Not Modified. Requests to api.php are
+    answered by a WikiAPI stand-in over the same fixtures, with the hash of the reply as its ETag.
+
+    Like a CDN fronted wiki, the server can also be overloaded: with a rate_limit, requests beyond that many per
+    second are answered with 429 Too Many Requests (and a Retry-After of retry_after seconds), and with a capacity,
+    at most that many requests are served at once while the others queue, so latencies grow with the load. A script
+    of Phases changes the latency, rate limit and capacity over time (e.g. a slowdown, then a stretch of heavy
+    throttling), starting at the first request; the server's own settings apply once the script is over.
+
+    Every response is counted by (method, page key, status), see response_counts(), e.g. to check which pages a
+    scrape requested and which of them were revalidated (304)."""
+
+    def __init__(self, fixtures: Fixtures, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, bandwidth: Optional[float] = None, error_rate: float = 0.0,
+                 error_status: int = 503, retry_after: int = 0, seed: int = 0, rate_limit: Optional[float] = None,
+                 capacity: Optional[int] = None, script: Sequence[Phase] = ()):
+        self.fixtures = fixtures
+        self.api = WikiAPI(fixtures)
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.capacity = capacity
+        self.script = list(script)
+        self.requests = 0  # Requests served
+        self.errors = 0  # Errors injected
+        self.throttled = 0  # Requests answered with 429 by the rate limit
+        self._responses = Counter()  # Responses sent, by (method, page key, status)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = None  # time.monotonic() of the first request, when the script starts
+        self._rate_limiter = None
+        self._serving = 0  # Requests being served, at most capacity
+        self._capacity_freed = threading.Condition(self._lock)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the wiki
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionError:  # The client stopped reading early (e.g. the lxml-stream parser)
+                    pass
+
+            def do_GET(self):
+                server._serve(self)
+
+        return Handler
+
+    def settings(self, phase: Optional[Phase]) -> Tuple[float, Optional[float], Optional[int]]:
+        """The latency, rate limit and capacity of the server during the phase (None for after the script)."""
+        own = (self.latency, self.rate_limit, self.capacity)
+        if phase is None:
+            return own
+        return tuple(own_value if value is None else value
+                     for own_value, value in zip(own, (phase.latency, phase.rate_limit, phase.capacity)))
+
+    def phase_at(self, elapsed: float) -> Optional[Phase]:
+        """The phase of the script elapsed seconds after it started, None once it is over."""
+        for phase in self.script:
+            if elapsed < phase.duration:
+                return phase
+            elapsed -= phase.duration
+        return None
+
+    def _admit(self) -> Tuple[bool, float]:
+        """Apply the rate limit and the capacity to a new request: return whether it is throttled, and otherwise wait
+        for a free serving slot (to be released with _release()). Also returns the latency to add."""
+
+        with self._lock:
+            now = time.monotonic()
+            if self._started is None:
+                self._started = now
+            latency, rate_limit, capacity = self.settings(self.phase_at(now - self._started))
+
+            if rate_limit:
+                burst = max(1.0, rate_limit * _RATE_LIMIT_BURST)
+                if self._rate_limiter is None:
+                    self._rate_limiter = TokenBucket(rate_limit, burst)
+                elif self._rate_limiter.rate != rate_limit:
+                    self._rate_limiter.set_rate(rate_limit, burst)
+                if self._rate_limiter.delay(now) > 0:
+                    self.throttled += 1
+                    return True, 0.0
+                self._rate_limiter.take(now)
+
+            while capacity and self._serving >= capacity:
+                self._capacity_freed.wait()
+            self._serving += 1
+            return False, latency
+
+    def _release(self):
+        with self._lock:
+            self._serving -= 1
+            self._capacity_freed.notify()
+
+    def _serve(self, request: BaseHTTPRequestHandler):
+        throttled, latency = self._admit()
+        if throttled:
+            self._respond(request, 429, b'Too many requests', {'Retry-After': str(self.retry_after)})
+            return
+        try:
+            self._serve_admitted(request, latency)
+        finally:
+            self._release()
+
+    def _serve_admitted(self, request: BaseHTTPRequestHandler, latency: float):
+        with self._lock:
+            self.requests += 1
+            delay = latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            self.errors += fail
+        if delay:
+            time.sleep(delay)
+
+        key = page_key(request.path)
+        page = self.fixtures.pages.get(key)
+
+        if fail:
+            self._respond(request, self.error_status, b'Injected error', {'Retry-After': str(self.retry_after)})
+        elif key == API_PATH:
+            status, body = self.api.reply(dict(parse_qsl(request.path.partition('?')[2])))
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            if request.headers.get('If-None-Match') == etag:
+                self._respond(request, 304, b'', {'ETag': etag})
+            else:
+                self._respond(request, status, body, {'ETag': etag, 'Content-Type': 'application/json; charset=utf-8'})
+        elif page is None:
+            self._respond(request, 404, b'Not found')
+        elif request.headers.get('If-None-Match') == page['etag']:
+            self._respond(request, 304, b'', {'ETag': page['etag']})
+        else:
+            self._respond(request, 200, self.fixtures.content(key),
+                          {'ETag': page['etag'], 'Content-Type': page['content_type']})
+
+    def _respond(self, request: BaseHTTPRequestHandler, status: int, body: bytes, headers: Optional[dict] = None):
+        with self._lock:
+            self._responses[request.command, page_key(request.path), status] += 1
+        request.send_response(status)
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        if status != 304:
+            request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+
+        if self.bandwidth is None:
+            request.wfile.write(body)
+            return
+        for start in range(0, len(body), _CHUNK_SIZE):
+            chunk = body[start:start + _CHUNK_SIZE]
+            request.wfile.write(chunk)
+            request.wfile.flush()
+            time.sleep(len(chunk) / self.bandwidth)
+
+    def response_counts(self) -> Counter:
+        """The responses sent so far, by (method, page key, status)."""
+        with self._lock:
+            return Counter(self._responses)
+
+    def start(self) -> 'ReplayServer':
+        self._thread = threading.Thread(name='ReplayServer', target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+@contextmanager
+def replay_server_process(fixture_dir: str, latency: float = 0.0, jitter: float = 0.0,
+                          bandwidth: Optional[float] = None, error_rate: float = 0.0, seed: int = 0,
+                          rate_limit: Optional[float] = None, capacity: Optional[int] = None,
+                          script: Sequence[Phase] = (), retry_after: int = 0):
+    """Run a ReplayServer in a separate process (python -m benchmarks serve), so that serving the pages does not
+    compete with the benchmarked scraper for the GIL. Yields the server's base url."""
+
+    command = [sys.executable, '-m', 'benchmarks', 'serve', os.path.abspath(fixture_dir), '--latency', str(latency),
+               '--jitter', str(jitter), '--error-rate', str(error_rate), '--seed', str(seed)]
+    if bandwidth is not None:
+        command += ['--bandwidth', str(bandwidth)]
+    if rate_limit is not None:
+        command += ['--rate-limit', str(rate_limit)]
+    if capacity is not None:
+        command += ['--capacity', str(capacity)]
+    if script:
+        command += ['--script', json.dumps([phase._asdict() for phase in script])]
+    if retry_after:
+        command += ['--retry-after', str(retry_after)]
+
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(command, cwd=project_dir, stdout=subprocess.PIPE, text=True)
+    try:
+        line = process.stdout.readline()  # "Serving <fixtures> on <base url>"
+        if not line.startswith('Serving'):
+            raise RuntimeError('The replay server failed to start.')
+        yield line.split()[-1]
+    finally:
+        process.terminate()
+        process.wait()
@@ -0,0 +1,535 @@
+import gc
+import os
+import time
+import pickle
+import tempfile
+import tracemalloc
+from io import StringIO
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+from pandas import DataFrame
+
+from terraria.npcs import NPC, PreferenceStore
+from terraria.stats import PreferenceStats
+from terraria.housing import optimize_housing
+from terraria.query import PreferenceIndex
+from terraria.snapshot import Snapshot, write_snapshot
+from scraper.http_client import HttpClient
+from scraper.instrumentation import Tracer, SPAN_NPC_FETCH, COUNTER_BYTES_DOWNLOADED, COUNTER_REQUESTS, COUNTER_RETRIES
+from scraper.scheduler import CrawlScheduler, THROTTLE_STATUS_CODES
+from scraper.normalize import normalize_preferences, normalize_preferences_batch
+from scraper.scraping import DEFAULT_PARSER, PARSERS, PARSER_HTML, PARSER_LXML_STREAM, PARSER_LXML_XPATH, \
+    DEFAULT_SOURCE, SOURCE_API, PAGE_FAILED, extract_npc_page, read_terraria_wiki
+from scraper.streaming import stream_npc_page, STREAM_CHUNK_SIZE
+from benchmarks.fixtures import Fixtures, generate_synthetic, synthetic_tables, synthetic_npcs
+from benchmarks.legacy import LegacyNPC, legacy_clean, legacy_stats
+from benchmarks.measure import Result, timing_metrics, time_calls
+from benchmarks.replay import Phase, replay_server_process
+
+
+class Profile(NamedTuple):
+    """The sizes and repetitions of a benchmark run."""
+    fixture_npcs: int  # NPC pages of the synthetic fixture set generated when no fixtures are passed
+    repeat: int  # Timed passes over the inputs of each case
+    concurrency: Tuple[int, ...]  # Scraper worker counts of the end-to-end runs
+    parse_processes: Tuple[int, ...]  # Parser process counts of the end-to-end runs with parser processes
+    latency: float  # Seconds of latency the replay server adds to every response in the end-to-end runs
+    scaled_npcs: Tuple[int, ...]  # Synthetic NPC counts of the in-memory stages, on top of the fixture set
+    housing_npcs: Tuple[int, ...]  # NPC counts of the housing optimizer runs
+
+
+PROFILES = {
+    'quick': Profile(fixture_npcs=40, repeat=1, concurrency=(1, 4, 8, 16), parse_processes=(1, 2, 4, 8),
+                     latency=0.02, scaled_npcs=(1000,), housing_npcs=(40, 100)),
+    'full': Profile(fixture_npcs=300, repeat=3, concurrency=(1, 4, 8, 16), parse_processes=(1, 2, 4, 8),
+                    latency=0.05, scaled_npcs=(3000, 10000), housing_npcs=(40, 100, 300)),
+}
+
+
+class Case(NamedTuple):
+    """A benchmark case: a module level function returning a list of Results, run in its own process."""
+    suite: str
+    function: Callable
+    kwargs: dict
+
+
+class _Page:
+    """The parts of an HTTP response the parsers read."""
+
+    def __init__(self, content: bytes):
+        self.content = content
+        self.encoding = 'utf-8'
+
+
+def _chunks(content: bytes):
+    return (content[start:start + STREAM_CHUNK_SIZE] for start in range(0, len(content), STREAM_CHUNK_SIZE))
+
+
+def _label(npc_count: Optional[int]) -> str:
+    return 'fixtures' if npc_count is None else f'{npc_count} npcs'
+
+
+def _raw_tables(fixture_dir: str) -> List[Tuple[str, DataFrame]]:
+    """The (name, table as read by pd.read_html) of every NPC page of the fixtures that has a preferences table."""
+
+    tables = []
+    for _, content in Fixtures(fixture_dir).npc_pages():
+        name, table_html = extract_npc_page(_Page(content), PARSER_LXML_XPATH)
+        if table_html and name not in NPC.npcs_with_no_living_preferences():
+            tables.append((name, pd.read_html(StringIO(table_html), attrs={'class': 'terraria living-preferences'})[0]))
+    return tables
+
+
+def _tables(fixture_dir: str, npc_count: Optional[int]) -> List[Tuple[str, DataFrame]]:
+    """The (name, normalized table) of the fixtures' NPCs, or of npc_count synthetic NPCs."""
+    if npc_count is None:
+        return [(name, normalize_preferences(table)) for name, table in _raw_tables(fixture_dir)]
+    return synthetic_tables(npc_count)
+
+
+# End to end
+
+
+def end_to_end(fixture_dir: str, workers: int, latency: float, parser: str = DEFAULT_PARSER, error_rate: float = 0.0,
+               bandwidth: Optional[float] = None, parse_processes: int = 0,
+               source: str = DEFAULT_SOURCE) -> List[Result]:
+    """Scrape the fixtures served by a replay server with read_terraria_wiki, without any cache. Besides the timings,
+    the requests issued and the megabytes downloaded are reported."""
+
+    with replay_server_process(fixture_dir, latency=latency, error_rate=error_rate, bandwidth=bandwidth) as base_url:
+        tracer = Tracer()
+        client = HttpClient(max_connections_per_host=workers, tracer=tracer)
+        start = time.perf_counter()
+        pages = read_terraria_wiki(base_url, client=client, max_workers=workers, incremental=False, parser=parser,
+                                   tracer=tracer, parse_processes=parse_processes, source=source)
+        pages_count = next(pages)
+        failed = sum(page.status == PAGE_FAILED for page in pages)
+        elapsed = time.perf_counter() - start
+        client.close()
+
+    fetch = next(stats for stats in tracer.span_stats() if stats.name == SPAN_NPC_FETCH)
+    name = f'{parser}, {workers} workers' if source == DEFAULT_SOURCE else f'{source}, {workers} workers'
+    if parse_processes:
+        name += f', {parse_processes} parser processes'
+    if error_rate:
+        name += f', {error_rate:.0%} errors'
+    return [Result('end_to_end', name, {
+        'total_ms': elapsed * 1000, 'pages_per_s': pages_count / elapsed, 'fetch_p50_ms': fetch.p50 * 1000,
+        'fetch_p99_ms': fetch.p99 * 1000, 'failed_pages': failed, 'retries': tracer.counters.get(COUNTER_RETRIES, 0),
+        'requests': tracer.counters.get(COUNTER_REQUESTS, 0),
+        'downloaded_mb': tracer.counters.get(COUNTER_BYTES_DOWNLOADED, 0) / 2 ** 20
+    })]
+
+
+# Crawl pacing against an overloaded wiki
+
+
+# The server of the crawl case: 100 ms responses, 30 requests per second (beyond which it answers 429s) and at most
+# 8 requests served at once. Its script throttles harder for a while, then slows down, then recovers.
+CRAWL_SERVER = dict(latency=0.1, rate_limit=30.0, capacity=8, retry_after=1)
+CRAWL_SCRIPT = (Phase(duration=8), Phase(duration=8, rate_limit=12.0), Phase(duration=8, latency=0.5), Phase(8))
+CRAWL_NPCS = 600
+
+
+def _safe_throughput(phase: Phase) -> float:
+    """The most pages per second the crawl server answers without throttling during the phase."""
+    latency = CRAWL_SERVER['latency'] if phase.latency is None else phase.latency
+    rate_limit = CRAWL_SERVER['rate_limit'] if phase.rate_limit is None else phase.rate_limit
+    capacity = CRAWL_SERVER['capacity'] if phase.capacity is None else phase.capacity
+    return min(rate_limit, capacity / latency)
+
+
+def crawl(workers: int, adaptive: bool) -> List[Result]:
+    """Scrape synthetic pages from a replay server that throttles, slows down and recovers over time (CRAWL_SCRIPT),
+    with a fixed amount of workers (and the client's retries) or with a CrawlScheduler of up to that many.
+
+    Besides the totals, the pages per second done during the second half of every phase (once the crawl had time to
+    adapt) are reported, and the efficiency: their mean ratio to the most the server sustained in the phase."""
+
+    with tempfile.TemporaryDirectory(prefix='npc-fixtures-') as fixture_dir:
+        generate_synthetic(fixture_dir, CRAWL_NPCS, page_size=5000)
+        with replay_server_process(fixture_dir, **CRAWL_SERVER, script=CRAWL_SCRIPT) as base_url:
+            scheduler = CrawlScheduler(max_concurrency=workers) if adaptive else None
+            client = HttpClient(max_connections_per_host=workers, max_retries=0 if adaptive else 3)
+            start = time.perf_counter()
+            pages = read_terraria_wiki(base_url, client=client, max_workers=workers, incremental=False,
+                                       scheduler=scheduler)
+            pages_count = next(pages)
+            done = []  # Seconds since the start at which each page was done
+            failed = 0
+            for page in pages:
+                if page.status == PAGE_FAILED:
+                    failed += 1
+                else:
+                    done.append(time.perf_counter() - start)
+            elapsed = time.perf_counter() - start
+            client.close()
+
+    throttled = sum(timing.retries + (timing.status_code in THROTTLE_STATUS_CODES) for timing in client.timings)
+    metrics = {'total_ms': elapsed * 1000, 'pages_per_s': pages_count / elapsed, 'failed_pages': failed,
+               'throttled': throttled}
+    efficiencies = []
+    phase_start = 0.0
+    for n, phase in enumerate(CRAWL_SCRIPT, 1):
+        steady = phase_start + phase.duration / 2
+        phase_start += phase.duration
+        if elapsed < phase_start:  # The crawl was over before the end of the phase
+            break
+        achieved = sum(steady <= time_done < phase_start for time_done in done) / (phase_start - steady)
+        metrics[f'phase{n}_pages_per_s'] = achieved
+        efficiencies.append(achieved / _safe_throughput(phase))
+    metrics['efficiency'] = sum(efficiencies) / len(efficiencies) if efficiencies else 0.0
+
+    name = f'adaptive, up to {workers} workers' if adaptive else f'{workers} workers'
+    return [Result('crawl', name, metrics)]
+
+
+# Stages in isolation
+
+
+def parse(fixture_dir: str, parser: str, repeat: int) -> List[Result]:
+    """Extract the NPC name and preferences table markup from every fixture NPC page with one parser backend."""
+
+    pages = [content for _, content in Fixtures(fixture_dir).npc_pages()]
+    if parser == PARSER_LXML_STREAM:
+        samples = time_calls(lambda content: stream_npc_page(_chunks(content), 'utf-8'), pages, repeat, warmup=False)
+    else:
+        samples = time_calls(lambda content: extract_npc_page(_Page(content), parser), pages, repeat, warmup=False)
+    metrics = timing_metrics(samples, 'pages')
+    metrics['mb_per_s'] = sum(map(len, pages)) * repeat / sum(samples) / 2 ** 20
+    return [Result('parse', parser, metrics)]
+
+
+def table_extract(fixture_dir: str, repeat: int) -> List[Result]:
+    """pd.read_html of every preferences table of the fixtures."""
+
+    tables = []
+    for _, content in Fixtures(fixture_dir).npc_pages():
+        name, table_html = extract_npc_page(_Page(content), PARSER_LXML_XPATH)
+        if table_html and name not in NPC.npcs_with_no_living_preferences():
+            tables.append(table_html)
+
+    samples = time_calls(lambda html: pd.read_html(StringIO(html), attrs={'class': 'terraria living-preferences'}),
+                         tables, repeat)
+    return [Result('stages', 'table_extract', timing_metrics(samples, 'tables'))]
+
+
+def cleanup(fixture_dir: str, repeat: int) -> List[Result]:
+    """The legacy per-cell cleanup loop, normalize_preferences, and normalize_preferences_batch on the fixtures."""
+
+    tables = [table for _, table in _raw_tables(fixture_dir)]
+    batch = time_calls(lambda: normalize_preferences_batch(tables), repeat=repeat)
+    return [
+        Result('stages', 'cleanup (legacy loop)', timing_metrics(time_calls(legacy_clean, tables, repeat), 'tables')),
+        Result('stages', 'cleanup', timing_metrics(time_calls(normalize_preferences, tables, repeat), 'tables')),
+        Result('stages', 'cleanup (batch)', timing_metrics(batch, 'tables', items=len(tables) * len(batch))),
+    ]
+
+
+def npc_build(fixture_dir: str, repeat: int) -> List[Result]:
+    """NPC construction from normalized tables (ingestion into the preference store)."""
+
+    tables = _tables(fixture_dir, None)
+    store = PreferenceStore()
+    samples = time_calls(lambda item: NPC(*item, store=store), tables, repeat)
+    return [Result('stages', 'npc_build', timing_metrics(samples, 'npcs'))]
+
+
+def accessors(npc_count: int, repeat: int) -> List[Result]:
+    """The favorite / least favorite accessors of the legacy DataFrame NPC against the compact NPC, on first access
+    (which parses the compact NPC's rows) and on repeated access."""
+
+    tables = synthetic_tables(npc_count)
+    names = ('favorite_biomes', 'favorite_neighbors', 'least_favorite_biomes', 'least_favorite_neighbors')
+
+    def access(npcs):
+        for npc in npcs:
+            for name in names:
+                getattr(npc, name)
+
+    results = []
+    for label, cls in (('legacy', LegacyNPC), ('compact', NPC)):
+        cold = []
+        for _ in range(repeat):
+            npcs = [cls(name, table) for name, table in tables]  # Fresh NPCs, nothing parsed yet
+            cold += time_calls(lambda: access(npcs), repeat=1, warmup=False)
+        warm = time_calls(lambda: access(npcs), repeat=repeat)
+        accesses = len(tables) * len(names)
+        results.append(Result('accessors', f'{label}, first access',
+                              timing_metrics(cold, 'accesses', items=accesses * len(cold))))
+        results.append(Result('accessors', f'{label}, repeated access',
+                              timing_metrics(warm, 'accesses', items=accesses * len(warm))))
+    return results
+
+
+def stats(fixture_dir: str, npc_count: Optional[int], repeat: int) -> List[Result]:
+    """The legacy dictionary loops against PreferenceStats (build plus the four count dictionaries)."""
+
+    tables = _tables(fixture_dir, npc_count)
+    legacy_npcs = [LegacyNPC(name, table) for name, table in tables]
+    store = PreferenceStore()
+    npcs = [NPC(name, table, store=store) for name, table in tables]
+
+    def compact():
+        preference_stats = PreferenceStats(npcs)
+        return (preference_stats.favorite_biome_counts, preference_stats.favorite_neighbor_counts,
+                preference_stats.least_favorite_biome_counts, preference_stats.least_favorite_neighbor_counts)
+
+    legacy = time_calls(lambda: legacy_stats(legacy_npcs), repeat=repeat)
+    vectorized = time_calls(compact, repeat=repeat)
+    return [Result('stages', f'stats (legacy loops), {_label(npc_count)}',
+                   timing_metrics(legacy, 'npcs', items=len(npcs) * len(legacy))),
+            Result('stages', f'stats, {_label(npc_count)}',
+                   timing_metrics(vectorized, 'npcs', items=len(npcs) * len(vectorized)))]
+
+
+def model_build(fixture_dir: str, npc_count: Optional[int], repeat: int) -> List[Result]:
+    """Building the tables screen model (GroupedTableModel) of all NPCs. Requires PyQt6."""
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtWidgets import QApplication
+    from gui_lib.tables import GroupedTableModel
+    from gui_app.app import npc_table
+
+    QApplication.instance() or QApplication([])  # The models need an application
+    store = PreferenceStore()
+    npcs = [NPC(name, table, store=store) for name, table in _tables(fixture_dir, npc_count)]
+
+    def build():
+        model = GroupedTableModel(column_names=('Biome', 'Neighbor'), title_header='NPC', label_header='Liking')
+        model.add_groups(npc_table(npc) for npc in npcs)
+
+    samples = time_calls(build, repeat=repeat)
+    return [Result('stages', f'model_build, {_label(npc_count)}',
+                   timing_metrics(samples, 'npcs', items=len(npcs) * len(samples)))]
+
+
+def model_data(fixture_dir: str, npc_count: Optional[int], repeat: int) -> List[Result]:
+    """The data() calls the tables view makes while painting (the text and background of every cell) on the tables
+    screen model of all NPCs, unfiltered and with a search showing every other NPC. Requires PyQt6."""
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtWidgets import QApplication
+    from gui_lib.tables import GroupedTableModel
+    from gui_app.app import npc_table
+
+    QApplication.instance() or QApplication([])  # The models need an application
+    store = PreferenceStore()
+    npcs = [NPC(name, table, store=store) for name, table in _tables(fixture_dir, npc_count)]
+    model = GroupedTableModel(column_names=('Biome', 'Neighbor'), title_header='NPC', label_header='Liking')
+    model.add_groups(npc_table(npc) for npc in npcs)
+    roles = (Qt.ItemDataRole.DisplayRole.value, Qt.ItemDataRole.BackgroundRole.value)  # Views pass ints
+
+    results = []
+    for label, titles in (('unfiltered', None), ('filtered', {npc.name for npc in npcs[::2]})):
+        model.set_group_filter(titles)
+        indexes = [model.index(row, column) for row in range(model.rowCount()) for column in range(model.columnCount())]
+
+        def paint():
+            for index in indexes:
+                for role in roles:
+                    model.data(index, role)
+
+        samples = time_calls(paint, repeat=repeat)
+        results.append(Result('stages', f'model_data ({label}), {_label(npc_count)}',
+                              timing_metrics(samples, 'calls', items=len(indexes) * len(roles) * len(samples))))
+    return results
+
+
+def tables_screen(npc_count: int, repeat: int) -> List[Result]:
+    """Showing the tables screen of npc_count synthetic NPCs, with the legacy grid of a table view per NPC against the
+    single grouped view: the time from building the screen to its first paint, and the widgets in the window.
+    Requires PyQt6."""
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtCore import QEvent, QObject
+    from PyQt6.QtWidgets import QApplication, QWidget
+    from gui_lib.utils import wrap_in_scroll_area
+    from gui_app.app import npc_table
+    from gui_app.screens import TableScreen
+    from benchmarks.legacy_gui import LegacyTableScreen, legacy_populate_tables_screen
+
+    app = QApplication.instance() or QApplication([])
+    npcs = synthetic_npcs(npc_count)
+
+    class PaintWatcher(QObject):
+        painted = False
+
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Type.Paint:
+                self.painted = True
+            return False
+
+    def legacy():
+        screen = LegacyTableScreen()
+        legacy_populate_tables_screen(screen, npcs)
+        return screen
+
+    def grouped():
+        screen = TableScreen()
+        screen.add_tables(npc_table(npc) for npc in npcs)
+        return screen
+
+    results = []
+    for label, build in (('legacy grid', legacy), ('grouped view', grouped)):
+        widgets = []
+
+        def show():
+            watcher = PaintWatcher()
+            app.installEventFilter(watcher)
+            window = wrap_in_scroll_area(build())  # The screens are shown in a scroll area, like in the app
+            window.resize(1200, 900)
+            window.show()
+            while not watcher.painted:
+                app.processEvents()
+            app.removeEventFilter(watcher)
+            widgets.append(len(window.findChildren(QWidget)))
+            window.close()
+            window.deleteLater()
+            app.processEvents()
+
+        samples = time_calls(show, repeat=repeat, warmup=False)
+        metrics = timing_metrics(samples, 'screens')
+        metrics['widgets'] = widgets[-1]
+        results.append(Result('screen', f'tables_screen ({label}), {npc_count} npcs', metrics))
+    return results
+
+
+def memory(fixture_dir: str, npc_count: Optional[int]) -> List[Result]:
+    """The memory held by the NPCs' preferences as DataFrames (the legacy NPC), and in the compact preference store."""
+
+    gc.collect()
+    tracemalloc.start()
+    tables = _tables(fixture_dir, npc_count)
+    dataframes = tracemalloc.get_traced_memory()[0]
+
+    store = PreferenceStore()
+    npcs = [NPC(name, table, store=store) for name, table in tables]
+    del tables
+    gc.collect()
+    compact = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return [Result('memory', f'dataframes, {_label(npc_count)}', {'held_mb': dataframes / 2 ** 20}),
+            Result('memory', f'compact store, {_label(npc_count)}',
+                   {'held_mb': compact / 2 ** 20, 'store_mb': store.nbytes() / 2 ** 20, 'npcs': len(npcs)})]
+
+
+def query(npc_count: int, repeat: int) -> List[Result]:
+    """Building the inverted preference index, and the latency of its queries, against the loop over the NPCs'
+    accessors that answering the same question took before."""
+
+    npcs = synthetic_npcs(npc_count)
+    build = time_calls(lambda: PreferenceIndex(npcs), repeat=repeat, warmup=False)
+    index = PreferenceIndex(npcs)
+    biome, neighbor = next(iter(index.biomes)), npcs[0].name
+
+    queries = {
+        'who likes a biome': lambda: index.likes(biome=biome),
+        'who hates a neighbor': lambda: index.hates(neighbor=neighbor),
+        'likes a biome & dislikes a neighbor': lambda: index.likes(biome=biome) & index.dislikes(neighbor=neighbor),
+        'search "likes forest, hates ..."': lambda: index.search(f'likes forest, hates {neighbor[:3]}'),
+        'who likes a biome (NPC loop)': lambda: [npc.name for npc in npcs
+                                                 if biome in npc.preferences_at('Likes').biomes],
+    }
+    results = [Result('query', f'index build, {npc_count} npcs', timing_metrics(build, 'builds'))]
+    for name, function in queries.items():
+        calls = 10 if 'loop' in name else 1000  # Sub-millisecond calls are timed in batches
+        batches = time_calls(lambda: [function() for _ in range(calls)], repeat=repeat * 5)
+        results.append(Result('query', f'{name}, {npc_count} npcs',
+                              timing_metrics([batch / calls for batch in batches], 'queries')))
+    return results
+
+
+def snapshot(fixture_dir: str, npc_count: Optional[int], repeat: int) -> List[Result]:
+    """Size and load time of the snapshot file, against pickling the NPCs as DataFrame backed (legacy) NPCs and as
+    compact NPCs. Loads read a file in the page cache; 'names only' opens the snapshot and only decodes the names."""
+
+    tables = _tables(fixture_dir, npc_count)
+    store = PreferenceStore()
+    npcs = [NPC(name, table, store=store) for name, table in tables]
+
+    def load_pickle(path):
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    def load_snapshot(path):
+        with Snapshot(path) as opened:
+            return opened.npcs()
+
+    def load_names(path):
+        with Snapshot(path) as opened:
+            return opened.names
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        pickles = {'pickle (DataFrame NPCs)': [LegacyNPC(name, table) for name, table in tables],
+                   'pickle (compact NPCs)': npcs}
+        loads = []
+        for name, data in pickles.items():
+            path = os.path.join(directory, f'{len(loads)}.pickle')
+            with open(path, 'wb') as file:
+                pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+            loads.append((name, path, load_pickle))
+
+        path = os.path.join(directory, 'npcs.snapshot')
+        write_snapshot(npcs, path)
+        loads += [('snapshot', path, load_snapshot), ('snapshot, names only', path, load_names)]
+
+        for name, path, load in loads:
+            metrics = timing_metrics(time_calls(lambda: load(path), repeat=repeat * 5), 'loads')
+            metrics['file_mb'] = os.path.getsize(path) / 2 ** 20
+            results.append(Result('snapshot', f'{name}, {_label(npc_count)}', metrics))
+    return results
+
+
+def housing(npc_count: int, repeat: int) -> List[Result]:
+    """The housing optimizer (4 restarts) on synthetic NPCs."""
+
+    npcs = synthetic_npcs(npc_count)
+    samples = time_calls(lambda: optimize_housing(npcs, restarts=4), repeat=repeat, warmup=False)
+    return [Result('housing', f'optimize_housing, {npc_count} npcs', timing_metrics(samples, 'runs'))]
+
+
+def cases(fixture_dir: str, profile: Profile) -> List[Case]:
+    """Every benchmark case of the profile, on the fixture set."""
+
+    sizes = (None, *profile.scaled_npcs)  # The fixture set, then the scaled synthetic sets
+    return [
+        *(Case('end_to_end', end_to_end, dict(fixture_dir=fixture_dir, workers=workers, latency=profile.latency))
+          for workers in profile.concurrency),
+        Case('end_to_end', end_to_end, dict(fixture_dir=fixture_dir, workers=max(profile.concurrency),
+                                            latency=profile.latency, error_rate=0.05)),
+        *(Case('end_to_end', end_to_end, dict(fixture_dir=fixture_dir, workers=8, latency=profile.latency,
+                                              parser=parser, parse_processes=processes))
+          for parser, processes in [*((DEFAULT_PARSER, processes) for processes in profile.parse_processes),
+                                    *((PARSER_HTML, processes) for processes in (0, *profile.parse_processes))]),
+        *(Case('end_to_end', end_to_end, dict(fixture_dir=fixture_dir, workers=workers, latency=profile.latency,
+                                              source=SOURCE_API))
+          for workers in (1, 4)),
+        *(Case('crawl', crawl, dict(workers=workers, adaptive=adaptive))
+          for workers, adaptive in ((2, False), (16, False), (16, True))),
+        *(Case('parse', parse, dict(fixture_dir=fixture_dir, parser=parser, repeat=profile.repeat))
+          for parser in PARSERS),
+        Case('stages', table_extract, dict(fixture_dir=fixture_dir, repeat=profile.repeat)),
+        Case('stages', cleanup, dict(fixture_dir=fixture_dir, repeat=profile.repeat)),
+        Case('stages', npc_build, dict(fixture_dir=fixture_dir, repeat=profile.repeat)),
+        *(Case('stages', stats, dict(fixture_dir=fixture_dir, npc_count=size, repeat=profile.repeat))
+          for size in sizes),
+        *(Case('stages', model_build, dict(fixture_dir=fixture_dir, npc_count=size, repeat=profile.repeat))
+          for size in sizes),
+        *(Case('stages', model_data, dict(fixture_dir=fixture_dir, npc_count=size, repeat=profile.repeat))
+          for size in sizes),
+        *(Case('screen', tables_screen, dict(npc_count=size, repeat=profile.repeat)) for size in (40, 2000)),
+        Case('accessors', accessors, dict(npc_count=max(profile.scaled_npcs), repeat=profile.repeat)),
+        *(Case('memory', memory, dict(fixture_dir=fixture_dir, npc_count=size)) for size in (None, 10_000)),
+        *(Case('snapshot', snapshot, dict(fixture_dir=fixture_dir, npc_count=size, repeat=profile.repeat))
+          for size in (None, 10_000)),
+        Case('query', query, dict(npc_count=10_000, repeat=profile.repeat)),
+        *(Case('housing', housing, dict(npc_count=size, repeat=profile.repeat)) for size in profile.housing_npcs),
+    ]
+
+
+SUITES = ('end_to_end', 'crawl', 'parse', 'stages', 'screen', 'accessors', 'memory', 'snapshot', 'query', 'housing')
@@ -0,0 +1,134 @@
+import re
+import json
+import random
+from typing import Dict, Optional, Tuple
+
+import lxml.html
+
+from scraper.mediawiki import API_BATCH_SIZE, LIVING_PREFERENCES_TEMPLATE, PAGE_PARAMETER
+from scraper.scraping import NPCS_URL, PARSER_LXML_XPATH, PageContent, extract_npc_page
+from benchmarks.fixtures import Fixtures
+
+
+# The template calls the stand-in writes into the wikitext of the NPC pages. Like a template reading
+# {{{name|{{PAGENAME}}}}}, they render the table of the page passed as their PAGE_PARAMETER, or else of the page they
+# are rendered on
+_TEMPLATE_CALL = re.compile(r'\{\{\s*' + re.escape(LIVING_PREFERENCES_TEMPLATE) +
+                            r'\s*(?:\|\s*' + re.escape(PAGE_PARAMETER) + r'\s*=([^|{}]*))?\}\}')
+
+# The title MediaWiki parses text in when no title is passed
+_DEFAULT_PARSE_TITLE = 'API'
+
+
+def _title_key(title: str) -> str:
+    return 'wiki/' + title.replace(' ', '_')
+
+
+class WikiAPI:
+    """A stand-in for the wiki's MediaWiki API (api.php) over a fixture set, as much of it as MediaWikiAPI uses:
+
+    - action=parse&page=<title>: the article of a page (its body, without the skin around it)
+    - action=query&prop=revisions&titles=<up to API_BATCH_SIZE titles>: the wikitext of the NPC pages. The fixtures
+      only hold rendered pages, so the wikitext is made up: an infobox, some prose and, for pages with a preferences
+      table, a call of the living preferences template, without parameters. A page whose heading differs from its
+      title is reported as a redirect to the heading.
+    - action=parse&text=<wikitext>&title=<title>: renders each template call to the table of the page passed as its
+      PAGE_PARAMETER, or else of the page with that title, as a template depending on the page it is on would.
+      Without a title, MediaWiki parses the text as if on a page named API, so calls without the parameter render to
+      nothing. The rest of the text is passed through as is.
+
+    The made up wikitext only stands in for that of the wiki: it was not compared with the actual markup of its NPC
+    pages.
+
+    Replies are JSON in the formatversion=2 layout; errors are reported the way MediaWiki does, in an error object."""
+
+    def __init__(self, fixtures: Fixtures):
+        self.fixtures = fixtures
+        self._pages: Dict[str, Optional[Tuple[str, str]]] = {}  # Key -> (heading, table markup), None if missing
+        self._titles: Dict[str, str] = {}  # Title -> key of the pages the queries reported, redirect targets included
+
+    def _page(self, key: str) -> Optional[Tuple[str, str]]:
+        if key not in self._pages:
+            page = None
+            if key in self.fixtures.pages:
+                page = extract_npc_page(PageContent(self.fixtures.content(key), 'utf-8'), PARSER_LXML_XPATH)
+            self._pages[key] = page
+        return self._pages[key]
+
+    def _wikitext(self, key: str, name: str, table_html: str) -> str:
+        rng = random.Random(key)
+        prose = ' '.join(rng.choice(('The', 'guide', 'sells', 'arrives', 'when', 'a', 'house', 'is', 'free'))
+                         for _ in range(rng.randint(40, 120)))
+        wikitext = f'{{{{NPC infobox\n|name={name}\n|type=Town NPC\n}}}}\n{prose}.\n'
+        if table_html:
+            wikitext += f'\n== Living preferences ==\n{{{{{LIVING_PREFERENCES_TEMPLATE}}}}}\n'
+        return wikitext
+
+    def reply(self, params: Dict[str, str]) -> Tuple[int, bytes]:
+        """Answer the api.php request with these (GET or POST) parameters: return its status code and JSON body."""
+
+        try:
+            action = params.get('action')
+            if action == 'parse' and 'page' in params:
+                reply = self._parse_page(params['page'])
+            elif action == 'parse' and 'text' in params:
+                reply = self._parse_text(params['text'], params.get('title', _DEFAULT_PARSE_TITLE))
+            elif action == 'query':
+                reply = self._query(params.get('titles', ''))
+            else:
+                reply = self._error('badvalue', f'Unsupported action: {action}.')
+        except KeyError as exc:
+            reply = self._error('missingparam', f'Missing parameter {exc}.')
+        return 200, json.dumps(reply).encode('utf-8')
+
+    @staticmethod
+    def _error(code: str, info: str) -> dict:
+        return {'error': {'code': code, 'info': info}}
+
+    def _parse_page(self, title: str) -> dict:
+        key = _title_key(title)
+        if key not in self.fixtures.pages:
+            return self._error('missingtitle', "The page you specified doesn't exist.")
+        body = lxml.html.document_fromstring(self.fixtures.content(key)).body
+        html = ''.join(lxml.html.tostring(child, encoding='unicode') for child in body)
+        return {'parse': {'title': title, 'pageid': list(self.fixtures.pages).index(key) + 1, 'text': html}}
+
+    def _table(self, title: str) -> str:
+        page = self._page(self._titles.get(title, _title_key(title)))
+        return page[1] if page else ''
+
+    def _parse_text(self, text: str, title: str) -> dict:
+        html = _TEMPLATE_CALL.sub(lambda match: self._table((match.group(1) or title).strip()), text)
+        return {'parse': {'title': title, 'pageid': 0, 'text': f'<div class="mw-parser-output">{html}</div>'}}
+
+    def _query(self, titles: str) -> dict:
+        titles = [title for title in titles.split('|') if title]
+        if len(titles) > API_BATCH_SIZE:
+            return self._error('toomanyvalues', f'Too many values supplied for parameter "titles". The limit is '
+                                                f'{API_BATCH_SIZE}.')
+
+        normalized, redirects, pages = [], [], {}
+        for title in titles:
+            canonical = ' '.join(title.replace('_', ' ').split())  # Underscores to spaces
+            if canonical != title:
+                normalized.append({'fromencoded': False, 'from': title, 'to': canonical})
+            key = _title_key(canonical)
+            page = self._page(key) if key != NPCS_URL else None
+            if page is None:
+                pages[canonical] = {'ns': 0, 'title': canonical, 'missing': True}
+                continue
+
+            name, table_html = page
+            self._titles[name] = key
+            if name != canonical:
+                redirects.append({'from': canonical, 'to': name})
+            pages[name] = {'pageid': list(self.fixtures.pages).index(key) + 1, 'ns': 0, 'title': name, 'revisions': [
+                {'slots': {'main': {'contentmodel': 'wikitext', 'contentformat': 'text/x-wiki',
+                                    'content': self._wikitext(key, name, table_html)}}}]}
+
+        query = {'pages': list(pages.values())}
+        if normalized:
+            query['normalized'] = normalized
+        if redirects:
+            query['redirects'] = redirects
+        return {'batchcomplete': True, 'query': query}
@@ -0,0 +1,160 @@
+"""Headless command line scraper. Scrapes the living preferences of all NPCs into a JSON Lines, CSV, Parquet or Feather
+file without a GUI: PyQt6 is never imported, so this runs on servers and in cron jobs.
+
+Example: python cli.py -o npcs.jsonl --workers 8"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+from contextlib import nullcontext, redirect_stdout
+
+from scraper.export import EXPORT_FORMATS, open_writer
+from scraper.http_cache import ResponseCache
+from scraper.http_client import HttpClient
+from scraper.instrumentation import NULL_TRACER, Tracer
+from scraper.journal import DEFAULT_JOURNAL_PATH, CrawlJournal
+from scraper.scheduler import CrawlScheduler
+from scraper.scraping import BASE_URL, DEFAULT_PARSER, PARSERS, DEFAULT_SOURCE, SOURCES, PAGE_PARSED, PAGE_SKIPPED, \
+    PAGE_FAILED, PAGE_RESUMED, read_terraria_wiki
+
+
+class Progress:
+    """A progress line on stderr. On a terminal the line is rewritten in place, otherwise (e.g. in a cron log) a line
+    is printed every 10% of the pages."""
+
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.interactive = stream.isatty()
+        self.total = 0
+        self.done = 0
+        self.counts = {PAGE_PARSED: 0, PAGE_SKIPPED: 0, PAGE_FAILED: 0, PAGE_RESUMED: 0}
+        self.start = time.perf_counter()
+        self.crawl_state = None  # The latest CrawlState of an adaptive scrape
+
+    def update(self, status: str):
+        self.done += 1
+        self.counts[status] += 1
+        if self.interactive or self.done == self.total or self.done % max(self.total // 10, 1) == 0:
+            self.print()
+
+    def print(self):
+        line = (f'[{self.done}/{self.total}] {self.counts[PAGE_PARSED]} parsed, {self.counts[PAGE_SKIPPED]} skipped, '
+                f'{self.counts[PAGE_FAILED]} failed, {time.perf_counter() - self.start:.1f}s')
+        if self.counts[PAGE_RESUMED]:
+            line += f', {self.counts[PAGE_RESUMED]} resumed'
+        if self.crawl_state is not None:
+            line += f' ({self.crawl_state.describe()})'
+        self.stream.write(f'\r{line}\033[K' if self.interactive else f'{line}\n')
+        self.stream.flush()
+
+    def finish(self):
+        if self.interactive:
+            self.stream.write('\n')
+
+
+def scrape(args) -> int:
+    """Scrape the wiki into the output file, writing each NPC as soon as its page is done."""
+
+    tracer = Tracer() if args.timings or args.trace else NULL_TRACER
+    progress = Progress()
+    scheduler = None
+    if args.adaptive:
+        scheduler = CrawlScheduler(max_concurrency=args.workers,
+                                   on_update=lambda state: setattr(progress, 'crawl_state', state))
+    client = HttpClient(max_connections_per_host=max(args.workers, 1), max_retries=0 if args.adaptive else 3,
+                        cache=ResponseCache(), offline=args.offline, tracer=tracer)
+    journal = CrawlJournal(args.journal) if not args.no_journal else None
+
+    # The first Ctrl+C stops the scrape at the next page (the output then holds the NPCs done so far, and the journal
+    # lets the next run resume), a second one interrupts it right away
+    cancel = threading.Event()
+
+    def interrupt(signum, frame):
+        cancel.set()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    previous_handler = signal.signal(signal.SIGINT, interrupt)
+
+    # The scraper reports its steps on stdout. Keep stdout for the output file ('-'), and the scraper's messages on
+    # stderr with --verbose only.
+    messages = nullcontext(sys.stderr) if args.verbose else open(os.devnull, 'w')
+
+    with open_writer(args.output, args.format) as writer, messages as stream, redirect_stdout(stream):
+        pages = read_terraria_wiki(args.base_url, client=client, max_workers=args.workers,
+                                   incremental=not args.full, parser=args.parser, tracer=tracer,
+                                   parse_processes=args.parse_processes, scheduler=scheduler, source=args.source,
+                                   journal=journal, cancel=cancel)
+        try:
+            progress.total = next(pages)
+            while True:
+                page = next(pages)
+                if page.npc is not None:
+                    writer.write(page.npc)
+                progress.update(page.status)
+        except StopIteration:
+            pass
+        finally:
+            pages.close()
+            client.close()
+            signal.signal(signal.SIGINT, previous_handler)
+
+    progress.finish()
+    if cancel.is_set():
+        print(f'Cancelled after {progress.done} of {progress.total} pages. Run again to resume.', file=sys.stderr)
+    print(f'Wrote {writer.count} NPCs to {args.output}. {client.timing_summary()}', file=sys.stderr)
+    if args.timings:
+        print(f'\n{tracer.summary_table()}', file=sys.stderr)
+    if args.trace:
+        tracer.write_chrome_trace(args.trace)
+    return 0 if writer.count and not cancel.is_set() else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Scrape the living preferences of all Terraria NPCs from the wiki.')
+    parser.add_argument('-o', '--output', default='npcs.jsonl',
+                        help="output file, '-' for stdout (default: npcs.jsonl)")
+    parser.add_argument('-f', '--format', choices=EXPORT_FORMATS,
+                        help='output format (default: from the output file extension)')
+    parser.add_argument('-w', '--workers', type=int, default=8, help='NPC pages fetched concurrently (default: 8)')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='pace the downloads to what the wiki sustains, with up to --workers pages in flight, '
+                             'backing off and retrying when it throttles')
+    parser.add_argument('--source', choices=SOURCES, default=DEFAULT_SOURCE,
+                        help="read the NPC pages from their web pages ('html', the default) or through the wiki's "
+                             "MediaWiki API ('api', a fraction of the bytes)")
+    parser.add_argument('--parser', choices=PARSERS, default=DEFAULT_PARSER, help='HTML parsing backend')
+    parser.add_argument('-p', '--parse-processes', type=int, default=0,
+                        help='parse the pages in this many processes, apart from the downloads (default: 0, in the '
+                             'download threads)')
+    parser.add_argument('--base-url', default=BASE_URL, help='wiki base url')
+    parser.add_argument('--offline', action='store_true', help='only use the on-disk response cache')
+    parser.add_argument('--full', action='store_true', help='parse every page, even unchanged ones')
+    parser.add_argument('--journal', metavar='FILE', default=DEFAULT_JOURNAL_PATH,
+                        help='journal of the completed pages, which an interrupted scrape resumes from (default: '
+                             'under the cache directory)')
+    parser.add_argument('--no-journal', action='store_true',
+                        help='neither journal this scrape nor resume an interrupted one')
+    parser.add_argument('--timings', action='store_true', help='print the timings of every scrape stage on stderr')
+    parser.add_argument('--trace', metavar='FILE', help='write a Chrome trace of the scrape stages to FILE')
+    parser.add_argument('-v', '--verbose', action='store_true', help="show the scraper's messages on stderr")
+    parser.add_argument('--startup-report', action='store_true',
+                        help='compare the import cost of the CLI and of the GUI, then exit')
+    args = parser.parse_args(argv)
+
+    if args.startup_report:
+        from startup import startup_report
+        startup_report()
+        return 0
+
+    try:
+        return scrape(args)
+    except RuntimeError as exc:
+        print(f'\nError: {exc}', file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,10 @@
 
+import os
+import time
 import threading
+import importlib
+import traceback
+from typing import TYPE_CHECKING
 
 from PyQt6 import QtWidgets, QtGui
 from PyQt6.QtCore import Qt, pyqtSignal, QTimer
@@ -7,9 +12,24 @@ from PyQt6.QtWidgets import QStyle
 
 from gui_lib.utils import wrap_in_scroll_area
 from gui_lib.basic import Panel, StackedPanel
-from gui_lib.tables import DataFrameTableModel
 from gui_app.screens import *
-from gui_app.scraping import read_terraria_wiki
+
+if TYPE_CHECKING:
+    from terraria.npcs import NPC
+
+# The scraping and data stack (pandas, NumPy, lxml, BeautifulSoup, requests) is not needed before the start button is
+# clicked, so it is only imported then, or pre-warmed in the background once the window is shown (see prewarm()).
+PREWARM_MODULES = ('scraper.scraping', 'terraria.stats', 'terraria.query', 'terraria.snapshot')
+
+
+def npc_table(npc: 'NPC'):
+    """Return the (title, row labels, rows) table of an NPC's living preferences, for the tables screen."""
+
+    if not npc.liking_levels:  # No living preferences
+        return npc.name, (npc.not_available,), ((npc.not_available, npc.not_available),)
+
+    preferences = [npc.preferences_at(level) for level in npc.liking_levels]
+    return npc.name, npc.liking_levels, [(', '.join(p.biomes), ', '.join(p.neighbors)) for p in preferences]
 
 
 class ScreenStack(StackedPanel):
@@ -22,12 +42,52 @@ class AppWindow(Panel):
     # Scraper thread callback API
     scraping_set_max_progress = pyqtSignal(int)
     scraping_increment_progress = pyqtSignal()
+    scraping_npc_ready = pyqtSignal(object)  # Carries each finished NPC to the main thread
     scraping_complete = pyqtSignal()
-    scraping_failed = pyqtSignal()
+    scraping_failed = pyqtSignal(str)  # Carries the reason
+    scraping_crawl_state = pyqtSignal(object)  # Carries the CrawlState of an adaptive scrape as it changes
 
     # Threading events
     scraping_thread_running = threading.Event()
 
+    # Maximum amount of NPC web pages the scraper fetches concurrently
+    scraper_max_workers = 8
+
+    # Pace the NPC page downloads to what the wiki sustains, with up to scraper_max_workers pages in flight, backing off
+    # and retrying when it throttles (see scraper.scheduler)
+    adaptive_scraping = True
+
+    # Processes parsing the downloaded NPC web pages (0 parses them in the download threads)
+    scraper_parse_processes = 0
+
+    # Where the NPC pages are read from: 'html' (their web pages) or 'api' (the wiki's MediaWiki API, many pages per
+    # request, see scraper.mediawiki)
+    scraper_source = 'html'
+
+    # Record the timings of the scrape stages, to be shown on the tables screen
+    trace_scraping = True
+
+    # NPCs that arrive from the scraper thread within this many milliseconds are added to the tables in one batch
+    npc_batch_interval = 100
+
+    # Journal the NPCs of the scrape as their pages complete, so that a scrape that was stopped, failed or was killed
+    # (e.g. with the window closed) resumes where it left off (see scraper.journal)
+    journal_scraping = True
+
+    # The journal file (None for the default one, under the scraper's cache directory)
+    journal_path = None
+
+    # Seconds closing the window waits for a running scrape to stop at its next page, and close its journal
+    close_scraping_timeout = 5.0
+
+    # The snapshot file the results of the last scrape are kept in, so that the next launch opens with them (None for
+    # the default one, under the scraper's cache directory)
+    snapshot_path = None
+
+    # Seconds after which the results opened from the snapshot are refreshed from the wiki (None for the response
+    # cache's TTL: until then, the pages of a refresh would come from the cache, and yield the same NPCs)
+    snapshot_refresh_age = None
+
     def __init__(self, parent=None):
         super().__init__(parent=parent)
 
@@ -40,8 +100,33 @@ class AppWindow(Panel):
         # Thread unsafe variables
         self.__scraper = None
         self.__npcs = None
+        self.__tracer = None
+        self.__snapshot = None  # The snapshot the displayed results were opened from, if any
+
+        # Set to stop the running scrape at its next page, whether the last scrape was stopped that way, and the
+        # amount of its pages that failed. Either way its results are partial.
+        self.__cancel_scraping = threading.Event()
+        self.__scrape_cancelled = False
+        self.__failed_pages = 0
+
+        # Whether the running scrape refreshes results opened from the snapshot (they stay displayed until it is done)
+        self.__refreshing = False
+
+        # NPCs received from the scraper thread so far (only touched by the main thread), the running totals of their
+        # stats, and the NPCs not displayed yet
+        self.__received_npcs = []
+        self.__received_counts = None
+        self.__pending_npcs = []
+
+        # The query in the tables screen's search box
+        self.__search_text = ''
 
-        # NPC information (parsed from self.__npcs after scraping)
+        # Coalesces the NPCs arriving from the scraper thread into batched table and stats updates
+        self.__npc_batch_timer = QTimer(self)
+        self.__npc_batch_timer.setSingleShot(True)
+        self.__npc_batch_timer.setInterval(self.npc_batch_interval)
+
+        # NPC information (parsed from the NPCs received so far, and from self.__npcs after scraping)
         self.favorite_biomes_counts = None
         self.favorite_neighbor_counts = None
         self.least_favorite_biomes_counts = None
@@ -74,24 +159,118 @@ class AppWindow(Panel):
         self.start_screen.start_button.clicked.connect(lambda checked: self.begin_scraping_wiki())
         # Event: Initialize the progress bar when the scraper thread signals the necessary information
         self.scraping_set_max_progress.connect(lambda value: self.progress_screen.init_progress(value))
+        self.scraping_set_max_progress.connect(lambda value: self.tables_screen.init_progress(value))
         # Event: Increment the progress bar when the scraper thread signals progress
         self.scraping_increment_progress.connect(lambda: self.progress_screen.increment_progress())
+        self.scraping_increment_progress.connect(lambda: self.tables_screen.increment_progress())
+        # Event: Show the pace of an adaptive scrape
+        self.scraping_crawl_state.connect(lambda state: self.progress_screen.show_crawl_state(state))
+        self.scraping_crawl_state.connect(lambda state: self.tables_screen.show_crawl_state(state))
+        # Event: Queue each NPC finished by the scraper thread for display
+        self.scraping_npc_ready.connect(self._event_npc_ready)
+        # Event: Display the queued NPCs
+        self.__npc_batch_timer.timeout.connect(self.flush_pending_npcs)
         # Event: Attach handler
         self.scraping_complete.connect(self._event_scraping_complete)
         # Event: Attach handler
         self.scraping_failed.connect(self._event_scraping_failed)
-
-    def begin_scraping_wiki(self):
+        # Event: Stop the scrape at the next page
+        self.progress_screen.stop_button.clicked.connect(lambda checked: self.cancel_scraping())
+        self.tables_screen.stop_button.clicked.connect(lambda checked: self.cancel_scraping())
+        # Event: Show the timings of the scrape
+        self.tables_screen.timings_button.clicked.connect(lambda checked: self.show_timings())
+        # Event: Narrow down the tables to the NPCs matching the search box query
+        self.tables_screen.search_box.textChanged.connect(self._event_search)
+
+    @staticmethod
+    def prewarm():
+        """Import the scraping and data stack in a background daemon thread. Call once the window has been painted, so
+        that clicking start does not wait for the imports."""
+
+        def import_modules():
+            for module in PREWARM_MODULES:
+                importlib.import_module(module)
+
+        threading.Thread(name='PrewarmThread', target=import_modules, daemon=True).start()
+
+    def begin_scraping_wiki(self, show_progress_screen: bool = True):
         """Begin scraping the wiki using a background daemon thread. Show the progress bar screen."""
 
         if self.__scraper is not None:  # If the thread already exists, it will be very bad to start another one.
             raise RuntimeError('Attempting to create a scraper thread when a scraper thread already exists.')
 
+        self.__cancel_scraping.clear()
         scraper = threading.Thread(name='ScrapingThread', target=self._scrape_wiki)  # Create the scraper thread
         scraper.setDaemon(True)  # Set as daemon thread
         self.__scraper = scraper  # Store a reference of the scraper thread
         scraper.start()  # Start the scraper thread
-        self.show_screen(self.progress_screen)  # Show the progress bar screen
+        if show_progress_screen:
+            self.show_screen(self.progress_screen)  # Show the progress bar screen
+
+    def cancel_scraping(self):
+        """Stop the running scrape at its next page. The NPCs done so far are shown, and the next scrape resumes from
+        the journal."""
+        self.__cancel_scraping.set()
+        self.progress_screen.stop_button.setEnabled(False)
+        self.tables_screen.stop_button.setEnabled(False)
+
+    def open_snapshot(self) -> bool:
+        """Display the NPCs of the last scrape from the snapshot file, if there is a valid one, and return whether
+        there was. A corrupt or stale snapshot is reported and ignored."""
+
+        from terraria.snapshot import DEFAULT_SNAPSHOT_PATH, Snapshot, SnapshotError, StaleSnapshotError
+
+        path = self.snapshot_path or DEFAULT_SNAPSHOT_PATH
+        if not os.path.exists(path):
+            return False
+        try:
+            with Snapshot(path) as snapshot:
+                self.__npcs = snapshot.npcs()
+        except StaleSnapshotError as exc:  # Written by another version; the next scrape replaces it
+            print(f'Ignoring the snapshot of the last scrape, written by another version ({exc}).')
+            return False
+        except (OSError, SnapshotError) as exc:
+            print(f'Ignoring the snapshot of the last scrape ({exc}).')
+            return False
+
+        self.__snapshot = snapshot
+        self.populate_tables_screen()
+        self.tables_screen.set_status(
+            f'Results of {time.strftime("%Y-%m-%d %H:%M", time.localtime(snapshot.created))}')
+        self.show_screen(self.tables_screen)
+        return True
+
+    def refresh_if_stale(self):
+        """Refresh the results opened from the snapshot in the background (see refresh_from_wiki()) if the snapshot is
+        older than snapshot_refresh_age. Otherwise they are kept as they are, and the data stack is prewarmed for
+        searching them."""
+
+        from scraper.http_cache import DEFAULT_CACHE_TTL
+
+        max_age = DEFAULT_CACHE_TTL if self.snapshot_refresh_age is None else self.snapshot_refresh_age
+        if self.__snapshot is not None and self.__snapshot.is_stale(max_age):
+            self.refresh_from_wiki()
+        else:
+            print('The results of the last scrape are recent, not refreshing them.')
+            self.prewarm()
+
+    def refresh_from_wiki(self):
+        """Scrape the wiki again in the background, while the results opened from the snapshot stay displayed. They
+        are replaced (and the snapshot updated) once the scrape completes."""
+
+        self.__refreshing = True
+        self.tables_screen.set_status(f'{self.tables_screen.status}, refreshing from the wiki...')
+        self.begin_scraping_wiki(show_progress_screen=False)
+
+    def save_snapshot(self):
+        """Save the scraped NPCs to the snapshot file, for the next launch."""
+
+        from terraria.snapshot import DEFAULT_SNAPSHOT_PATH, write_snapshot
+
+        try:
+            write_snapshot(self.__npcs, self.snapshot_path or DEFAULT_SNAPSHOT_PATH)
+        except OSError as exc:
+            print(f'Could not save the snapshot of the scrape ({exc}).')
 
     def _scrape_wiki(self):
         """Begin scraping the wiki page. This method will raise an exception if a thread different from the scraper
@@ -102,71 +281,95 @@ class AppWindow(Panel):
 
         success = False
         result = None
+        error = None
 
         try:
-            scrape = read_terraria_wiki()  # Get a scraping generator
+            # Already imported if the prewarm thread is done
+            from scraper.scraping import PAGE_FAILED, read_terraria_wiki
+            from scraper.instrumentation import Tracer, NULL_TRACER
+            from scraper.scheduler import CrawlScheduler
+            from scraper.journal import DEFAULT_JOURNAL_PATH, CrawlJournal
+
+            tracer = Tracer() if self.trace_scraping else NULL_TRACER
+            self.__tracer = tracer if tracer.enabled else None  # Only read by the main thread after scraping_complete
+
+            scheduler = None
+            if self.adaptive_scraping:
+                scheduler = CrawlScheduler(max_concurrency=self.scraper_max_workers,
+                                           on_update=self.scraping_crawl_state.emit)
+
+            journal = None
+            if self.journal_scraping:
+                journal = CrawlJournal(self.journal_path or DEFAULT_JOURNAL_PATH)
+
+            # Get a scraping generator
+            scrape = read_terraria_wiki(max_workers=self.scraper_max_workers, tracer=tracer,
+                                        parse_processes=self.scraper_parse_processes, scheduler=scheduler,
+                                        source=self.scraper_source, journal=journal, cancel=self.__cancel_scraping)
 
             # Get the total amount of web pages that will be scraped
             self.scraping_set_max_progress.emit(scrape.__next__())
+            failed_pages = 0
 
             while True:
                 try:
-                    scrape.__next__()  # Scrape the next NPC
+                    page = scrape.__next__()  # Scrape the next NPC
                 except StopIteration as exc:
                     result = exc.value  # Grab the result
                     break  # We are done scraping
                 finally:
                     self.scraping_increment_progress.emit()  # Increment the progress bar
 
+                if page.npc is not None:
+                    self.scraping_npc_ready.emit(page.npc)  # Hand the NPC over to the main thread right away
+                elif page.status == PAGE_FAILED:
+                    failed_pages += 1
+
             # It would be better to put the result in a Queue so the main thread can safely update the self.__npcs
             # variable to prevent a race condition, however it seems unnecessary to invest in this architecture for
             # just this single variable write, and by design this variable should not be touched by the main thread
             # prior to a scraping_complete signal.
             self.__npcs = result  # Store the result
+            self.__scrape_cancelled = self.__cancel_scraping.is_set()
+            self.__failed_pages = failed_pages
 
             success = True
 
         except Exception as exc:
-            pass  # Ignore exceptions, just cancel everything and proceed to the cleanup code in the 'finally' clause.
+            # Report the exception, then cancel everything and proceed to the cleanup code in the 'finally' clause.
+            traceback.print_exc()
+            error = f'{type(exc).__name__}: {exc}'
 
         finally:
             self.scraping_thread_running.clear()  # Clear the scraper thread "running" event
             self.__scraper = None  # Clear the reference to the scraper thread
-            self.scraping_complete.emit() if success else self.scraping_failed.emit()  # Emit scraping status
+            # Emit scraping status
+            if success:
+                self.scraping_complete.emit()
+            else:
+                self.scraping_failed.emit(error or 'Scraping was interrupted.')
 
     def generate_stats(self):
-        """Generate some shared stats from the scraped npcs."""
-        favorite_biomes_counts = {}
-        least_favorite_biomes_counts = {}
-        favorite_neighbor_counts = {}
-        least_favorite_neighbor_counts = {}
-
-        for npc in self.__npcs:
-
-            for favorite_biome in npc.favorite_biomes:
-                if favorite_biome not in favorite_biomes_counts.keys():
-                    favorite_biomes_counts[favorite_biome] = 0
-                favorite_biomes_counts[favorite_biome] += 1
-
-            for favorite_neighbor in npc.favorite_neighbors:
-                if favorite_neighbor not in favorite_neighbor_counts.keys():
-                    favorite_neighbor_counts[favorite_neighbor] = 0
-                favorite_neighbor_counts[favorite_neighbor] += 1
-
-            for least_favorite_biome in npc.least_favorite_biomes:
-                if least_favorite_biome not in least_favorite_biomes_counts.keys():
-                    least_favorite_biomes_counts[least_favorite_biome] = 0
-                least_favorite_biomes_counts[least_favorite_biome] += 1
-
-            for least_favorite_neighbor in npc.least_favorite_neighbors:
-                if least_favorite_neighbor not in least_favorite_neighbor_counts.keys():
-                    least_favorite_neighbor_counts[least_favorite_neighbor] = 0
-                least_favorite_neighbor_counts[least_favorite_neighbor] += 1
-
-        self.favorite_biomes_counts = favorite_biomes_counts
-        self.least_favorite_biomes_counts = least_favorite_biomes_counts
-        self.favorite_neighbor_counts = favorite_neighbor_counts
-        self.least_favorite_neighbor_counts = least_favorite_neighbor_counts
+        """Generate some shared stats from the scraped npcs. The stats are computed once per set of NPCs."""
+        from terraria.stats import preference_stats
+        self._set_stats(preference_stats(self.__npcs))
+
+    def update_stats(self, npcs):
+        """Add the passed NPCs, just received from the scraper thread, to the stats of the NPCs received before them.
+        Only the new NPCs' stats are computed (see PreferenceCounts)."""
+
+        from terraria.stats import PreferenceCounts
+
+        if self.__received_counts is None:
+            self.__received_counts = PreferenceCounts()
+        self.__received_counts.add(npcs)
+        self._set_stats(self.__received_counts)
+
+    def _set_stats(self, stats):
+        self.favorite_biomes_counts = stats.favorite_biome_counts
+        self.least_favorite_biomes_counts = stats.least_favorite_biome_counts
+        self.favorite_neighbor_counts = stats.favorite_neighbor_counts
+        self.least_favorite_neighbor_counts = stats.least_favorite_neighbor_counts
 
     def print_stats(self):
         # For now, we'll be printing this, but it should eventually move somewhere in the gui.
@@ -189,16 +392,89 @@ class AppWindow(Panel):
         for neighbor, amount in self.least_favorite_neighbor_counts.items():
             print('{0:30}{1:2}'.format(neighbor, amount))
 
+    def _event_npc_ready(self, npc: 'NPC'):
+        if self.__refreshing:
+            return  # The snapshot's tables stay until the refresh is complete
+        self.__pending_npcs.append(npc)
+        if not self.__npc_batch_timer.isActive():
+            self.__npc_batch_timer.start()  # Display this NPC, and any that arrive shortly after it, in one batch
+
+    def flush_pending_npcs(self):
+        """Add the tables of the NPCs received since the last flush to the tables screen, and update the stats."""
+
+        self.__npc_batch_timer.stop()
+        batch, self.__pending_npcs = self.__pending_npcs, []
+        if not batch:
+            return
+
+        self.__received_npcs.extend(batch)
+
+        # While searching, only the new NPCs need to be matched: whether an NPC matches only depends on its own
+        # preferences. The tables already shown are left alone.
+        shown = None
+        if self.tables_screen.filtered:
+            from terraria.query import PreferenceIndex
+            shown = PreferenceIndex(batch).search(self.__search_text)
+        self.tables_screen.add_tables((npc_table(npc) for npc in batch), shown)
+        self.update_stats(batch)
+
+        if self.stack.currentWidget() is self.progress_screen:
+            self.show_screen(self.tables_screen)  # Show the first results as soon as they are in
+
     def _event_scraping_complete(self):
+        self.tables_screen.finish_progress()
+        if self.__refreshing and (self.__scrape_cancelled or self.__failed_pages):  # Keep the snapshot's results
+            self.__refreshing = False
+            outcome = 'was stopped' if self.__scrape_cancelled else f'missed {self.__failed_pages} NPC pages'
+            print(f'The refresh {outcome}. Keeping the results of the last scrape.')
+            self.tables_screen.set_status(f'{self.tables_screen.status} (the refresh {outcome})')
+            return
+
+        self.flush_pending_npcs()  # Display any NPCs still waiting for the next batch
+
+        # Tables were added in the order the pages completed, rebuild them in wiki order if it differs
+        if len(self.__received_npcs) != len(self.__npcs) or \
+                any(npc is not received for npc, received in zip(self.__npcs, self.__received_npcs)):
+            self.populate_tables_screen()
+
         self.generate_stats()  # Generate some stats
         self.print_stats()
-        self.populate_tables_screen()  # Create tables from the scraped data
+        # Partial results: keep the snapshot of the last complete scrape
+        if self.__scrape_cancelled:
+            self.tables_screen.set_status(f'Stopped after {len(self.__npcs)} NPCs, the next scrape resumes from there')
+        elif self.__failed_pages:
+            self.tables_screen.set_status(f'{self.__failed_pages} NPC pages failed, the next scrape retries them')
+        else:
+            self.save_snapshot()
+
+        if self.__refreshing:
+            self.__refreshing = False
+            self.tables_screen.set_status('Refreshed from the wiki')
+
+        if self.__tracer is not None:
+            print(f'\nScrape timings:\n{self.__tracer.summary_table()}')
+            self.tables_screen.timings_button.show()
+
         self.show_screen(self.tables_screen)  # Show the tables screen
 
-    def _event_scraping_failed(self):
-        print('Scraper encountered errors. Terminating program.')
+    def _event_scraping_failed(self, reason: str):
+        if self.__refreshing:  # Keep the snapshot's results
+            self.__refreshing = False
+            print(f'Scraper encountered errors ({reason}). Keeping the results of the last scrape; the next scrape '
+                  f'resumes from the pages completed so far.')
+            self.tables_screen.finish_progress()
+            self.tables_screen.set_status(f'{self.tables_screen.status} (the refresh failed)')
+            return
+
+        print(f'Scraper encountered errors ({reason}). The next scrape resumes from the pages completed so far. '
+              f'Terminating program.')
         QTimer.singleShot(1000, self.close)  # Terminate after 1 second
 
+    def show_timings(self):
+        """Show the timing summary of the last scrape in a dialog."""
+        if self.__tracer is not None:
+            TimingsDialog(self.__tracer, self).exec()
+
     def populate_tables_screen(self):
         """Create tables from the scraped data and add them to the tables screen."""
 
@@ -208,11 +484,28 @@ class AppWindow(Panel):
                 'Attempting to access thread-unsafe variable "self.__npcs" while the scraping thread is running.'
             )
 
-        for npc in self.__npcs:
-            # Get the npc's living preferences data frame if there is one, or create a dummy empty data frame
-            df = npc.living_preferences if npc.living_preferences is not None else pd.DataFrame()
-            table_model = DataFrameTableModel(df)  # Create a table model from the data frame
-            self.tables_screen.add_table(npc.name, table_model)  # Add the table to the tables screen
+        # Replace all tables in one batch (only the changed cells are repainted if the same NPCs were scraped again)
+        self.tables_screen.set_tables(npc_table(npc) for npc in self.__npcs)
+        self.__received_npcs = list(self.__npcs)
+        self.__received_counts = None  # The running totals were of the NPCs replaced here
+        self.apply_search()
+
+    def _event_search(self, text: str):
+        self.__search_text = text
+        self.apply_search()
+
+    def apply_search(self):
+        """Only show the tables of the NPCs (received so far) matching the search box query, or all of them if it is
+        empty. The query runs on an inverted index of the NPCs' preferences, built once per set of NPCs."""
+
+        if not self.__search_text.strip():
+            if self.tables_screen.filtered:
+                self.tables_screen.filter_tables(None)
+            return
+
+        from terraria.query import preference_index
+
+        self.tables_screen.filter_tables(preference_index(self.__received_npcs).search(self.__search_text))
 
     def show_screen(self, screen: QWidget):
         """Change the current widget of the view stack, and handle any view-specific initialization or validation."""
@@ -226,5 +519,9 @@ class AppWindow(Panel):
                 self.setGeometry(200, 100, w, h)
 
     def closeEvent(self, a0: QtGui.QCloseEvent) -> None:
+        scraper = self.__scraper
+        if scraper is not None:  # Stop the scrape at its next page, so that its journal is closed cleanly
+            self.__cancel_scraping.set()
+            scraper.join(self.close_scraping_timeout)
         print('All done!')
         super().closeEvent(a0)
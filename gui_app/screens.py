@@ -1,11 +1,12 @@
 
-import pandas as pd
-
 from PyQt6 import QtWidgets
-from PyQt6.QtCore import Qt, QAbstractTableModel
-from PyQt6.QtWidgets import QWidget, QPushButton, QProgressBar, QTableView, QLabel, QGridLayout
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QFontDatabase
+from PyQt6.QtWidgets import QWidget, QPushButton, QProgressBar, QTableView, QLabel, QDialog, \
+    QPlainTextEdit, QFileDialog, QLineEdit
 
 from gui_lib.basic import Panel
+from gui_lib.tables import GroupedTableModel
 from gui_lib.quick_layouts import QuickHBox, QuickVBox
 
 
@@ -26,7 +27,11 @@ class LoadingScreen(QWidget):
         self.progress_bar = QProgressBar(self)
         self.progress_bar.setFixedSize(250, 30)
         self.progress_bar.setValue(0)
-        QuickHBox(self).add((self.progress_bar, Qt.AlignmentFlag.AlignCenter))
+        self.crawl_label = QLabel(self)  # The pace of an adaptive scrape
+        self.stop_button = QPushButton('Stop', self)  # Needs to be externally connected to an event
+        QuickVBox(self, spacing=5).add(1, (self.progress_bar, Qt.AlignmentFlag.AlignCenter),
+                                       (self.crawl_label, Qt.AlignmentFlag.AlignCenter),
+                                       (self.stop_button, Qt.AlignmentFlag.AlignCenter), 1)
 
     def init_progress(self, max_value):
         """Reset the progress bar to 0, set a new max value, and calculate the increment step to use."""
@@ -39,27 +44,159 @@ class LoadingScreen(QWidget):
         """Increment the progress bar based on the predefined step."""
         self.progress_bar.setValue(self.progress_bar.value() + self.step)
 
+    def show_crawl_state(self, state):
+        """Show the current rate and concurrency of an adaptive scrape (a CrawlState) under the progress bar."""
+        self.crawl_label.setText(state.describe())
+
 
 class TableScreen(QWidget):
+    """Displays the living preferences of all NPCs in a single table view, grouped by NPC. Only the visible rows are
+    ever painted, so the screen stays cheap to build and to scroll no matter how many NPCs there are. Tables can be
+    added while scraping is still running, in which case a progress bar is shown above them. A search box above the
+    tables narrows them down to the NPCs matching a query, and clicking a column header sorts the NPCs by it."""
+
     def __init__(self, parent=None):
         super().__init__(parent=parent)
 
-        self.tables_count = 0  # The amount of currently displayed tables
-        self.grid = QGridLayout(self)
-        self.grid.setSpacing(15)
-        self.grid.setContentsMargins(30, 0, 30, 0)
-
-    def add_table(self, table_title: str, table_model: QAbstractTableModel):
-        """Add a table to be displayed in this view."""
-
-        label = QLabel(table_title, self)  # Create a table name label
-        table = QTableView(self)  # Create a table view
-        table.setModel(table_model)  # Assign the table model to the table view
-        table.setMinimumSize(300, 200)  # Restrict minimum size
-        table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Stretch)  # Allow column stretch
-
-        # Add to layout
-        i = self.tables_count // 3  # Determine row position
-        j = self.tables_count % 3  # Determine col position
-        self.grid.addLayout(QuickVBox().add(label, table), i, j)  # Add to grid layout
-        self.tables_count += 1  # Increment amount of tables we are currently displaying
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setFixedHeight(12)
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.hide()  # Only shown while scraping
+
+        self.search_box = QLineEdit(self)  # Needs to be externally connected to an event
+        self.search_box.setPlaceholderText('Search, e.g. "loves hallow, hates guide"')
+        self.search_box.setClearButtonEnabled(True)
+        self.search_status = QLabel(self)
+
+        self.model = GroupedTableModel(column_names=('Biome', 'Neighbor'), title_header='NPC', label_header='Liking')
+
+        self.table = QTableView(self)
+        self.table.setModel(self.model)
+        self.table.verticalHeader().setVisible(False)  # The liking column already labels the rows
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Fixed)  # Uniform rows
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(2, QtWidgets.QHeaderView.ResizeMode.Stretch)  # Allow column stretch
+        header.setSectionResizeMode(3, QtWidgets.QHeaderView.ResizeMode.Stretch)
+        header.setSortIndicatorClearable(True)  # A third click restores the order the NPCs were scraped in
+        header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.table.setSortingEnabled(True)  # Sorts the NPCs as a whole, by their rows' text in the clicked column
+
+        self.timings_button = QPushButton('Show timings', self)  # Needs to be externally connected to an event
+        self.timings_button.hide()  # Only shown once the timings of a scrape are available
+
+        self.status_label = QLabel(self)
+        self.crawl_label = QLabel(self)  # The pace of an adaptive scrape, while scraping
+        self.stop_button = QPushButton('Stop', self)  # Needs to be externally connected to an event
+        self.stop_button.hide()  # Only shown while scraping
+
+        QuickVBox(self, contents_margins=(30, 0, 30, 0)).add(self.progress_bar,
+                                                             QuickHBox(spacing=10, contents_margins=(0, 5, 0, 5)).add(
+                                                                 self.search_box, self.search_status),
+                                                             self.table,
+                                                             QuickHBox(contents_margins=(0, 5, 0, 5)).add(
+                                                                 self.status_label, 1, self.crawl_label,
+                                                                 10.0, self.stop_button, self.timings_button))
+
+    @property
+    def tables_count(self):
+        """The amount of currently displayed NPC tables."""
+        return self.model.group_count
+
+    def add_table(self, table_title: str, row_labels, rows):
+        """Add an NPC's table to be displayed in this view."""
+        self.model.add_group(table_title, row_labels, rows)
+
+    def add_tables(self, tables, shown=None):
+        """Add many (table_title, row_labels, rows) tables to be displayed in this view at once. While the tables are
+        filtered, shown holds the titles of the new tables that pass the filter."""
+        self.model.add_groups(tables, shown)
+        if self.filtered:
+            self._show_search_status()
+
+    def set_tables(self, tables):
+        """Display the passed (table_title, row_labels, rows) tables instead of the current ones. Tables keeping their
+        titles and sizes are updated in place, so the view keeps its scroll position, selection and sorting."""
+        self.model.set_groups(tables)
+        if self.filtered:
+            self._show_search_status()
+
+    def clear_tables(self):
+        """Remove all displayed tables."""
+        self.model.clear()
+        self.search_status.clear()
+
+    @property
+    def filtered(self) -> bool:
+        """Whether only some of the tables are shown."""
+        return self.model.group_filter is not None
+
+    def filter_tables(self, titles=None):
+        """Only show the tables whose title is in titles (a set), or every table with None."""
+        self.model.set_group_filter(titles)
+        if titles is None:
+            self.search_status.clear()
+        else:
+            self._show_search_status()
+
+    def _show_search_status(self):
+        self.search_status.setText(f'{self.model.shown_group_count} of {self.tables_count} NPCs')
+
+    @property
+    def status(self) -> str:
+        return self.status_label.text()
+
+    def set_status(self, text: str):
+        """Show a line about where the displayed tables come from (e.g. the snapshot of the last scrape)."""
+        self.status_label.setText(text)
+
+    def init_progress(self, max_value):
+        """Show the progress bar, empty, with a new max value, and the stop button."""
+        self.progress_bar.setRange(0, max_value)
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.stop_button.setEnabled(True)
+        self.stop_button.show()
+
+    def increment_progress(self):
+        self.progress_bar.setValue(min(self.progress_bar.value() + 1, self.progress_bar.maximum()))
+
+    def show_crawl_state(self, state):
+        """Show the current rate and concurrency of an adaptive scrape (a CrawlState) while it runs."""
+        self.crawl_label.setText(state.describe())
+
+    def finish_progress(self):
+        """Hide the progress bar, the pace of the scrape and the stop button."""
+        self.progress_bar.hide()
+        self.crawl_label.clear()
+        self.stop_button.hide()
+
+
+class TimingsDialog(QDialog):
+    """Displays the timing summary of a scrape, and lets the user save its Chrome trace."""
+
+    def __init__(self, tracer, parent=None):
+        super().__init__(parent=parent)
+        self.tracer = tracer
+
+        self.setWindowTitle('Scrape timings')
+        self.resize(760, 420)
+
+        summary = QPlainTextEdit(tracer.summary_table(), self)
+        summary.setReadOnly(True)
+        summary.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        summary.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+
+        save_button = QPushButton('Save trace...', self)
+        save_button.clicked.connect(lambda checked: self.save_trace())
+        close_button = QPushButton('Close', self)
+        close_button.clicked.connect(lambda checked: self.accept())
+
+        QuickVBox(self, spacing=5, contents_margins=(10, 10, 10, 10)).add(
+            summary, QuickHBox(spacing=5).add(1, save_button, close_button))
+
+    def save_trace(self):
+        """Ask for a file name, and save the Chrome trace (viewable in chrome://tracing or Perfetto) to it."""
+        path, _ = QFileDialog.getSaveFileName(self, 'Save trace', 'scrape_trace.json', 'JSON files (*.json)')
+        if path:
+            self.tracer.write_chrome_trace(path)
@@ -1,31 +1,273 @@
 
-from pandas import DataFrame
-from PyQt6.QtCore import Qt, QAbstractTableModel
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt6.QtGui import QBrush, QColor
 
+# The roles data() answers, looked up once rather than on every call. Views pass roles as plain ints, which compare
+# equal to (and hash like) the role enum members
+_TEXT_ROLES = frozenset((Qt.ItemDataRole.DisplayRole.value, Qt.ItemDataRole.ToolTipRole.value))
+_BACKGROUND_ROLE = Qt.ItemDataRole.BackgroundRole.value
 
-class DataFrameTableModel(QAbstractTableModel):
-    """Adapt a pandas DataFrame to a QAbstractTableModel."""
 
-    def __init__(self, df: DataFrame):
+class GroupedTableModel(QAbstractTableModel):
+    """A single flat table model holding many small tables (groups) one below the other. The first column holds the
+    group title (on the first row of each group only), the second one the row label, followed by the data columns.
+    Alternate groups are shaded, so that a single view can display all of them while only painting the visible rows.
+
+    Every cell is stringified once, when its group is added, so data() is a plain lookup. Groups can be filtered by
+    title with set_group_filter(), and sorted as a whole by the text of a column with sort(). Replacing all groups
+    with set_groups() only signals the cells that changed, as long as the groups keep their titles and sizes."""
+
+    def __init__(self, column_names, title_header='', label_header=''):
         super().__init__()
-        self._df = df
+        self._headers = (title_header, label_header, *column_names)
+        self._rows = []  # A tuple of display strings per row
+        self._backgrounds = []  # The background brush of each row (None for unshaded groups) when shown as added
+        self._group_starts = []  # The first row of each group
+        self._group_filter = None  # The titles of the shown groups (None shows all groups)
+        self._sort_column = None  # The column the groups are sorted by (None keeps them in the order they were added)
+        self._sort_order = Qt.SortOrder.AscendingOrder
+        self._order = None  # The shown groups, in display order (None when every group is shown as added)
+        self._visible_rows = None  # The rows of the shown groups, with their background brush (None with _order)
+        self._shade = QBrush(QColor(0, 0, 0, 14))
+
+    @property
+    def group_count(self):
+        return len(self._group_starts)
+
+    @property
+    def shown_group_count(self):
+        """The amount of groups passing the group filter."""
+        return len(self._group_starts) if self._order is None else len(self._order)
+
+    @property
+    def group_filter(self):
+        """The titles of the shown groups (None when every group is shown)."""
+        return self._group_filter
+
+    @staticmethod
+    def _rows_of(groups, offset: int):
+        """Return the display rows of (title, row_labels, rows) groups, and the first row of each group, counting from
+        offset."""
+
+        rows = []
+        starts = []
+        for title, row_labels, cells in groups:
+            starts.append(offset + len(rows))
+            for i, (label, row) in enumerate(zip(row_labels, cells)):
+                rows.append((title if i == 0 else '', str(label), *(str(cell) for cell in row)))
+        return rows, starts
+
+    def _group_range(self, group: int):
+        start = self._group_starts[group]
+        stop = self._group_starts[group + 1] if group + 1 < len(self._group_starts) else len(self._rows)
+        return start, stop
+
+    def _shown(self, group: int) -> bool:
+        return self._group_filter is None or self._rows[self._group_starts[group]][0] in self._group_filter
+
+    def _sort_key(self, group: int):
+        # The text of the sort column from the first row of the group down (for the title column, just the title)
+        column = self._sort_column
+        return tuple(self._rows[row][column] for row in range(*self._group_range(group)))
+
+    def _display_order(self, groups):
+        """The groups that pass the filter, in display order."""
+        groups = [group for group in groups if self._shown(group)]
+        if self._sort_column is not None:  # A stable sort, so that equal groups keep the order they were added in
+            groups.sort(key=self._sort_key, reverse=self._sort_order == Qt.SortOrder.DescendingOrder)
+        return groups
+
+    def _layout(self):
+        """Lay out the rows of the shown groups in display order, shading them alternately."""
+
+        if self._group_filter is None and self._sort_column is None:
+            self._order = self._visible_rows = None
+            return
+        self._order = self._display_order(range(len(self._group_starts)))
+        self._visible_rows = []
+        self._shade_from(0)
+
+    def _shade_from(self, position: int):
+        """Rebuild the visible rows of the shown groups from the one at position down, and return the first row."""
+
+        first = sum(stop - start for start, stop in map(self._group_range, self._order[:position]))
+        rows = []
+        for i, group in enumerate(self._order[position:], position):
+            background = self._shade if i % 2 else None
+            rows.extend((row, background) for row in range(*self._group_range(group)))
+        self._visible_rows[first:] = rows
+        return first
+
+    def add_group(self, title: str, row_labels, rows):
+        """Append a group to the table. Rows are sequences of cell values, one per data column."""
+        self.add_groups([(title, row_labels, rows)])
+
+    def add_groups(self, groups, shown=None):
+        """Append many (title, row_labels, rows) groups to the table at once.
+
+        While the groups are filtered or sorted, only the new groups are tested against the filter, and shown ones are
+        inserted in place (below the shown groups, or at their sorted position), so the rows already displayed are left
+        alone. Pass the titles of the new groups that pass the filter as shown, to add them to it (e.g. the matches of
+        a search among the new groups only)."""
+
+        new_rows, new_group_starts = self._rows_of(groups, len(self._rows))
+        if not new_rows:
+            return
 
-    def rowCount(self, parent=None):
-        return self._df.shape[0]
+        if self._order is None:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(new_rows) - 1)
+            self._extend(new_rows, new_group_starts)
+            self.endInsertRows()
+            return
 
-    def columnCount(self, parnet=None):
-        return self._df.shape[1]
+        if shown and self._group_filter is not None:
+            self._group_filter = self._group_filter | shown
+        first_group = len(self._group_starts)
+        self._extend(new_rows, new_group_starts)
+        new_groups = self._display_order(range(first_group, len(self._group_starts)))
+        if not new_groups:
+            return
+
+        # The display position of each new group among the shown ones, and the visible row of each shown group
+        positions = [self._position(group) for group in new_groups]
+        starts = []
+        row = 0
+        for group in self._order:
+            starts.append(row)
+            start, stop = self._group_range(group)
+            row += stop - start
+        starts.append(row)
+
+        # Insert from the bottom up (the new groups are in display order, so their positions never decrease), so that
+        # the rows of the positions above are not moved by the insertions
+        for group, position in reversed(list(zip(new_groups, positions))):
+            start, stop = self._group_range(group)
+            row = starts[position]
+            self.beginInsertRows(QModelIndex(), row, row + stop - start - 1)
+            self._order.insert(position, group)
+            self._visible_rows[row:row] = [(source, None) for source in range(start, stop)]
+            self.endInsertRows()
+
+        # The groups below the first insertion moved down, shade them again
+        first = self._shade_from(min(positions))
+        self.dataChanged.emit(self.index(first, 0), self.index(len(self._visible_rows) - 1, len(self._headers) - 1),
+                              [Qt.ItemDataRole.BackgroundRole])
+
+    def _extend(self, new_rows, new_group_starts):
+        group = len(self._group_starts)
+        stops = new_group_starts[1:] + [len(self._rows) + len(new_rows)]
+        for i, (start, stop) in enumerate(zip(new_group_starts, stops), group):
+            self._backgrounds.extend([self._shade if i % 2 else None] * (stop - start))
+        self._rows.extend(new_rows)
+        self._group_starts.extend(new_group_starts)
+
+    def _position(self, group: int) -> int:
+        """The display position of a new group among the shown groups: after every equal or preceding one when sorted,
+        below all of them otherwise."""
+
+        if self._sort_column is None:
+            return len(self._order)
+        key = self._sort_key(group)
+        ascending = self._sort_order == Qt.SortOrder.AscendingOrder
+        low, high = 0, len(self._order)
+        while low < high:
+            middle = (low + high) // 2
+            other = self._sort_key(self._order[middle])
+            if other <= key if ascending else other >= key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def set_groups(self, groups):
+        """Replace every group with the passed (title, row_labels, rows) groups. If they have the same titles and
+        sizes as the current groups, in the same order, only the cells that changed are signalled with dataChanged
+        (the view keeps its scroll position and selection), otherwise the model is reset. The filter and sorting
+        apply to the new groups."""
+
+        rows, group_starts = self._rows_of(groups, 0)
+        if group_starts != self._group_starts or len(rows) != len(self._rows) or \
+                any(rows[start][0] != self._rows[start][0] for start in group_starts):
+            self.beginResetModel()
+            self._rows, self._backgrounds, self._group_starts = [], [], []
+            self._extend(rows, group_starts)
+            self._layout()
+            self.endResetModel()
+            return
+
+        changed = [row for row, (old, new) in enumerate(zip(self._rows, rows)) if old != new]
+        if not changed:
+            return
+
+        if self._sort_column is not None:
+            # Changed cells may reorder the groups
+            self.layoutAboutToBeChanged.emit()
+            self._rows = rows
+            self._layout()
+            self.layoutChanged.emit()
+            return
+
+        self._rows = rows
+        if self._order is not None:  # Signal the visible rows showing the changed rows
+            changed = set(changed)
+            changed = [row for row, (source, _) in enumerate(self._visible_rows) if source in changed]
+            if not changed:
+                return
+        self.dataChanged.emit(self.index(changed[0], 0), self.index(changed[-1], len(self._headers) - 1),
+                              [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole])
+
+    def set_group_filter(self, titles=None):
+        """Only show the groups whose title is in titles (a set), or every group with None. Shown groups keep their
+        order, and are shaded alternately again."""
+
+        if titles == self._group_filter:
+            return  # Already filtered this way: keep the view's scroll position and selection
+        self.beginResetModel()
+        self._group_filter = titles
+        self._layout()
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Sort the groups as a whole by the text of the passed column, from their first row down (or restore the
+        order they were added in if the column is negative)."""
+
+        column = column if column >= 0 else None
+        if column == self._sort_column and (column is None or order == self._sort_order):
+            return
+        self.layoutAboutToBeChanged.emit()
+        self._sort_column, self._sort_order = column, order
+        self._layout()
+        self.layoutChanged.emit()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows, self._backgrounds, self._group_starts = [], [], []
+        self._group_filter = None
+        self._layout()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows) if self._visible_rows is None else len(self._visible_rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
 
     def data(self, index, role=Qt.ItemDataRole.DisplayRole):
         if index.isValid():
-            if role in {Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole}:
-                return str(self._df.iloc[index.row(), index.column()])
+            row = index.row()
+            if self._visible_rows is None:
+                background = self._backgrounds[row]
+            else:
+                row, background = self._visible_rows[row]
+            if role in _TEXT_ROLES:
+                return self._rows[row][index.column()]
+            if role == _BACKGROUND_ROLE:
+                return background
         return None
 
-    def headerData(self, col, orientation, role):
+    def headerData(self, section, orientation, role):
         if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
-            return self._df.columns[col]
-        elif orientation == Qt.Orientation.Vertical and role == Qt.ItemDataRole.DisplayRole:
-            return self._df.index[col]
-        else:
-            return None
+            return self._headers[section]
+        return None
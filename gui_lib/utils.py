@@ -1,7 +1,6 @@
 
 from typing import Union
 from contextlib import contextmanager
-import pandas as pd
 from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import QWidget, QScrollArea, QHBoxLayout, QVBoxLayout, QGridLayout
 
@@ -39,6 +38,8 @@ def no_truncating():
     """Prevent pandas printing from truncating the output if it is too large, by temporarily disabling some
     restrictions."""
 
+    import pandas as pd  # Imported on use, so that importing gui_lib does not import pandas
+
     max_rows = pd.get_option('display.max_rows')
     max_cols = pd.get_option('display.max_columns')
     width = pd.get_option('display.width')
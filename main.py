@@ -1,13 +1,27 @@
-
 import sys
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
 from gui_app.app import AppWindow
 
 
 def main():
+    if '--startup-report' in sys.argv:
+        from startup import startup_report
+        startup_report(slowest=10, window_runs=3)
+        return
+
     app = QApplication(sys.argv)
     window = AppWindow()
     window.show()
+
+    if '--exit-when-shown' in sys.argv:  # Used by the startup benchmark (see startup.py)
+        from startup import WINDOW_SHOWN_MARKER
+        QTimer.singleShot(0, lambda: (print(WINDOW_SHOWN_MARKER, flush=True), app.quit()))
+    elif window.open_snapshot():  # Open straight to the results of the last scrape
+        QTimer.singleShot(0, window.refresh_if_stale)  # ... and refresh them in the background once they are old
+    else:
+        QTimer.singleShot(0, window.prewarm)  # Import the scraping stack once the event loop has painted the window
+
     app.exec()
 
 
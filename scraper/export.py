@@ -0,0 +1,184 @@
+import os
+import csv
+import json
+import sys
+from typing import List, Optional, TextIO, Tuple
+
+from terraria.npcs import NPC
+
+
+# Export formats, by file extension
+FORMAT_JSONL = 'jsonl'  # One JSON object per NPC and line
+FORMAT_CSV = 'csv'  # One (npc, level, kind, target) row per preference
+FORMAT_PARQUET = 'parquet'  # Same rows as CSV, as a Parquet file (requires pyarrow)
+FORMAT_FEATHER = 'feather'  # Same rows as CSV, as a Feather (Arrow IPC) file (requires pyarrow)
+EXPORT_FORMATS = (FORMAT_JSONL, FORMAT_CSV, FORMAT_PARQUET, FORMAT_FEATHER)
+
+# The columns of the flat formats. NPCs without living preferences get a single row with empty level, kind and target.
+RECORD_COLUMNS = ('npc', 'level', 'kind', 'target')
+
+
+def npc_document(npc: NPC) -> dict:
+    """Return the JSON document of an NPC: its name, and its biomes and neighbors per liking level (None if the NPC has
+    no living preferences). 'N/A' cells are exported as empty lists."""
+
+    if not npc.liking_levels:
+        return {'name': npc.name, 'preferences': None}
+
+    not_available = (NPC.not_available,)
+    preferences = {}
+    for level in npc.liking_levels:
+        p = npc.preferences_at(level)
+        preferences[level] = {'Biome': [] if p.biomes == not_available else list(p.biomes),
+                              'Neighbor': [] if p.neighbors == not_available else list(p.neighbors)}
+    return {'name': npc.name, 'preferences': preferences}
+
+
+def npc_records(npc: NPC) -> List[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+    """Return the (npc, level, kind, target) rows of an NPC, read straight from its PreferenceStore rows."""
+
+    store, start, stop = npc.preference_rows
+    records = [(npc.name, level, kind, target) for level, kind, target in store.records(start, stop)]
+    return records or [(npc.name, None, None, None)]
+
+
+class NPCWriter:
+    """Writes NPCs to a file one at a time, as they are scraped, so that the output is on disk while the scrape is
+    still running. Use as a context manager, or call close() once done."""
+
+    format = None
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0  # The amount of NPCs written
+
+    def write(self, npc: NPC):
+        self._write(npc)
+        self.count += 1
+
+    def _write(self, npc: NPC):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _TextWriter(NPCWriter):
+    """Base of the text formats. A path of '-' writes to the standard output."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._owns_file = path != '-'
+        self.file: TextIO = open(path, 'w', encoding='utf-8', newline='') if self._owns_file else sys.stdout
+
+    def close(self):
+        if self._owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class JsonLinesWriter(_TextWriter):
+    format = FORMAT_JSONL
+
+    def _write(self, npc: NPC):
+        self.file.write(json.dumps(npc_document(npc), ensure_ascii=False) + '\n')
+        self.file.flush()
+
+
+class CsvWriter(_TextWriter):
+    format = FORMAT_CSV
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._csv = csv.writer(self.file)
+        self._csv.writerow(RECORD_COLUMNS)
+
+    def _write(self, npc: NPC):
+        self._csv.writerows(npc_records(npc))
+        self.file.flush()
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError('The parquet and feather export formats require pyarrow (pip install pyarrow).') from None
+    return pyarrow
+
+
+class _ArrowWriter(NPCWriter):
+    """Base of the Arrow based formats. Columnar files are written in record batches, so rows are buffered and written
+    every batch_size NPCs (and on close), rather than after every NPC."""
+
+    def __init__(self, path: str, batch_size: int = 32):
+        if path == '-':
+            raise RuntimeError(f'The {self.format} export format cannot be written to the standard output.')
+        super().__init__(path)
+        self.pa = _pyarrow()
+        self.schema = self.pa.schema([(column, self.pa.string()) for column in RECORD_COLUMNS])
+        self.batch_size = batch_size
+        self._rows = []
+        self._buffered = 0
+        self._writer = self._open()
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write(self, npc: NPC):
+        self._rows.extend(npc_records(npc))
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            columns = [self.pa.array(column, type=self.pa.string()) for column in zip(*self._rows)]
+            self._writer.write_batch(self.pa.record_batch(columns, schema=self.schema))
+        self._rows, self._buffered = [], 0
+
+    def close(self):
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+
+
+class ParquetWriter(_ArrowWriter):
+    format = FORMAT_PARQUET
+
+    def _open(self):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.path, self.schema)
+
+
+class FeatherWriter(_ArrowWriter):
+    format = FORMAT_FEATHER
+
+    def _open(self):
+        import pyarrow.ipc
+        return pyarrow.ipc.new_file(self.path, self.schema)  # Feather v2 is the Arrow IPC file format
+
+
+# File extensions of the export formats, other than the formats' own names
+_EXTENSION_ALIASES = {'json': FORMAT_JSONL, 'ndjson': FORMAT_JSONL, 'arrow': FORMAT_FEATHER}
+
+WRITERS = {writer.format: writer for writer in (JsonLinesWriter, CsvWriter, ParquetWriter, FeatherWriter)}
+
+
+def open_writer(path: str, export_format: Optional[str] = None) -> NPCWriter:
+    """Open an NPCWriter for the path. The format defaults to the one matching the path's file extension."""
+
+    if export_format is None:
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        export_format = _EXTENSION_ALIASES.get(extension, extension)
+    if export_format not in WRITERS:
+        raise RuntimeError(f'Unknown export format "{export_format}" for "{path}". Choose one of: '
+                           f'{", ".join(EXPORT_FORMATS)}.')
+    return WRITERS[export_format](path)
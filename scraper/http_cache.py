@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import NamedTuple, Optional
+
+import requests
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'terraria_living_preferences')
+
+# Seconds a cached response is served without revalidating it with the wiki
+DEFAULT_CACHE_TTL = 7 * 24 * 3600
+
+
+class CacheEntry(NamedTuple):
+    """The metadata of a cached response. The body is stored in a separate file next to the metadata."""
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    encoding: Optional[str]
+    content_type: Optional[str]
+    stored_at: float  # Unix time of the last download or successful revalidation of the response
+    size: int  # Size of the body in bytes
+
+
+class ResponseCache:
+    """A persistent, URL keyed cache of successful GET responses.
+
+    Each response is stored as two files in cache_dir: the raw body, and a small JSON file with the validators
+    (ETag / Last-Modified) needed to revalidate it with a conditional GET. Entries younger than ttl seconds are served
+    without touching the network. Once the bodies take more than max_size bytes, the least recently used entries are
+    evicted, down to 90% of max_size so that the next stores have room. The size of the bodies is kept as a running
+    total, so the cache directory is only scanned once it goes over max_size. Safe to use from multiple threads."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = DEFAULT_CACHE_TTL,
+                 max_size: int = 64 * 1024 ** 2):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._total_size = None  # The size of the stored bodies in bytes (None until the cache directory is scanned)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url: str):
+        """Return the (metadata, body) file paths for the passed url."""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + '.json'), os.path.join(self.cache_dir, key + '.body')
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Return the cache entry of the passed url, or None if the url is not cached."""
+
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                entry = CacheEntry(**json.load(file))
+        except (OSError, ValueError, TypeError):
+            return None  # Not cached, or the metadata is unreadable and the entry will be overwritten
+        return entry if entry.url == url and os.path.exists(body_path) else None
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """Whether the entry can be served without revalidating it first."""
+        return time.time() - entry.stored_at < self.ttl
+
+    def response(self, entry: CacheEntry) -> requests.Response:
+        """Build a requests.Response from the cached body of the passed entry, and mark the entry as recently used."""
+
+        _, body_path = self._paths(entry.url)
+        with open(body_path, 'rb') as file:
+            content = file.read()
+        os.utime(body_path)  # The modification time of the body doubles as the last access time for LRU eviction
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry.url
+        response.encoding = entry.encoding
+        response._content = content
+        response._content_consumed = True  # Lets iter_content() iterate over the cached body
+        if entry.content_type is not None:
+            response.headers['Content-Type'] = entry.content_type
+        if entry.etag is not None:
+            response.headers['ETag'] = entry.etag
+        if entry.last_modified is not None:
+            response.headers['Last-Modified'] = entry.last_modified
+        return response
+
+    def conditional_headers(self, entry: CacheEntry) -> dict:
+        """Return the request headers that revalidate the passed entry."""
+
+        headers = {}
+        if entry.etag is not None:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified is not None:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, url: str, response: requests.Response) -> CacheEntry:
+        """Store the body and validators of a successful response, then evict entries if the cache grew too large."""
+
+        _, body_path = self._paths(url)
+        try:
+            replaced_size = os.stat(body_path).st_size  # The body of an earlier response to the url is overwritten
+        except FileNotFoundError:
+            replaced_size = 0
+        entry = CacheEntry(
+            url=url,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            encoding=response.encoding,
+            content_type=response.headers.get('Content-Type'),
+            stored_at=time.time(),
+            size=len(response.content),
+        )
+        self._write(entry, response.content)
+        with self._lock:
+            if self._total_size is not None:
+                self._total_size += entry.size - replaced_size
+            oversized = self._total_size is None or self._total_size > self.max_size
+        if oversized:
+            self.evict()
+        return entry
+
+    def refresh(self, entry: CacheEntry) -> CacheEntry:
+        """Restart the time to live of an entry after the server confirmed it is still valid (304 Not Modified)."""
+
+        entry = entry._replace(stored_at=time.time())
+        self._write(entry, None)
+        return entry
+
+    def _write(self, entry: CacheEntry, content: Optional[bytes]):
+        """Atomically write the metadata of the entry, and its body unless content is None."""
+
+        meta_path, body_path = self._paths(entry.url)
+        suffix = f'.{threading.get_ident()}.tmp'  # Temporary files are private to the writing thread
+        if content is not None:
+            with open(body_path + suffix, 'wb') as file:
+                file.write(content)
+            os.replace(body_path + suffix, body_path)
+        with open(meta_path + suffix, 'w', encoding='utf-8') as file:
+            json.dump(entry._asdict(), file)
+        os.replace(meta_path + suffix, meta_path)
+
+    def evict(self):
+        """If the stored bodies take more than max_size bytes, remove the least recently used entries until they fit in
+        90% of it. Scans the whole cache directory, which also resets the running total of the body sizes (e.g. after
+        another process used the cache)."""
+
+        with self._lock:
+            bodies = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.body'):
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                    bodies.append((stat.st_mtime, stat.st_size, name))
+
+            total = sum(size for _, size, _ in bodies)
+            target = self.max_size if total <= self.max_size else self.max_size * 9 // 10
+            for _, size, name in sorted(bodies):  # Oldest access first
+                if total <= target:
+                    break
+                key = name[:-len('.body')]
+                for path in (os.path.join(self.cache_dir, key + '.json'), os.path.join(self.cache_dir, name)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+            self._total_size = total
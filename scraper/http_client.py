@@ -0,0 +1,163 @@
+import time
+import threading
+from typing import NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from scraper.http_cache import ResponseCache
+from scraper.instrumentation import NULL_TRACER, Tracer, COUNTER_BYTES_DOWNLOADED, COUNTER_REQUESTS, COUNTER_RETRIES
+
+
+class RequestTiming(NamedTuple):
+    """Timing information of a single GET request issued through an HttpClient."""
+    url: str
+    status_code: Optional[int]  # None if the request failed without a response
+    elapsed: float  # Wall time in seconds, including retries and backoff sleeps
+    retries: int  # The amount of retries urllib3 made before the final response
+
+
+class HttpClient:
+    """A pooled HTTP client shared by all requests of a scraping run.
+
+    A single requests.Session keeps connections to the wiki alive between pages, so only the first request to a host
+    pays for the TCP/TLS handshake. At most max_connections_per_host connections are open to the same host; threads
+    asking for more wait for a free connection. Every request has a (connect, read) timeout, and responses with a
+    429 or 5xx status code are retried with exponential backoff, honouring the Retry-After header when present.
+
+    With a ResponseCache, fresh cached pages are served without any network traffic, and stale ones are revalidated
+    with a conditional GET (a 304 response transfers no body). In offline mode only the cache is used, and requesting
+    a page that is not cached raises a RuntimeError.
+
+    Each network request is counted and timed, see count, cache_hits, timings and timing_summary(). With a Tracer,
+    the requests, retries and downloaded bytes (of non streamed bodies) are also counted in it."""
+
+    # Status codes worth retrying: rate limiting and transient server errors
+    retry_status_codes = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_connections_per_host: int = 8, connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_retries: int = 3, backoff_factor: float = 0.5, cache: Optional[ResponseCache] = None,
+                 offline: bool = False, tracer: Tracer = NULL_TRACER):
+        if offline and cache is None:
+            raise RuntimeError('Offline mode requires a response cache.')
+
+        self.cache = cache
+        self.offline = offline
+        self.tracer = tracer
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,  # Sleep backoff_factor * 2 ** (retry - 1) seconds between retries
+            status_forcelist=self.retry_status_codes,
+            allowed_methods=('GET', 'HEAD'),
+            respect_retry_after_header=True,
+            raise_on_status=False,  # Return the last response instead of raising once the retries run out
+        )
+        adapter = HTTPAdapter(pool_maxsize=max_connections_per_host, pool_block=True, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.count = 0  # The amount of network requests issued through this client
+        self.cache_hits = 0  # The amount of requests served from the cache without any network traffic
+        self.timings = []  # A RequestTiming per issued request, in order of completion
+        self._lock = threading.Lock()  # The client is shared by the page scraping threads in concurrent mode
+
+    def get(self, url: str) -> requests.Response:
+        """Return the response for a GET request of the passed url, either from the cache or from the network."""
+
+        entry = self.cache.lookup(url) if self.cache is not None else None
+
+        if entry is not None and (self.offline or self.cache.is_fresh(entry)):
+            with self._lock:
+                self.cache_hits += 1
+            return self.cache.response(entry)
+
+        if self.offline:
+            raise RuntimeError(f'Offline mode: {url} is not cached.')
+
+        headers = self.cache.conditional_headers(entry) if entry is not None else None
+        response = self._request(url, headers)
+
+        if self.cache is not None:
+            if response.status_code == 304 and entry is not None:
+                return self.cache.response(self.cache.refresh(entry))  # Not modified, serve the cached body
+            if response.status_code == 200:
+                self.cache.store(url, response)
+
+        return response
+
+    def is_cached(self, url: str) -> bool:
+        """Whether get() would serve the url from the cache without any network traffic."""
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        return entry is not None and (self.offline or self.cache.is_fresh(entry))
+
+    def stream(self, url: str) -> requests.Response:
+        """Like get(), but the body of a network response is not downloaded up front: it is read as it is consumed
+        through iter_content(). Use the response as a context manager, so that closing it stops the download of any
+        unread remainder. Streamed bodies are not stored in the cache, but cached ones are still served from it."""
+
+        entry = self.cache.lookup(url) if self.cache is not None else None
+
+        if entry is not None and (self.offline or self.cache.is_fresh(entry)):
+            with self._lock:
+                self.cache_hits += 1
+            return self.cache.response(entry)
+
+        if self.offline:
+            raise RuntimeError(f'Offline mode: {url} is not cached.')
+
+        headers = self.cache.conditional_headers(entry) if entry is not None else None
+        response = self._request(url, headers, stream=True)  # The recorded timing only covers the response headers
+
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            return self.cache.response(self.cache.refresh(entry))  # Not modified, serve the cached body
+
+        return response
+
+    def _request(self, url: str, headers: Optional[dict] = None, stream: bool = False) -> requests.Response:
+        """Issue a GET request through the pooled session and record its timing."""
+
+        with self._lock:
+            self.count += 1
+
+        status_code = None
+        retries = 0
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+            status_code = response.status_code
+            if response.raw is not None and getattr(response.raw, 'retries', None) is not None:
+                retries = len(response.raw.retries.history)
+            if not stream:
+                self.tracer.count(COUNTER_BYTES_DOWNLOADED, len(response.content))
+            return response
+        finally:
+            timing = RequestTiming(url, status_code, time.perf_counter() - start, retries)
+            with self._lock:
+                self.timings.append(timing)
+            self.tracer.count(COUNTER_REQUESTS)
+            if retries:
+                self.tracer.count(COUNTER_RETRIES, retries)
+
+    def timing_summary(self) -> str:
+        """Summarize the recorded request timings in a short human readable string."""
+
+        if not self.timings:
+            return f'No network requests issued, {self.cache_hits} cache hits.'
+
+        elapsed = sorted(timing.elapsed for timing in self.timings)
+        retries = sum(timing.retries for timing in self.timings)
+        failed = sum(1 for timing in self.timings if timing.status_code is None or timing.status_code >= 400)
+        not_modified = sum(1 for timing in self.timings if timing.status_code == 304)
+        return (f'{len(elapsed)} requests ({not_modified} not modified), {self.cache_hits} cache hits, '
+                f'{retries} retries, {failed} failed | '
+                f'total {sum(elapsed):.2f}s, median {elapsed[len(elapsed) // 2]:.3f}s, slowest {elapsed[-1]:.3f}s')
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+
+# Span names of the scrape pipeline stages
+SPAN_INDEX_FETCH = 'index_fetch'  # Download of the wiki/NPCs page
+SPAN_INDEX_PARSE = 'index_parse'  # Collection of the NPC page urls from it
+SPAN_NPC_FETCH = 'npc_fetch'  # Download of an NPC page (with the lxml-stream parser, the extraction happens during it)
+SPAN_API_RENDER = 'api_render'  # Rendering of a batch of living preferences template calls through the MediaWiki API
+SPAN_HTML_PARSE = 'html_parse'  # Extraction of the NPC name and preferences table markup from an NPC page
+SPAN_TABLE_EXTRACT = 'table_extract'  # pd.read_html of the preferences table
+SPAN_CLEANUP = 'cleanup'  # Normalization of the preferences table
+SPAN_NPC_BUILD = 'npc_build'  # Construction of the NPC from the normalized table
+
+# Counter names
+COUNTER_BYTES_DOWNLOADED = 'bytes_downloaded'
+COUNTER_REQUESTS = 'requests'
+COUNTER_RETRIES = 'retries'
+COUNTER_THROTTLED = 'throttled'  # Requests the crawl scheduler backed off from and queued again (see scheduler.py)
+COUNTER_FAILURES = 'failures'  # Per exception type, as 'failures.<type name>'
+
+
+class SpanStats(NamedTuple):
+    """Summary statistics of all the spans with the same name."""
+    name: str
+    count: int
+    total: float  # Seconds
+    mean: float
+    p50: float
+    p99: float
+    max: float
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.tracer._record(self.name, self.start, time.perf_counter(), self.args, exc_type)
+
+
+class Tracer:
+    """Records timing spans and counters of a scrape run. Safe to use from multiple threads.
+
+    Wrap a stage in a span (with tracer.span('cleanup'): ...), and count events with tracer.count(). Once the run is
+    done, summary_table() returns the per stage timings and the counters, and write_chrome_trace() exports every span
+    to a JSON file that chrome://tracing or Perfetto can open.
+
+    Pass NULL_TRACER (the default everywhere) to disable tracing at the cost of an empty method call per span."""
+
+    enabled = True
+
+    def __init__(self):
+        self.spans = []  # (name, start, end, thread id, args) tuples, times in perf_counter seconds
+        self.counters: Dict[str, int] = {}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **args) -> _Span:
+        """Return a context manager timing the code it wraps as a span with the passed name and arguments."""
+        return _Span(self, name, args)
+
+    def _record(self, name: str, start: float, end: float, args: dict, exc_type):
+        if exc_type is not None:
+            args = {**args, 'error': exc_type.__name__}
+        with self._lock:
+            self.spans.append((name, start, end, threading.get_ident(), args))
+
+    def add_spans(self, spans):
+        """Add spans recorded elsewhere (e.g. by a tracer in a parser process, with the same perf_counter clock)."""
+        with self._lock:
+            self.spans.extend(spans)
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def failure(self, exc: BaseException):
+        """Count a failure under the type of the exception that caused it."""
+        self.count(f'{COUNTER_FAILURES}.{type(exc).__name__}')
+
+    def span_stats(self) -> List[SpanStats]:
+        """Summarize the recorded spans per name, in order of first occurrence."""
+
+        with self._lock:
+            spans = list(self.spans)
+
+        durations = {}
+        for name, start, end, _, _ in spans:
+            durations.setdefault(name, []).append(end - start)
+
+        stats = []
+        for name, values in durations.items():
+            values.sort()
+            p99 = values[min(int(len(values) * 0.99), len(values) - 1)]
+            stats.append(SpanStats(name=name, count=len(values), total=sum(values), mean=sum(values) / len(values),
+                                   p50=values[len(values) // 2], p99=p99, max=values[-1]))
+        return stats
+
+    def summary_table(self) -> str:
+        """Return the per stage timings and the counters as a fixed width text table."""
+
+        lines = [f'{"stage":<16}{"count":>7}{"total":>10}{"mean":>10}{"p50":>10}{"p99":>10}{"max":>10}']
+        for s in self.span_stats():
+            lines.append(f'{s.name:<16}{s.count:>7}' + ''.join(f'{value * 1000:>8.1f}ms' for value in
+                                                               (s.total, s.mean, s.p50, s.p99, s.max)))
+        with self._lock:
+            counters = sorted(self.counters.items())
+        if counters:
+            lines.append('')
+            lines.extend(f'{name:<40}{value:>10}' for name, value in counters)
+        return '\n'.join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Return the recorded spans and counters in the Chrome trace event format."""
+
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+
+        events = [{'name': name, 'cat': 'scrape', 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': (start - self._origin) * 1e6, 'dur': (end - start) * 1e6, 'args': args}
+                  for name, start, end, tid, args in spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': counters}
+
+    def write_chrome_trace(self, path: str):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.chrome_trace(), file)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+class NullTracer(Tracer):
+    """A tracer that records nothing."""
+
+    enabled = False
+    _span = _NullSpan()
+
+    def span(self, name: str, **args) -> _NullSpan:
+        return self._span
+
+    def add_spans(self, spans):
+        pass
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+
+NULL_TRACER = NullTracer()
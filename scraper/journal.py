@@ -0,0 +1,109 @@
+import os
+import json
+import time
+from typing import Dict
+
+from terraria.npcs import NPC, NPCRecord
+from scraper.http_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL
+from scraper.parsed_store import PARSER_VERSION
+
+
+# Where crawls keep their journal by default (next to the scraper's caches)
+DEFAULT_JOURNAL_PATH = os.path.join(DEFAULT_CACHE_DIR, 'crawl.journal')
+
+JOURNAL_VERSION = 1  # Bump whenever the entries change; journals of another version are then started over
+
+
+def _line(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+class CrawlJournal:
+    """An append-only journal of the NPC pages a crawl completed, so that an interrupted crawl (cancelled, failed, or
+    killed along with its process) can be resumed rather than started over.
+
+    The journal is a JSON Lines file: a header identifying the crawl (see open()), then the url and NPC record of
+    every completed page, written and flushed as soon as the page is done. Only the last line can thus be torn by a
+    crash; it is dropped when the journal is opened again. With sync, every entry is also fsynced, so that the journal
+    survives a power loss too, at the cost of a disk write per page.
+
+    A journal is only resumed from for max_age seconds after its crawl started (by default as long as the response
+    cache serves pages without revalidating them), and started over afterwards. Otherwise a page failing on every run
+    would keep the journal, and thus the NPCs of all the other pages, from ever being refreshed.
+
+    A journal is written by a single thread (read_terraria_wiki's), between open() and close() or discard()."""
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH, sync: bool = False, max_age: float = DEFAULT_CACHE_TTL):
+        self.path = path
+        self.sync = sync
+        self.max_age = max_age
+        self.created = None  # Unix time the crawl of the open journal started
+        self._file = None
+
+    def open(self, crawl: str) -> Dict[str, NPCRecord]:
+        """Open the journal for the crawl (e.g. the wiki's base url and the source of its pages), and return the NPC
+        records it already holds, keyed by NPC url. A journal left by another crawl (or by another version of the
+        scraper), or older than max_age, is started over."""
+
+        if self._file is not None:
+            raise RuntimeError(f'The crawl journal {self.path} is already open.')
+
+        header = {'version': JOURNAL_VERSION, 'parser': PARSER_VERSION, 'crawl': crawl, 'created': time.time()}
+        records = {}
+        valid_size = 0  # Bytes up to the end of the last intact line, which the new entries follow
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            data = b''
+
+        lines = data.split(b'\n')[:-1]  # A last line without its newline is torn
+        try:
+            previous = json.loads(lines[0]) if lines else None
+            if isinstance(previous, dict) and all(previous.get(key) == header[key]
+                                                  for key in ('version', 'parser', 'crawl')) \
+                    and 0 <= header['created'] - previous['created'] <= self.max_age:
+                header = previous  # Resume the crawl as started
+                valid_size = len(lines[0]) + 1
+                for line in lines[1:]:
+                    entry = json.loads(line)
+                    levels = entry['levels']
+                    records[entry['url']] = NPCRecord(entry['name'], tuple(levels) if levels is not None else None,
+                                                      tuple(entry['kinds']), tuple(map(tuple, entry['records'])))
+                    valid_size += len(line) + 1
+        except (ValueError, KeyError, TypeError):
+            pass  # Keep the entries up to the damaged one
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'r+b' if valid_size else 'wb')
+        self._file.truncate(valid_size)
+        self._file.seek(valid_size)
+        if not valid_size:
+            self._write(_line(header))
+        self.created = header['created']
+        return records
+
+    def _write(self, line: bytes):
+        self._file.write(line)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def append(self, npc_url: str, npc: NPC):
+        """Record the NPC of a completed page."""
+        name, levels, kinds, records = npc.record
+        self._write(_line({'url': npc_url, 'name': name, 'levels': levels, 'kinds': kinds, 'records': records}))
+
+    def close(self):
+        """Close the journal, keeping it for the crawl to be resumed."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Close and delete the journal, once its crawl is complete."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
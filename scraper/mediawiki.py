@@ -0,0 +1,151 @@
+import re
+from urllib.parse import unquote, urlencode
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from scraper.http_client import HttpClient
+
+
+# The MediaWiki API endpoint, relative to the wiki's base url
+API_PATH = 'api.php'
+
+# Titles per query: the most MediaWiki accepts from clients without the apihighlimits right
+API_BATCH_SIZE = 50
+
+# The template NPC pages render their living preferences table with
+LIVING_PREFERENCES_TEMPLATE = 'Living preferences'
+
+# The parameter naming the page a template call is about, which templates depending on their page default to the page
+# they are on (as in {{{name|{{PAGENAME}}}}}), so that a call renders the same on any page once it is passed
+PAGE_PARAMETER = 'name'
+
+# Magic words that expand to the title of the page they are on
+_PAGE_MAGIC_WORDS = re.compile(r'\{\{\s*(?:FULL)?PAGENAME\s*\}\}')
+
+# The empty element a batched render puts before each piece of wikitext, to split the rendered HTML by
+_RENDER_MARKER = '<div data-render="{}"></div>'
+_RENDER_MARKERS = re.compile(r'<div data-render="(\d+)">\s*</div>')
+
+_TEMPLATE_START = re.compile(r'\{\{\s*(?:template\s*:\s*)?([^|{}]+?)\s*(?=\||\}\})', re.IGNORECASE)
+
+
+def url_title(page_url: str) -> str:
+    """The title of a wiki page, from its (relative) url, e.g. '/wiki/Old_Man' -> 'Old Man'."""
+    path = page_url.split('?', 1)[0].split('#', 1)[0]
+    return unquote(path.lstrip('/').split('/', 1)[-1]).replace('_', ' ')
+
+
+def _template_name(name: str) -> str:
+    # Template names are case insensitive in their first letter, and underscores are spaces
+    name = ' '.join(name.replace('_', ' ').split())
+    return name[:1].upper() + name[1:]
+
+
+def find_template(wikitext: str, name: str) -> Optional[str]:
+    """Return the first call of the named template in the wikitext (from its opening to its closing braces, nested
+    templates and parameters included), or None if the wikitext does not call it."""
+
+    wanted = _template_name(name)
+    for match in _TEMPLATE_START.finditer(wikitext):
+        if _template_name(match.group(1)) != wanted:
+            continue
+        depth = 0
+        position = match.start()
+        while position < len(wikitext) - 1:
+            pair = wikitext[position:position + 2]
+            if pair == '{{':
+                depth += 1
+                position += 2
+            elif pair == '}}':
+                depth -= 1
+                position += 2
+                if depth == 0:
+                    return wikitext[match.start():position]
+            else:
+                position += 1
+        return None  # Unbalanced braces
+    return None
+
+
+def with_page(call: str, title: str) -> str:
+    """Return the template call rendering as it does on the page with the passed title, on any page: page name magic
+    words in it are replaced by the title, and the title is passed as its PAGE_PARAMETER unless it already has one."""
+
+    call = _PAGE_MAGIC_WORDS.sub(lambda match: title, call)
+    if re.search(r'\|\s*' + re.escape(PAGE_PARAMETER) + r'\s*=', call):
+        return call
+    return f'{call[:-2]}|{PAGE_PARAMETER}={title}}}}}'
+
+
+class MediaWikiAPI:
+    """A client of the api.php endpoint of a MediaWiki wiki, for reading many pages per request rather than one
+    rendered (and skin wrapped) web page each.
+
+    Requests go through the passed HttpClient, as GET requests, so they are cached (and revalidated) like web pages.
+    An error reported by the API raises a RuntimeError."""
+
+    def __init__(self, base_url: str, client: HttpClient):
+        self.url = base_url + API_PATH
+        self.client = client
+
+    def _check(self, response) -> dict:
+        response.raise_for_status()
+        reply = response.json()
+        if 'error' in reply:
+            error = reply['error']
+            raise RuntimeError(f"MediaWiki API error {error.get('code')}: {error.get('info')}")
+        return reply
+
+    def _get(self, **params) -> dict:
+        return self._check(self.client.get(f'{self.url}?{urlencode({**params, "format": "json", "formatversion": 2})}'))
+
+    def page_html(self, title: str) -> str:
+        """The rendered content of a page (its article, without the skin around it)."""
+        return self._get(action='parse', page=title, prop='text', disablelimitreport=1)['parse']['text']
+
+    def wikitext(self, titles: Sequence[str]) -> Dict[str, Optional[Tuple[str, str]]]:
+        """Return the (title, wikitext) of the current revision of every page in titles (at most API_BATCH_SIZE),
+        keyed by the requested titles. Redirects are followed, so the returned title is that of the page the title
+        leads to. Titles of pages that do not exist map to None."""
+
+        if len(titles) > API_BATCH_SIZE:
+            raise RuntimeError(f'At most {API_BATCH_SIZE} titles per query, not {len(titles)}.')
+
+        query = self._get(action='query', prop='revisions', rvprop='content', rvslots='main', redirects=1,
+                          titles='|'.join(titles))['query']
+
+        # Follow the requested titles through their normalization (e.g. underscores to spaces) and redirects
+        renamed = {entry['from']: entry['to'] for entry in query.get('normalized', []) + query.get('redirects', [])}
+        pages = {}
+        for page in query.get('pages', []):
+            if page.get('missing') or page.get('invalid') or not page.get('revisions'):
+                continue
+            pages[page['title']] = page['revisions'][0]['slots']['main']['content']
+
+        contents = {}
+        for title in titles:
+            resolved = title
+            for _ in range(len(renamed) + 1):  # Bounded, in case of a redirect loop
+                if resolved not in renamed:
+                    break
+                resolved = renamed[resolved]
+            contents[title] = (resolved, pages[resolved]) if resolved in pages else None
+        return contents
+
+    def render(self, calls: Sequence[Tuple[str, str]]) -> List[str]:
+        """Render many (template call, title) pairs in a single request, each call as it renders on the page with its
+        title, and return the HTML of each. A parse request has a single page context, so the calls are made
+        independent of it first (see with_page()), then rendered one after the other, each after a marker element that
+        the rendered HTML is split on."""
+
+        if not calls:
+            return []
+        text = '\n'.join(f'{_RENDER_MARKER.format(i)}\n{with_page(call, title)}'
+                         for i, (call, title) in enumerate(calls))
+        html = self._get(action='parse', text=text, contentmodel='wikitext', prop='text',
+                         disablelimitreport=1)['parse']['text']
+
+        parts = _RENDER_MARKERS.split(html)  # The HTML before the first marker, then (index, HTML after it) pairs
+        rendered = {int(index): part for index, part in zip(parts[1::2], parts[2::2])}
+        if sorted(rendered) != list(range(len(calls))):
+            raise RuntimeError(f'MediaWiki API render: {len(rendered)} of the {len(calls)} rendered calls found.')
+        return [rendered[i] for i in range(len(calls))]
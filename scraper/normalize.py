@@ -0,0 +1,47 @@
+import re
+from typing import List
+
+import pandas as pd
+from pandas import DataFrame
+
+
+# Parsing artifact left in the cells by the wiki markup
+_ZERO_WIDTH_SPACE = re.compile('\u200b')
+# Leading and trailing whitespace of a cell
+_SURROUNDING_SPACE = re.compile(r'^\s+|\s+$')
+# When the text of a cell contains multiple values, they come glued together without spaces (e.g. 'ForestHallow').
+_GLUED_WORDS = re.compile(r'([a-z])([A-Z])')
+
+
+def _clean_cells(frame: DataFrame) -> DataFrame:
+    """Purge parsing artifacts from all text cells of the frame at once, and replace the missing cells with 'N/A'."""
+
+    frame = frame.replace(_ZERO_WIDTH_SPACE, '', regex=True)  # Remove the '\u200b' character
+    frame = frame.replace(_SURROUNDING_SPACE, '', regex=True)  # Strip the text
+    frame = frame.replace(_GLUED_WORDS, r'\1, \2', regex=True)  # Split glued values and join them with comma + space
+    return frame.astype(object).fillna('N/A')  # Replace missing cells (nan) with 'N/A'
+
+
+def _index_by_first_column(table: DataFrame) -> DataFrame:
+    """Use the first (unnamed) column of a table read with pd.read_html as the index, since it holds the row titles."""
+
+    table = table.set_index(table.columns[0])
+    table.index.name = None
+    return table
+
+
+def normalize_preferences(table: DataFrame) -> DataFrame:
+    """Turn a living preferences table read with pd.read_html into the format used by the NPC class: indexed by the
+    liking level, with one column per preference kind (Biome, Neighbor), and cleaned, comma separated cell values."""
+    return _clean_cells(_index_by_first_column(table))
+
+
+def normalize_preferences_batch(tables: List[DataFrame]) -> List[DataFrame]:
+    """Same as normalize_preferences, applied to many tables in one pass over a single concatenated frame."""
+
+    if not tables:
+        return []
+
+    indexed = [_index_by_first_column(table) for table in tables]
+    cleaned = _clean_cells(pd.concat(indexed, keys=range(len(indexed))))
+    return [cleaned.loc[i, table.columns] for i, table in enumerate(indexed)]
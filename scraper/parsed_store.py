@@ -0,0 +1,69 @@
+import os
+import re
+import pickle
+import hashlib
+import threading
+from typing import Optional
+
+from terraria.npcs import NPC, NPCRecord, PreferenceStore
+from scraper.http_cache import DEFAULT_CACHE_DIR
+
+
+# Bump whenever the page parsing changes, so that NPCs parsed by an older version of the scraper are not reused.
+PARSER_VERSION = 4
+
+
+def content_hash(content: bytes) -> str:
+    """Return the hash identifying the contents of a downloaded web page (and the parser version that reads it)."""
+    return hashlib.sha256(content + f'\0parser-v{PARSER_VERSION}'.encode('ascii')).hexdigest()
+
+
+# The parts of a rendered NPC page the parsers read, found without parsing the page
+_HEADING = re.compile(rb'<h1[^>]*id="firstHeading".*?</h1>', re.DOTALL)
+_TABLE = re.compile(rb'<table[^>]*class="terraria living-preferences".*?</table>', re.DOTALL)
+
+
+def npc_page_hash(content: bytes) -> str:
+    """Return the hash identifying the parts of a rendered NPC web page the NPC is parsed from: its heading and its
+    preferences table. The rest of a wiki page carries per-request markup (timestamps, ad slots, cache busters), so a
+    hash of the whole page would change on every download. Pages with neither part are hashed whole."""
+
+    heading, table = _HEADING.search(content), _TABLE.search(content)
+    if heading is None and table is None:
+        return content_hash(content)
+    return content_hash(b'\0'.join(part.group() if part is not None else b'' for part in (heading, table)))
+
+
+class ParsedPageStore:
+    """A persistent store of the NPC parsed from each NPC web page (as its NPCRecord), together with the hash of the
+    page contents it was parsed from (see npc_page_hash()). Lets an incremental scrape skip parsing pages that have not
+    changed since the previous run."""
+
+    def __init__(self, store_dir: str = os.path.join(DEFAULT_CACHE_DIR, 'parsed')):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.store_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.pickle')
+
+    def get(self, url: str, page_hash: str, preference_store: PreferenceStore = None) -> Optional[NPC]:
+        """Return the NPC stored for the url, if it was parsed from a page with the passed content hash. The NPC is
+        built over the passed preference store (or a store of its own)."""
+
+        try:
+            with open(self._path(url), 'rb') as file:
+                stored_hash, record = pickle.load(file)
+        except Exception:
+            return None  # Not stored, or unreadable (it will be overwritten after parsing)
+        if stored_hash != page_hash or not isinstance(record, NPCRecord):
+            return None
+        return NPC.from_record(record, preference_store)
+
+    def put(self, url: str, page_hash: str, npc: NPC):
+        """Store the NPC parsed from the url's page with the passed content hash."""
+
+        path = self._path(url)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'  # Temporary files are private to the writing thread
+        with open(temp_path, 'wb') as file:
+            pickle.dump((page_hash, npc.record), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
@@ -0,0 +1,338 @@
+import math
+import time
+import heapq
+import threading
+import email.utils
+from collections import deque
+from urllib.parse import urlsplit
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+# Status codes that mean the host is overloaded (or rate limiting us): the scheduler backs off and retries the page
+THROTTLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Seconds over which the completed requests are counted for the published throughput
+_THROUGHPUT_WINDOW = 2.0
+
+# Smoothing of the short and long term response latency averages (exponentially weighted moving averages)
+_SHORT_LATENCY_WEIGHT = 0.3
+_LONG_LATENCY_WEIGHT = 0.02
+
+# Successful responses before the latency averages are trusted as congestion signals
+_LATENCY_WARMUP = 8
+
+
+class CrawlState(NamedTuple):
+    """What a CrawlScheduler currently allows and achieves, as published to the progress UI."""
+    rate: float  # Requests per second allowed per host (the token bucket rate)
+    concurrency: int  # Requests allowed in flight at once
+    in_flight: int  # Requests in flight
+    throughput: float  # Requests completed per second, over the last couple of seconds
+    throttled: int  # Responses so far that were throttled (429), server errors (5xx) or missing (connection errors)
+    retrying: int  # Pages waiting to be retried
+
+    def describe(self) -> str:
+        return f'{self.throughput:.1f} pages/s, {self.in_flight}/{self.concurrency} in flight, ' \
+               f'{self.rate:.1f} req/s allowed' + (f', {self.retrying} retrying' if self.retrying else '')
+
+
+class CrawlTask(NamedTuple):
+    """A page handed out by CrawlScheduler.next(). Pass it back to complete() once its request is done."""
+    item: Any  # What was added to the scheduler (e.g. the page's index and url)
+    url: str  # The url requested, whose host the token bucket is picked by
+    attempt: int  # 0 for the first request of the page, then 1, 2... for its retries
+    sequence: int  # Order in which the page was added, to keep the pages of an attempt in order
+    started: float = 0.0  # time.monotonic() at which the request was allowed to start
+
+
+class TokenBucket:
+    """A token bucket: tokens accrue at rate per second, up to burst tokens, and each request takes one.
+
+    Not thread-safe on its own; CrawlScheduler calls it under its lock."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available, 0 if there is one."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def set_rate(self, rate: float, burst: float):
+        self._refill(time.monotonic())
+        self.rate = rate
+        self.burst = burst
+        self.tokens = min(self.tokens, burst)
+
+
+def retry_after(response) -> Optional[float]:
+    """The seconds to wait that the Retry-After header of a response asks for (in seconds or as an HTTP date), None
+    if it has none."""
+
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CrawlScheduler:
+    """Decides when each page of a crawl is requested, adapting the pace to what the host sustains.
+
+    Three parts work together:
+
+    - A token bucket per host caps the request rate (rate requests per second, bursts of burst_seconds worth).
+    - The rate and the concurrency (the requests allowed in flight at once) are adapted AIMD-style. Every window of
+      successful responses (as many as the concurrency) adds one to the concurrency and rate_step to the rate, as
+      long as they are the limit actually holding the crawl back (until the first decrease, both grow by half
+      instead, to find the pace quickly). A throttled response (429), a server error (5xx), a request that got no
+      response, or a short term response latency above latency_tolerance times its long term average multiplies
+      both by decrease_factor. Only requests started after the previous decrease can trigger the next one, so a
+      burst of errors from one overshoot counts once.
+    - A priority queue orders the pages: fresh pages in the order they were added, before any retry. A page that
+      was throttled or got no response is retried after an exponential backoff (or the Retry-After delay of the
+      response, if longer), up to max_attempts requests in all, so retries do not hold up the pages that were never
+      requested.
+
+    Worker threads loop over next(), which blocks until a page may start (None once every page is done or the
+    scheduler is closed), request it, and report the outcome with complete(). The current CrawlState is available
+    as state, and passed to on_update (from a worker thread) as the requests complete, at most every update_interval
+    seconds. Safe to use from multiple threads."""
+
+    def __init__(self, max_concurrency: int = 16, initial_concurrency: int = 2, min_concurrency: int = 1,
+                 initial_rate: float = 4.0, min_rate: float = 0.5, max_rate: float = 200.0, rate_step: float = 2.0,
+                 burst_seconds: float = 0.25, decrease_factor: float = 0.7, latency_tolerance: float = 2.0,
+                 max_attempts: int = 5, backoff: float = 0.5, update_interval: float = 0.25,
+                 on_update: Optional[Callable[[CrawlState], None]] = None):
+        if not 0 < decrease_factor < 1:
+            raise RuntimeError(f'The decrease factor must be between 0 and 1, not {decrease_factor}.')
+
+        self.max_concurrency = max(max_concurrency, 1)
+        self.min_concurrency = min(max(min_concurrency, 1), self.max_concurrency)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_step = rate_step
+        self.burst_seconds = burst_seconds
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff = backoff
+        self.update_interval = update_interval
+        self.on_update = on_update
+
+        self.concurrency = min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        self.rate = min(max(initial_rate, min_rate), max_rate)
+        self.throttled = 0
+        self.history: List[Tuple[float, CrawlState]] = []  # (time.monotonic(), state) at every published update
+
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._ready: List[Tuple[int, int, CrawlTask]] = []  # Heap of (attempt, sequence, task)
+        self._delayed: List[Tuple[float, int, CrawlTask]] = []  # Heap of (time.monotonic() to retry at, sequence, task)
+        self._sequence = 0
+        self._in_flight = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self._successes = 0  # Successful responses since the last change of the limits
+        self._used_concurrency = 0  # The most requests in flight at once since the last change of the limits
+        self._rate_limited = False  # Whether the token bucket held a request back since the last change of the limits
+        self._last_decrease = -math.inf
+        self._short_latency = None
+        self._long_latency = None
+        self._latency_samples = 0
+        self._completions = deque()  # time.monotonic() of the recent completed requests
+        self._first_start = None  # time.monotonic() at which the first request started
+        self._last_update = -math.inf
+
+    def add(self, items: Iterable[Tuple[Any, str]]):
+        """Queue pages, as (item, url) tuples. Pages are handed out in the order they are added."""
+
+        with self._condition:
+            for item, url in items:
+                task = CrawlTask(item, url, 0, self._sequence)
+                heapq.heappush(self._ready, (0, self._sequence, task))
+                self._sequence += 1
+            self._condition.notify_all()
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, self._burst())
+        return bucket
+
+    def _burst(self) -> float:
+        return max(1.0, self.rate * self.burst_seconds)
+
+    def next(self) -> Optional[CrawlTask]:
+        """Wait until a page may be requested and return its task, or None once there are no pages left (or the
+        scheduler was closed)."""
+
+        with self._condition:
+            while not self._closed:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:  # Retries whose delay is over
+                    _, sequence, task = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (task.attempt, sequence, task))
+
+                if not self._ready and not self._delayed and not self._in_flight:
+                    self._condition.notify_all()  # Done: release the other waiting workers
+                    return None
+
+                timeout = None
+                if self._ready and self._in_flight < self.concurrency:
+                    task = self._ready[0][2]
+                    bucket = self._bucket(task.url)
+                    timeout = bucket.delay(now)
+                    self._rate_limited |= timeout > 0
+                    if timeout <= 0:
+                        heapq.heappop(self._ready)
+                        bucket.take(now)
+                        self._in_flight += 1
+                        if self._first_start is None:
+                            self._first_start = now
+                        self._used_concurrency = max(self._used_concurrency, self._in_flight)
+                        return task._replace(started=now)
+                if self._delayed:
+                    retry_timeout = self._delayed[0][0] - now
+                    timeout = retry_timeout if timeout is None else min(timeout, retry_timeout)
+                self._condition.wait(timeout)
+        return None
+
+    def complete(self, task: CrawlTask, latency: float, status: Optional[int] = 200,
+                 wait: Optional[float] = None) -> bool:
+        """Report the outcome of the request of a task: its latency in seconds and the HTTP status code of its
+        response (None if no response was received). Pass the delay the response asked for before a retry (see
+        retry_after()) as wait. Returns True if the page was queued to be retried, False if it is done (successfully
+        or not)."""
+
+        throttled = status is None or status in THROTTLE_STATUS_CODES
+        with self._condition:
+            now = time.monotonic()
+            self._in_flight -= 1
+
+            if throttled:
+                self.throttled += 1
+                congested = True
+            elif status < 400:
+                congested = self._record_latency(latency)
+            else:
+                congested = False  # The page itself is wrong (e.g. 404), which says nothing about the host
+
+            if congested:
+                if task.started > self._last_decrease:
+                    self._decrease(now)
+            elif status < 400:
+                self._successes += 1
+                if self._successes >= self.concurrency:
+                    self._increase(now)
+
+            retry = throttled and task.attempt + 1 < self.max_attempts
+            if retry:
+                delay = max(wait or 0.0, self.backoff * 2 ** task.attempt)
+                heapq.heappush(self._delayed, (now + delay, task.sequence, task._replace(attempt=task.attempt + 1)))
+            else:
+                self._completions.append(now)
+
+            self._condition.notify_all()
+            state = self._publish(now)
+
+        if state is not None and self.on_update is not None:
+            self.on_update(state)
+        return retry
+
+    def _record_latency(self, latency: float) -> bool:
+        """Fold a successful response's latency into the averages, and return whether it signals congestion."""
+
+        if self._short_latency is None:
+            self._short_latency = self._long_latency = latency
+        else:
+            self._short_latency += _SHORT_LATENCY_WEIGHT * (latency - self._short_latency)
+            self._long_latency += _LONG_LATENCY_WEIGHT * (latency - self._long_latency)
+        self._latency_samples += 1
+        return self._latency_samples > _LATENCY_WARMUP and \
+            self._short_latency > self.latency_tolerance * self._long_latency
+
+    def _throughput(self, now: float) -> float:
+        while self._completions and self._completions[0] < now - _THROUGHPUT_WINDOW:
+            self._completions.popleft()
+        return len(self._completions) / min(max(now - self._first_start, 0.1), _THROUGHPUT_WINDOW)
+
+    def _increase(self, now: float):
+        # Only grow the limits that are holding the crawl back: the concurrency if it was all used, the rate if the
+        # token bucket made a request wait. Until the first decrease, they grow by half rather than by a step
+        # (slow start), so that a crawl finds its pace quickly.
+        slow_start = self._last_decrease == -math.inf
+        if self._used_concurrency >= self.concurrency:
+            self.concurrency = min(max(self.concurrency * 3 // 2, self.concurrency + 1) if slow_start else
+                                   self.concurrency + 1, self.max_concurrency)
+        if self._rate_limited:
+            self._set_rate(min(self.rate * 1.5 if slow_start else self.rate + self.rate_step, self.max_rate))
+        self._reset_window()
+
+    def _reset_window(self):
+        self._successes = 0
+        self._used_concurrency = self._in_flight
+        self._rate_limited = False
+
+    def _decrease(self, now: float):
+        # Decrease from what was achieved rather than from what was allowed, which may be far above it
+        achieved = self._throughput(now)
+        self.concurrency = max(int(min(self.concurrency, self._in_flight + 1) * self.decrease_factor),
+                               self.min_concurrency)
+        self._set_rate(max(min(self.rate, achieved or self.rate) * self.decrease_factor, self.min_rate))
+        self._last_decrease = now
+        self._reset_window()
+        # Take the latency that triggered the decrease as the new normal: a host that slowed down on its own (rather
+        # than under our load) then costs one decrease, instead of one per request until the long term average
+        # catches up
+        self._long_latency = self._short_latency
+
+    def _set_rate(self, rate: float):
+        self.rate = rate
+        for bucket in self._buckets.values():
+            bucket.set_rate(rate, self._burst())
+
+    def _state(self, now: float) -> CrawlState:
+        return CrawlState(rate=self.rate, concurrency=self.concurrency, in_flight=self._in_flight,
+                          throughput=self._throughput(now), throttled=self.throttled, retrying=len(self._delayed))
+
+    @property
+    def state(self) -> CrawlState:
+        with self._condition:
+            return self._state(time.monotonic())
+
+    def _publish(self, now: float) -> Optional[CrawlState]:
+        if now - self._last_update < self.update_interval:
+            return None
+        self._last_update = now
+        state = self._state(now)
+        self.history.append((now, state))
+        return state
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """Stop handing out pages: next() returns None from now on."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
@@ -0,0 +1,786 @@
+
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from io import StringIO
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import lxml.html
+import requests
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from terraria.npcs import NPC, NPCRecord, PreferenceStore
+from scraper.http_client import HttpClient
+from scraper.http_cache import ResponseCache
+from scraper.parsed_store import ParsedPageStore, content_hash, npc_page_hash
+from scraper.streaming import stream_npc_page, STREAM_CHUNK_SIZE
+from scraper.normalize import normalize_preferences
+from scraper.scheduler import CrawlScheduler, retry_after
+from scraper.journal import CrawlJournal
+from scraper.mediawiki import API_BATCH_SIZE, LIVING_PREFERENCES_TEMPLATE, MediaWikiAPI, find_template, url_title
+from scraper.instrumentation import NULL_TRACER, Tracer, COUNTER_BYTES_DOWNLOADED, COUNTER_THROTTLED, \
+    SPAN_INDEX_FETCH, SPAN_INDEX_PARSE, SPAN_NPC_FETCH, SPAN_API_RENDER, SPAN_HTML_PARSE, SPAN_TABLE_EXTRACT, \
+    SPAN_CLEANUP, SPAN_NPC_BUILD
+
+
+BASE_URL = "https://terraria.fandom.com/"
+NPCS_URL = "wiki/NPCs"  # The page linking to every individual NPC page, relative to the base url
+
+# Per page progress values yielded by read_terraria_wiki
+PAGE_PARSED = 'parsed'  # The page was (re-)parsed
+PAGE_SKIPPED = 'skipped'  # The page did not change since the last run, and its stored NPC was reused
+PAGE_FAILED = 'failed'  # The page could not be downloaded or parsed
+PAGE_RESUMED = 'resumed'  # An interrupted earlier run completed the page, and its NPC was read back from the journal
+
+
+class PageResult(NamedTuple):
+    """The per page value yielded by read_terraria_wiki, as soon as the page is done."""
+    index: int  # The position of the NPC on the wiki page
+    status: str  # PAGE_PARSED, PAGE_SKIPPED, PAGE_FAILED or PAGE_RESUMED
+    npc: Optional[NPC]  # The finished NPC (None if the page failed)
+
+
+# HTML parsing backends
+PARSER_HTML = 'html.parser'  # BeautifulSoup with Python's built-in parser
+PARSER_LXML = 'lxml'  # BeautifulSoup with the lxml parser
+PARSER_LXML_XPATH = 'lxml-xpath'  # lxml tree queried with XPath, no BeautifulSoup
+PARSER_LXML_STREAM = 'lxml-stream'  # Incremental lxml parsing of NPC pages while they download (see streaming.py)
+PARSERS = (PARSER_HTML, PARSER_LXML, PARSER_LXML_XPATH, PARSER_LXML_STREAM)
+DEFAULT_PARSER = PARSER_LXML_XPATH
+
+# Sources of the NPC pages
+SOURCE_HTML = 'html'  # The rendered web page of every NPC, one request each
+SOURCE_API = 'api'  # The MediaWiki API: the wikitext of up to API_BATCH_SIZE NPC pages per request (see mediawiki.py)
+SOURCES = (SOURCE_HTML, SOURCE_API)
+DEFAULT_SOURCE = SOURCE_HTML
+
+# Downloaded NPC pages that may wait for (or be in) the parser processes at once, per parser process
+PARSE_QUEUE_PER_PROCESS = 2
+
+
+class PageContent(NamedTuple):
+    """The parts of a downloaded web page the parsers read. Unlike the HTTP response, it can be sent to a parser
+    process."""
+    content: bytes
+    encoding: Optional[str]
+
+
+def _xpath_has_class(name: str) -> str:
+    """Return an XPath predicate matching elements that have the passed class (the way CSS class selectors match)."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def fetch_npc_page(base_url: str, npc_url: str, client: HttpClient, parser: str = DEFAULT_PARSER,
+                   tracer: Tracer = NULL_TRACER):
+    """Download a single NPC web page and return a tuple of the hash identifying its heading and preferences table
+    (see npc_page_hash()) and the page to parse: the HTTP response, or with the PARSER_LXML_STREAM parser, the (name,
+    table markup) tuple already extracted from it.
+
+    With the PARSER_LXML_STREAM parser, the page is parsed while it downloads and the download stops once the heading
+    and the preferences table have been seen. The hash is then that of those two elements, since the rest of the page
+    is never read.
+
+    A response with an error status (e.g. 429 Too Many Requests once the client's retries ran out) raises a
+    requests.HTTPError rather than being parsed."""
+
+    if parser == PARSER_LXML_STREAM:
+        with tracer.span(SPAN_NPC_FETCH), client.stream(base_url + npc_url) as npc_page:
+            npc_page.raise_for_status()
+            # Closing the response drops the unread remainder
+            extracted = stream_npc_page(npc_page.iter_content(STREAM_CHUNK_SIZE), npc_page.encoding)
+            if tracer.enabled and npc_page.raw is not None:  # Streamed from the network, not from the cache
+                tracer.count(COUNTER_BYTES_DOWNLOADED, npc_page.raw.tell())
+        npc_name, table_html = extracted
+        return content_hash(f'{npc_name}\0{table_html}'.encode('utf-8')), extracted  # Identify the extracted contents
+
+    with tracer.span(SPAN_NPC_FETCH):
+        npc_page = client.get(base_url + npc_url)  # Proceed to the npc's webpage (the only request for it)
+    npc_page.raise_for_status()
+    return npc_page_hash(npc_page.content), npc_page  # Identify the heading and preferences table of the page
+
+
+def _report_failure(npc_url: str, exc: Exception, tracer: Tracer):
+    tracer.failure(exc)
+    print(f'Failed to parse {npc_url} ({type(exc).__name__}: {exc}). Moving on...')
+
+
+def scrape_npc_page(base_url: str, npc_url: str, client: HttpClient, store: ParsedPageStore = None,
+                    parser: str = DEFAULT_PARSER, tracer: Tracer = NULL_TRACER,
+                    preference_store: PreferenceStore = None):
+    """Download a single NPC web page, parse the NPC's name and living preferences from it and return a tuple of the
+    NPC instance and the page status (PAGE_PARSED, PAGE_SKIPPED or PAGE_FAILED). The NPC is None if the page could not
+    be parsed. If a store is passed and it holds an NPC parsed from identical page contents, that NPC is returned
+    without parsing the page again. The NPC's preferences are added to the passed preference store (or to a store of
+    its own). Safe to call from multiple threads at once.
+
+    A page that fails is reported with the reason, and counted per exception type in the tracer."""
+
+    try:
+        page_hash, npc_page = fetch_npc_page(base_url, npc_url, client, parser, tracer)
+    except Exception as exc:
+        _report_failure(npc_url, exc, tracer)
+        return None, PAGE_FAILED
+
+    return _parse_fetched_page(npc_url, page_hash, npc_page, store, parser, tracer, preference_store)
+
+
+def _parse_fetched_page(npc_url: str, page_hash: str, npc_page, store: Optional[ParsedPageStore], parser: str,
+                        tracer: Tracer, preference_store: Optional[PreferenceStore]):
+    """The parsing half of scrape_npc_page(), for a page returned by fetch_npc_page()."""
+
+    try:
+        if store is not None:
+            # Look for an NPC parsed from the same contents on a previous run
+            npc = store.get(npc_url, page_hash, preference_store)
+            if npc is not None:
+                return npc, PAGE_SKIPPED
+
+        if parser == PARSER_LXML_STREAM:
+            npc = build_npc(*npc_page, tracer, preference_store)
+        else:
+            npc = parse_npc_page(npc_page, parser, tracer, preference_store)
+
+        if store is not None:
+            store.put(npc_url, page_hash, npc)  # Remember the parsed NPC for the next run
+        return npc, PAGE_PARSED
+
+    except Exception as exc:
+        _report_failure(npc_url, exc, tracer)
+        return None, PAGE_FAILED
+
+
+def _response_status(exc: Exception) -> Optional[int]:
+    """The HTTP status code of the response behind a failed page download, None if no response was received."""
+    if isinstance(exc, requests.RequestException):
+        return exc.response.status_code if exc.response is not None else None
+    return 200  # The page was received, but could not be read (e.g. by the lxml-stream parser)
+
+
+def _fetch_scheduled(base_url: str, npc_urls: List[str], client: HttpClient, parser: str, tracer: Tracer,
+                     scheduler: CrawlScheduler, fetched, failed) -> List[threading.Thread]:
+    """Start scheduler.max_concurrency threads that download the NPC pages in the order and at the pace the scheduler
+    decides, and return them. Each downloaded page is passed to fetched(i, npc_url, page hash, page), and each page
+    that could not be downloaded (after the scheduler's retries) to failed(i, npc_url, exception), from the download
+    threads. Close the scheduler to stop the threads early.
+
+    Pages the client serves from its cache cost the wiki nothing, so they are fetched first, without the scheduler."""
+
+    cached = queue.SimpleQueue()
+    uncached = []
+    for i, npc_url in enumerate(npc_urls):
+        if client.is_cached(base_url + npc_url):
+            cached.put((i, npc_url))
+        else:
+            uncached.append(((i, npc_url), base_url + npc_url))
+    scheduler.add(uncached)
+
+    def download():
+        while not scheduler.closed:
+            try:
+                i, npc_url = cached.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                page_hash, npc_page = fetch_npc_page(base_url, npc_url, client, parser, tracer)
+            except Exception as exc:
+                failed(i, npc_url, exc)
+                continue
+            fetched(i, npc_url, page_hash, npc_page)
+
+        while True:
+            task = scheduler.next()
+            if task is None:
+                return
+            i, npc_url = task.item
+            start = time.perf_counter()
+            try:
+                page_hash, npc_page = fetch_npc_page(base_url, npc_url, client, parser, tracer)
+            except Exception as exc:
+                response = exc.response if isinstance(exc, requests.RequestException) else None
+                if scheduler.complete(task, time.perf_counter() - start, _response_status(exc), retry_after(response)):
+                    tracer.count(COUNTER_THROTTLED)  # Queued again
+                else:
+                    failed(i, npc_url, exc)
+                continue
+            scheduler.complete(task, time.perf_counter() - start)
+            fetched(i, npc_url, page_hash, npc_page)
+
+    threads = [threading.Thread(target=download, name=f'NPCPageFetcher-{n}', daemon=True)
+               for n in range(scheduler.max_concurrency)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def _scrape_scheduled(base_url: str, npc_urls: List[str], client: HttpClient, store: ParsedPageStore, parser: str,
+                      tracer: Tracer, scheduler: CrawlScheduler, preference_store: PreferenceStore):
+    """Scrape the NPC pages in threads paced by the scheduler (see read_terraria_wiki). Yields a PageResult per page,
+    in completion order."""
+
+    finished = queue.SimpleQueue()
+
+    def fetched(i: int, npc_url: str, page_hash: str, npc_page):
+        npc, status = _parse_fetched_page(npc_url, page_hash, npc_page, store, parser, tracer, preference_store)
+        finished.put(PageResult(index=i, status=status, npc=npc))
+
+    def failed(i: int, npc_url: str, exc: Exception):
+        _report_failure(npc_url, exc, tracer)
+        finished.put(PageResult(index=i, status=PAGE_FAILED, npc=None))
+
+    threads = _fetch_scheduled(base_url, npc_urls, client, parser, tracer, scheduler, fetched, failed)
+    try:
+        for _ in npc_urls:
+            yield finished.get()
+    finally:
+        # If the generator is closed early, drop the pages that have not been started yet
+        scheduler.close()
+        for thread in threads:
+            thread.join()
+
+
+def _preferences_table(html: str) -> str:
+    """The markup of the living preferences table in a piece of rendered HTML ('' if there is none)."""
+    if not html.strip():
+        return ''
+    tables = lxml.html.fragment_fromstring(html, create_parent='div').xpath(
+        ".//table[@class='terraria living-preferences']")
+    return lxml.html.tostring(tables[0], encoding='unicode') if tables else ''
+
+
+def scrape_api_batch(api: MediaWikiAPI, npc_urls: Sequence[str], store: ParsedPageStore = None,
+                     tracer: Tracer = NULL_TRACER,
+                     preference_store: PreferenceStore = None) -> List[Tuple[Optional[NPC], str]]:
+    """Scrape up to API_BATCH_SIZE NPC pages through the MediaWiki API, and return a tuple of the NPC instance (None
+    if the page failed) and the page status for each of them, like scrape_npc_page() does.
+
+    A first request reads the wikitext of every page, in which only the call of the living preferences template is
+    of interest. A second request renders the calls of all the NPCs at once, each as it renders on its own page (the
+    template may depend on the page it is on, see MediaWikiAPI.render()), which yields the same table markup as the
+    web page of the NPC, and thus the same NPC. NPCs in the store whose call did not change, and pages without a
+    call, are not rendered. Both requests are GET requests, so the response cache serves and revalidates them."""
+
+    titles = [url_title(npc_url) for npc_url in npc_urls]
+    try:
+        with tracer.span(SPAN_NPC_FETCH, pages=len(titles)):
+            contents = api.wikitext(titles)
+    except Exception as exc:
+        for npc_url in npc_urls:
+            _report_failure(npc_url, exc, tracer)
+        return [(None, PAGE_FAILED)] * len(npc_urls)
+
+    results: List[Tuple[Optional[NPC], str]] = [(None, PAGE_FAILED)] * len(npc_urls)
+    pending = []  # (position in the batch, NPC name, template call, hash of both)
+    for i, (npc_url, title) in enumerate(zip(npc_urls, titles)):
+        if contents[title] is None:
+            _report_failure(npc_url, RuntimeError(f'The wiki has no page {title}.'), tracer)
+            continue
+
+        npc_name, wikitext = contents[title]
+        call = find_template(wikitext, LIVING_PREFERENCES_TEMPLATE) or ''
+        page_hash = content_hash(f'{npc_name}\0{call}'.encode('utf-8'))  # Identify the NPC's preferences
+        npc = store.get(npc_url, page_hash, preference_store) if store is not None else None
+        if npc is not None:
+            results[i] = npc, PAGE_SKIPPED
+        else:
+            pending.append((i, npc_name, call, page_hash))
+
+    # The NPC's name is the title of its page (redirects followed)
+    calls = [(call, npc_name) for _, npc_name, call, _ in pending if call]
+    try:
+        with tracer.span(SPAN_API_RENDER, calls=len(calls)):
+            rendered = iter(api.render(calls))
+    except Exception as exc:
+        for i, _, call, _ in pending:
+            if call:
+                _report_failure(npc_urls[i], exc, tracer)
+        pending = [item for item in pending if not item[2]]
+        rendered = iter(())
+
+    for i, npc_name, call, page_hash in pending:
+        try:
+            table_html = ''
+            if call:
+                with tracer.span(SPAN_HTML_PARSE):
+                    table_html = _preferences_table(next(rendered))
+            npc = build_npc(npc_name, table_html, tracer, preference_store)
+            if store is not None:
+                store.put(npc_urls[i], page_hash, npc)
+            results[i] = npc, PAGE_PARSED
+        except Exception as exc:
+            _report_failure(npc_urls[i], exc, tracer)
+    return results
+
+
+def _scrape_api(api: MediaWikiAPI, npc_urls: List[str], store: ParsedPageStore, tracer: Tracer, max_workers: int,
+                preference_store: PreferenceStore):
+    """Scrape the NPC pages through the MediaWiki API, API_BATCH_SIZE pages per batch, up to max_workers batches at
+    once (see read_terraria_wiki). Yields a PageResult per page, batch by batch in completion order."""
+
+    batches = [range(start, min(start + API_BATCH_SIZE, len(npc_urls)))
+               for start in range(0, len(npc_urls), API_BATCH_SIZE)]
+
+    def scrape(batch: range):
+        return batch, scrape_api_batch(api, npc_urls[batch.start:batch.stop], store, tracer, preference_store)
+
+    executor = ThreadPoolExecutor(max_workers=max(max_workers, 1), thread_name_prefix='NPCBatchScraper')
+    try:
+        for future in as_completed([executor.submit(scrape, batch) for batch in batches]):
+            batch, batch_results = future.result()
+            for i, (npc, status) in zip(batch, batch_results):
+                yield PageResult(index=i, status=status, npc=npc)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)  # Batches still waiting to start are dropped
+
+
+def _lxml_tree(page):
+    """Parse a downloaded web page into an lxml tree, decoding it with the encoding of the HTTP response."""
+    return lxml.html.document_fromstring(page.content, parser=lxml.html.HTMLParser(encoding=page.encoding or 'utf-8'))
+
+
+def find_npc_urls(page, parser: str = DEFAULT_PARSER):
+    """Find the relative urls of the individual NPC pages on the downloaded wiki/NPCs web page. Returns None if the NPC
+    links cannot be located."""
+
+    if parser in (PARSER_LXML_XPATH, PARSER_LXML_STREAM):
+        tree = _lxml_tree(page)  # Parse with lxml directly, no BeautifulSoup tree is built
+
+        # Find the div holding all NPC links
+        div_npcs = tree.xpath(f"//div[{_xpath_has_class('title')}][normalize-space(.)='NPCs']/..")
+        if not div_npcs:
+            print('Failed to locate NPCs div.')
+            return None
+
+        # Collect the link of each individual NPC div
+        individual_npc_divs = div_npcs[0].xpath(f".//*[{_xpath_has_class('i')}]")
+        return [npc_div.xpath('.//a[@href]/@href')[0] for npc_div in individual_npc_divs]
+
+    # Create soup
+    soup = BeautifulSoup(page.content, parser)
+
+    # Find the div holding all NPC links
+    div_npcs = soup.find('div', attrs={'class': 'title'}, text='NPCs').parent
+    if div_npcs is None:
+        print('Failed to locate NPCs div.')
+        return None
+
+    # List the divs for individual NPCs
+    individual_npc_divs = div_npcs.find_all(attrs={'class': 'i'})
+    if individual_npc_divs is None:
+        print('Cannot find divs for individual NPCs.')
+        return None
+
+    # Collect the relative urls of the individual NPC pages
+    return [npc_div.find('a', href=True).get('href', None) for npc_div in individual_npc_divs]
+
+
+def parse_npc_page(npc_page, parser: str = DEFAULT_PARSER, tracer: Tracer = NULL_TRACER,
+                   preference_store: PreferenceStore = None) -> NPC:
+    """Parse the NPC's name and living preferences from a downloaded NPC web page and return an NPC instance, over
+    the passed preference store (or a store of its own)."""
+
+    with tracer.span(SPAN_HTML_PARSE):
+        npc_name, table_html = extract_npc_page(npc_page, parser)
+
+    return build_npc(npc_name, table_html, tracer, preference_store)
+
+
+def extract_npc_page(npc_page, parser: str = DEFAULT_PARSER):
+    """Return the NPC's name and the markup of its living preferences table ('' if there is none)."""
+
+    if parser in (PARSER_LXML_XPATH, PARSER_LXML_STREAM):
+        tree = _lxml_tree(npc_page)  # Parse with lxml directly, skipping BeautifulSoup
+
+        npc_name = tree.xpath("//h1[@id='firstHeading']")[0].text_content().strip()  # Get the npc's name
+        tables = tree.xpath("//table[@class='terraria living-preferences']")  # Find the living preferences table
+        table_html = lxml.html.tostring(tables[0], encoding='unicode') if tables else ''
+
+    else:
+        npc_soup = BeautifulSoup(npc_page.content, parser)  # Make soup
+
+        npc_name = npc_soup.find('h1', attrs={'id': 'firstHeading'}).text.strip()  # Get the npc's name
+        table = npc_soup.find('table', attrs={'class': 'terraria living-preferences'})  # Find the preferences table
+        table_html = str(table) if table is not None else ''
+
+    return npc_name, table_html
+
+
+def _read_preferences(table_html: str, tracer: Tracer) -> pd.DataFrame:
+    # Use pandas read_html to parse the living preferences html table into a DataFrame. Only the table markup that was
+    # already located is handed over, so neither the web page is requested again nor is the whole page parsed again.
+    with tracer.span(SPAN_TABLE_EXTRACT):
+        preferences = pd.read_html(StringIO(table_html), attrs={'class': 'terraria living-preferences'})[0]
+
+    # Index the table by liking level and purge the parsing artifacts from the cells
+    with tracer.span(SPAN_CLEANUP):
+        return normalize_preferences(preferences)
+
+
+def build_npc(npc_name: str, table_html: str, tracer: Tracer = NULL_TRACER,
+              preference_store: PreferenceStore = None) -> NPC:
+    """Build an NPC instance from the NPC's name and the markup of the NPC's living preferences table, over the
+    passed preference store (or a store of its own)."""
+
+    if npc_name in NPC.npcs_with_no_living_preferences():  # Should we look for living preferences?
+        print(f'Skipping {npc_name} (no living preferences).')  # If not
+        with tracer.span(SPAN_NPC_BUILD):
+            return NPC(name=npc_name, living_preferences=None, store=preference_store)  # Build with dummy preferences
+
+    preferences = _read_preferences(table_html, tracer)
+
+    print(f'Successfully parsed {npc_name}!')
+    with tracer.span(SPAN_NPC_BUILD):
+        return NPC(name=npc_name, living_preferences=preferences, store=preference_store)  # Instantiate the NPC
+
+
+def parse_npc_record(npc_page, parser: str = DEFAULT_PARSER, trace: bool = False) -> Tuple[NPCRecord, List[tuple]]:
+    """Parse the NPC's name and living preferences from a downloaded NPC web page (a PageContent, or with the
+    PARSER_LXML_STREAM parser, the already extracted (name, table markup) tuple) into a compact NPCRecord.
+
+    This is the work of the parser processes of read_terraria_wiki: it prints nothing, and with trace, also returns the
+    spans it recorded (attributed to the process) for the scraping process's tracer."""
+
+    tracer = Tracer() if trace else NULL_TRACER
+
+    if parser == PARSER_LXML_STREAM:
+        npc_name, table_html = npc_page
+    else:
+        with tracer.span(SPAN_HTML_PARSE):
+            npc_name, table_html = extract_npc_page(npc_page, parser)
+
+    if npc_name in NPC.npcs_with_no_living_preferences():
+        record = NPCRecord.from_table(npc_name, None)
+    else:
+        record = NPCRecord.from_table(npc_name, _read_preferences(table_html, tracer))
+
+    pid = os.getpid()
+    return record, [(name, start, end, pid, args) for name, start, end, _, args in tracer.spans]
+
+
+def _parser_process_context():
+    # Parser processes are forked from a server process that imported the parsing stack once, rather than from the
+    # scraping process (whose threads, e.g. the gui's, must not be forked); spawned where forking is not available
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _scrape_with_parser_processes(base_url: str, npc_urls: List[str], client: HttpClient, store: ParsedPageStore,
+                                  parser: str, tracer: Tracer, max_workers: int, parse_processes: int,
+                                  scheduler: Optional[CrawlScheduler], preference_store: PreferenceStore):
+    """Scrape the NPC pages in two stages: max_workers threads (or the scheduler's) download the pages, and
+    parse_processes processes parse them (see read_terraria_wiki). Yields a PageResult per page, in completion order."""
+
+    # Every finished page: (index, url, page hash, status, NPC or the future of its parser process job)
+    finished = queue.SimpleQueue()
+
+    # Backpressure: downloaded pages waiting for (or in) the parser processes take a slot, and the download threads
+    # wait for a free one, so that the pages do not pile up in memory when the parsers fall behind
+    slots = threading.BoundedSemaphore(parse_processes * PARSE_QUEUE_PER_PROCESS)
+    closing = threading.Event()
+
+    parsers = ProcessPoolExecutor(max_workers=parse_processes, mp_context=_parser_process_context())
+    fetchers = None
+    fetcher_threads = []
+
+    def failed(i: int, npc_url: str, exc: Exception):
+        _report_failure(npc_url, exc, tracer)
+        finished.put((i, npc_url, None, PAGE_FAILED, None))
+
+    def fetched(i: int, npc_url: str, page_hash: str, npc_page):
+        try:
+            if store is not None:
+                # Look for an NPC parsed from the same contents on a previous run
+                npc = store.get(npc_url, page_hash, preference_store)
+                if npc is not None:
+                    finished.put((i, npc_url, page_hash, PAGE_SKIPPED, npc))
+                    return
+
+            if parser != PARSER_LXML_STREAM:
+                npc_page = PageContent(npc_page.content, npc_page.encoding)
+            while not slots.acquire(timeout=0.1):
+                if closing.is_set():  # The scrape was closed early: the page is dropped, but still reported
+                    finished.put((i, npc_url, page_hash, PAGE_FAILED, None))
+                    return
+
+            def parsed(future):
+                slots.release()
+                finished.put((i, npc_url, page_hash, PAGE_PARSED, future))
+
+            try:
+                future = parsers.submit(parse_npc_record, npc_page, parser, tracer.enabled)
+            except BaseException:
+                slots.release()  # The job never started (e.g. the pool is broken), so its slot would never be freed
+                raise
+            future.add_done_callback(parsed)
+
+        except Exception as exc:
+            failed(i, npc_url, exc)
+
+    def fetch(i: int, npc_url: str):
+        try:
+            page_hash, npc_page = fetch_npc_page(base_url, npc_url, client, parser, tracer)
+        except Exception as exc:
+            failed(i, npc_url, exc)
+            return
+        fetched(i, npc_url, page_hash, npc_page)
+
+    try:
+        if scheduler is not None:
+            fetcher_threads = _fetch_scheduled(base_url, npc_urls, client, parser, tracer, scheduler, fetched, failed)
+        else:
+            fetchers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='NPCPageFetcher')
+            for i, npc_url in enumerate(npc_urls):
+                fetchers.submit(fetch, i, npc_url)
+
+        for _ in npc_urls:
+            i, npc_url, page_hash, status, npc = finished.get()
+
+            if status == PAGE_PARSED:
+                # Turn the record of the parser process into an NPC of the scrape's preference store
+                try:
+                    record, spans = npc.result()
+                    tracer.add_spans(spans)
+                    with tracer.span(SPAN_NPC_BUILD):
+                        npc = NPC.from_record(record, preference_store)
+                    if record.levels is None:
+                        print(f'Skipping {npc.name} (no living preferences).')
+                    else:
+                        print(f'Successfully parsed {npc.name}!')
+                    if store is not None:
+                        store.put(npc_url, page_hash, npc)  # Remember the parsed NPC for the next run
+                except Exception as exc:
+                    _report_failure(npc_url, exc, tracer)
+                    status, npc = PAGE_FAILED, None
+
+            yield PageResult(index=i, status=status, npc=npc)
+    finally:
+        # If the generator is closed early, drop the pages that have not been downloaded or parsed yet
+        closing.set()
+        if scheduler is not None:
+            scheduler.close()
+        for thread in fetcher_threads:
+            thread.join()
+        if fetchers is not None:
+            fetchers.shutdown(wait=True, cancel_futures=True)
+        parsers.shutdown(wait=True, cancel_futures=True)
+
+
+def _scrape_serial(base_url: str, npc_urls: List[str], client: HttpClient, store: ParsedPageStore, parser: str,
+                   tracer: Tracer, preference_store: PreferenceStore):
+    """Scrape the NPC pages one after the other. Yields a PageResult per page, in wiki order."""
+    for i, npc_url in enumerate(npc_urls):
+        npc, status = scrape_npc_page(base_url, npc_url, client, store, parser, tracer, preference_store)
+        yield PageResult(index=i, status=status, npc=npc)
+
+
+def _scrape_concurrent(base_url: str, npc_urls: List[str], client: HttpClient, store: ParsedPageStore, parser: str,
+                       tracer: Tracer, max_workers: int, preference_store: PreferenceStore):
+    """Scrape the NPC pages with at most max_workers pages in flight at any time. Yields a PageResult per page, in
+    completion order."""
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='NPCPageScraper')
+    try:
+        futures = {executor.submit(scrape_npc_page, base_url, npc_url, client, store, parser, tracer,
+                                   preference_store): i for i, npc_url in enumerate(npc_urls)}
+        for future in as_completed(futures):
+            npc, status = future.result()
+            yield PageResult(index=futures[future], status=status, npc=npc)
+    finally:
+        # If the generator is closed early, drop the pages that have not been started yet.
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def read_terraria_wiki(base_url: str = BASE_URL, client: HttpClient = None, max_workers: int = 1,
+                       incremental: bool = True, store: ParsedPageStore = None, parser: str = DEFAULT_PARSER,
+                       tracer: Tracer = NULL_TRACER, parse_processes: int = 0,
+                       scheduler: Optional[CrawlScheduler] = None, source: str = DEFAULT_SOURCE,
+                       journal: Optional[CrawlJournal] = None, cancel: Optional[threading.Event] = None,
+                       preference_store: PreferenceStore = None):
+    """A generator function that scrapes the Terraria wiki web page for information on the individual NPCs' living
+    preferences, constructs an NPC object instance for each NPC using this data, and returns a list of NPCs.
+    On the first yield, the function yields the number of web pages that will be scraped, and then it yields after
+    each page, until it returns the list at the end.
+
+    Each web page is downloaded at most once, through a pooled HttpClient with timeouts, retries and an on-disk
+    response cache. Pass a client to configure it (e.g. to run offline from the cache), or to inspect the amount and
+    timings of the requests issued by the run once the generator is exhausted.
+
+    With max_workers > 1, up to max_workers NPC pages are fetched concurrently. The progress yields then follow the
+    order in which the pages complete, while the returned list always keeps the order of the NPCs on the wiki.
+
+    In incremental mode, the NPC parsed from each page is stored together with a hash of the page's heading and
+    preferences table, and pages whose heading and table did not change since the previous run are not parsed again
+    (in the passed store, or in the default one under the cache directory).
+
+    The preferences of all the NPCs of the run are kept in one PreferenceStore: the passed preference_store, or a new
+    one. NPCs read back from the store of previous runs or from the journal are added to it too, so it holds exactly
+    the NPCs of the run, and goes away with them.
+
+    Each per page yield is a PageResult, carrying the finished NPC and what happened to its page (PAGE_PARSED,
+    PAGE_SKIPPED or PAGE_FAILED), so that consumers can show every NPC as soon as its page is done rather than after
+    the whole scrape.
+
+    The parser selects the HTML parsing backend: BeautifulSoup with 'html.parser' or 'lxml', PARSER_LXML_XPATH
+    (the default), which queries an lxml tree with XPath and skips BeautifulSoup entirely, or PARSER_LXML_STREAM, which
+    parses NPC pages while they download and stops reading them once the preferences table has been found.
+
+    With parse_processes > 0, downloading and parsing are decoupled: max_workers threads only download the NPC pages,
+    and a pool of parse_processes processes parses them, so that parsing is spread over several cores instead of
+    being serialized by the GIL. The parser processes return compact NPCRecords rather than DataFrames, and at most
+    PARSE_QUEUE_PER_PROCESS downloaded pages per process wait for them: downloads pause while the parsers catch up.
+    The parser processes take a moment to start, so this pays off on large or slow to parse page sets.
+
+    With a CrawlScheduler, the NPC pages are downloaded at the pace the wiki sustains rather than by a fixed amount
+    of threads: the scheduler's token bucket and adaptive concurrency (up to its max_concurrency, in place of
+    max_workers) back off on throttled (429) or failing (5xx) responses and on rising latencies, and pages that were
+    throttled are retried after the fresh ones instead of failing. Its on_update callback receives the current rate
+    and concurrency as the pages complete. The default client then leaves the retries to the scheduler; a passed
+    client should be created with max_retries=0 for the same reason.
+
+    The source selects where the NPC pages are read from: SOURCE_HTML (the default) downloads the rendered web page of
+    every NPC, and SOURCE_API reads them through the wiki's MediaWiki API instead (see scrape_api_batch()): the NPC
+    links come from the rendered article of the NPCs page, and the NPC pages are read API_BATCH_SIZE pages per batch,
+    up to max_workers batches at once: a request for their wikitext, and one rendering the living preferences
+    template calls of all of them. This takes two requests per API_BATCH_SIZE NPCs rather than one per NPC, and
+    transfers a fraction of the bytes, for the same NPCs. The progress yields then come batch by batch. The parser
+    only applies to the NPCs page, and parse_processes and the scheduler only to the HTML source.
+
+    With a CrawlJournal, the NPC of every completed page is appended to the journal as soon as the page is done. If
+    the run is interrupted (cancelled, failed, or killed with its process), or some pages failed, the journal is kept,
+    and the next run of the same crawl (same base url and source) resumes from it: the journaled pages are yielded
+    first with PAGE_RESUMED, from the journal, and only the other pages are requested. The journal is deleted once a
+    run completes every page, and started over once older than its max_age (so that a page failing on every run
+    does not freeze the other pages at their journaled NPCs).
+
+    Setting the cancel event (from any thread) stops the run at the next page boundary: the pages that were not
+    started yet are dropped, those in flight are waited for but not yielded, and the NPCs done so far are returned.
+
+    Pass a Tracer to record the timing of every stage of the run (index fetch, NPC page fetch, HTML parse, table
+    extraction, cleanup and NPC construction) and count the requests, bytes downloaded and failures. It is also handed
+    to the default client; a passed client keeps its own tracer."""
+
+    # Result list
+    npcs = []
+
+    # HTTP client shared by all requests of the run (one GET for the NPCs page, plus one GET per individual NPC page)
+    # By default, pages are cached on disk and only revalidated with the wiki once they are older than the cache TTL
+    if client is None:
+        if scheduler is not None:
+            client = HttpClient(max_connections_per_host=scheduler.max_concurrency, max_retries=0,
+                                cache=ResponseCache(), tracer=tracer)
+        else:
+            client = HttpClient(max_connections_per_host=max(max_workers, 1), cache=ResponseCache(), tracer=tracer)
+
+    # Store of the NPCs parsed on previous runs
+    store = (store if store is not None else ParsedPageStore()) if incremental else None
+
+    # Store of the preferences of the NPCs of this run
+    preference_store = preference_store if preference_store is not None else PreferenceStore()
+
+    if source not in SOURCES:
+        raise RuntimeError(f'Unknown source {source}, expected one of {", ".join(SOURCES)}.')
+
+    # Load web page
+    url = base_url + NPCS_URL
+    if source == SOURCE_API:
+        api = MediaWikiAPI(base_url, client)
+        with tracer.span(SPAN_INDEX_FETCH):
+            page = PageContent(api.page_html(url_title(NPCS_URL)).encode('utf-8'), 'utf-8')
+        print(f'Loaded {url_title(NPCS_URL)} through the MediaWiki API: {api.url}')
+    else:
+        with tracer.span(SPAN_INDEX_FETCH):
+            page = client.get(url)
+        print(f'Loading web page: {url}')
+        print(f'Page returned status code: {page.status_code}')
+
+    # Collect the relative urls of the individual NPC pages
+    with tracer.span(SPAN_INDEX_PARSE):
+        npc_urls = find_npc_urls(page, parser)
+    if npc_urls is None:
+        return npcs
+
+    # Yield the number of web pages that will be scraped (equal to the number of NPC divs)
+    yield len(npc_urls)
+
+    # Parsed NPCs, indexed by the position of the NPC on the wiki page (None for pages that failed to parse)
+    results = [None] * len(npc_urls)
+
+    # The amount of pages per status
+    status_counts = {PAGE_PARSED: 0, PAGE_SKIPPED: 0, PAGE_FAILED: 0, PAGE_RESUMED: 0}
+
+    def cancelled() -> bool:
+        return cancel is not None and cancel.is_set()
+
+    # Pages completed by an interrupted earlier run of the same crawl, by url
+    resumed = journal.open(f'{source} {base_url}') if journal is not None else {}
+    complete = False
+    try:
+        pending = [i for i, npc_url in enumerate(npc_urls) if npc_url not in resumed]  # Indices of the pages to scrape
+        if resumed:
+            print(f'Resuming {len(npc_urls) - len(pending)} pages from the crawl journal, {len(pending)} left.')
+        for i, npc_url in enumerate(npc_urls):
+            if npc_url in resumed and not cancelled():
+                results[i] = NPC.from_record(resumed[npc_url], preference_store)
+                status_counts[PAGE_RESUMED] += 1
+                yield PageResult(index=i, status=PAGE_RESUMED, npc=results[i])
+
+        pending_urls = [npc_urls[i] for i in pending]
+        if cancelled() or not pending_urls:
+            pages = (page for page in ())  # Nothing left to scrape
+        elif source == SOURCE_API:
+            # Batched mode: the pages are read through the MediaWiki API, many per request
+            pages = _scrape_api(api, pending_urls, store, tracer, max_workers, preference_store)
+        elif parse_processes > 0:
+            # Pipelined mode: download threads hand the pages to parser processes
+            pages = _scrape_with_parser_processes(base_url, pending_urls, client, store, parser, tracer,
+                                                  max(max_workers, 1), parse_processes, scheduler, preference_store)
+        elif scheduler is not None:
+            # Scheduled mode: the scheduler decides when each page is requested, and retries the throttled ones
+            pages = _scrape_scheduled(base_url, pending_urls, client, store, parser, tracer, scheduler,
+                                      preference_store)
+        elif max_workers <= 1:
+            # Serial mode: fetch the individual NPC pages one after the other
+            pages = _scrape_serial(base_url, pending_urls, client, store, parser, tracer, preference_store)
+        else:
+            # Concurrent mode: at most max_workers pages are in flight at any time
+            pages = _scrape_concurrent(base_url, pending_urls, client, store, parser, tracer, max_workers,
+                                       preference_store)
+
+        # Pages complete in arbitrary order in most modes, but each result is stored at the index of its page, so the
+        # final list keeps the wiki order.
+        try:
+            for page in pages:
+                page = page._replace(index=pending[page.index])
+                results[page.index] = page.npc
+                status_counts[page.status] += 1
+                if journal is not None and page.npc is not None:
+                    journal.append(npc_urls[page.index], page.npc)
+                # Yield after each completed web page. Useful for denoting progress, showing the NPC or cancelling.
+                yield page
+                if cancelled():
+                    break
+        finally:
+            pages.close()  # If the run was cancelled or closed early, drop the pages that have not been started yet
+
+        complete = not cancelled() and status_counts[PAGE_FAILED] == 0
+    finally:
+        if journal is not None:
+            journal.discard() if complete else journal.close()
+
+    if cancelled():
+        print(f'Cancelled after {sum(status_counts.values())} of {len(npc_urls)} pages.')
+
+    # Drop the pages that failed to parse
+    npcs = [npc for npc in results if npc is not None]
+
+    print(f'Pages: {status_counts[PAGE_PARSED]} parsed, {status_counts[PAGE_SKIPPED]} skipped (unchanged), '
+          f'{status_counts[PAGE_FAILED]} failed, {status_counts[PAGE_RESUMED]} resumed')
+    print(f'Requests: {client.timing_summary()}')
+    return npcs
+
@@ -0,0 +1,73 @@
+from typing import Iterable, Optional, Tuple
+
+from lxml import etree
+
+from terraria.npcs import NPC
+
+
+# Size of the chunks read from the response body while streaming
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def _is_heading(element) -> bool:
+    return element.tag == 'h1' and element.get('id') == 'firstHeading'
+
+
+def _is_preferences_table(element) -> bool:
+    return element.tag == 'table' and element.get('class') == 'terraria living-preferences'
+
+
+def stream_npc_page(chunks: Iterable[bytes], encoding: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """Incrementally parse an NPC web page from an iterable of byte chunks, and return a tuple of the NPC's name and
+    the markup of the living preferences table ('' if the page has none).
+
+    Only the heading and the preferences table are kept in memory: every other element is discarded as soon as it has
+    been parsed. Consumption of the chunks stops as soon as both elements have been seen (or as soon as the heading
+    names an NPC without living preferences), so the rest of the page does not need to be downloaded."""
+
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding or 'utf-8')
+
+    npc_name = None
+    table_html = None
+    keep = 0  # The amount of currently open elements that will be captured (their contents must not be discarded)
+
+    def done():
+        return npc_name is not None and (table_html is not None or npc_name in NPC.npcs_with_no_living_preferences())
+
+    def handle_events():
+        nonlocal npc_name, table_html, keep
+
+        for event, element in parser.read_events():
+            captured = (npc_name is None and _is_heading(element)) or \
+                       (table_html is None and _is_preferences_table(element))
+
+            if event == 'start':
+                keep += captured
+                continue
+
+            if captured:
+                keep -= 1
+                if element.tag == 'h1':
+                    npc_name = ''.join(element.itertext()).strip()
+                else:
+                    table_html = etree.tostring(element, encoding='unicode', method='html', with_tail=False)
+                if done():
+                    return
+
+            if keep == 0:
+                # Discard the element and its already parsed preceding siblings, to bound memory by the captured size
+                element.clear(keep_tail=True)
+                parent = element.getparent()
+                while parent is not None and element.getprevious() is not None:
+                    del parent[0]
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        handle_events()
+        if done():
+            break
+    else:
+        parser.close()  # The whole page was read, flush the remaining events
+        handle_events()
+
+    return npc_name, table_html if table_html is not None else ''
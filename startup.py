@@ -0,0 +1,122 @@
+"""Startup profiling of the entry points: the import cost of main.py (GUI) and cli.py, as reported by python -X
+importtime, and a time-to-window-shown benchmark of the GUI. Every measurement runs in a fresh interpreter.
+
+    python startup.py                          # Import cost report
+    python startup.py --runs 5 --budget 1.0    # Time-to-window-shown benchmark, fails if the median exceeds 1 second"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from typing import List, NamedTuple, Tuple
+
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Entry points, by the module that implements them
+ENTRY_POINTS = (('main.py (GUI)', 'main'), ('cli.py', 'cli'))
+
+# Printed by main.py --exit-when-shown once the window has been shown and the event loop is running
+WINDOW_SHOWN_MARKER = 'window-shown'
+
+
+class ImportCost(NamedTuple):
+    """The cost of importing a module in a fresh interpreter, as reported by python -X importtime."""
+    module: str
+    seconds: float  # Cumulative import time of the module
+    modules: Tuple[Tuple[str, float], ...]  # The (name, self seconds) of every module it imported (itself included)
+
+    @property
+    def qt(self) -> bool:
+        """Whether PyQt6 was imported."""
+        return any(name.split('.')[0] == 'PyQt6' for name, _ in self.modules)
+
+    def slowest(self, count: int = 10) -> List[Tuple[str, float]]:
+        """The modules that took the longest to import themselves (excluding their own imports)."""
+        return sorted(self.modules, key=lambda module: -module[1])[:count]
+
+
+def _environment():
+    return {**os.environ, 'QT_QPA_PLATFORM': os.environ.get('QT_QPA_PLATFORM', 'offscreen')}
+
+
+def import_cost(module: str) -> ImportCost:
+    """Import the module in a fresh interpreter with -X importtime, and return its cumulative import cost."""
+
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=PROJECT_DIR,
+                             capture_output=True, text=True, env=_environment())
+    if process.returncode != 0:
+        raise RuntimeError(f'Importing {module} failed:\n{process.stderr}')
+
+    # Lines look like "import time:       123 |        456 |   package.module" (times in microseconds, the name is
+    # indented by nesting depth). The module's own line comes after the lines of everything it imported.
+    lines = re.findall(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$', process.stderr, re.MULTILINE)
+    index = next(i for i, line in enumerate(lines) if line[3] == module and not line[2])
+    previous = max((i for i, line in enumerate(lines[:index]) if not line[2]), default=-1)
+    modules = tuple((name, int(self_us) / 1e6) for self_us, _, _, name in lines[previous + 1:index + 1])
+    return ImportCost(module=module, seconds=int(lines[index][1]) / 1e6, modules=modules)
+
+
+def time_to_window_shown(timeout: float = 60.0) -> float:
+    """Start the GUI in a fresh interpreter, and return the seconds until its window is shown with the event loop
+    running (interpreter startup and imports included)."""
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'main.py', '--exit-when-shown'], cwd=PROJECT_DIR,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=_environment())
+    try:
+        for line in process.stdout:
+            if line.strip() == WINDOW_SHOWN_MARKER:
+                return time.perf_counter() - start
+            if time.perf_counter() - start > timeout:
+                break
+    finally:
+        process.kill()
+        process.wait()
+    raise RuntimeError('The GUI exited without showing its window.')
+
+
+def startup_report(slowest: int = 0, window_runs: int = 0):
+    """Print the import cost of every entry point, optionally followed by each one's slowest imports, and the median
+    time to window shown of the GUI over window_runs runs."""
+
+    costs = [(name, import_cost(module)) for name, module in ENTRY_POINTS]
+
+    print(f'{"entry point":<15}{"import time":>12}{"modules":>9}  PyQt6')
+    for name, cost in costs:
+        print(f'{name:<15}{cost.seconds * 1000:>10.1f}ms{len(cost.modules):>9}  {"yes" if cost.qt else "no"}')
+
+    for name, cost in costs if slowest else ():
+        print(f'\nSlowest imports of {name} (self time):')
+        for module, seconds in cost.slowest(slowest):
+            print(f'{seconds * 1000:>10.1f}ms  {module}')
+
+    if window_runs:
+        timings = [time_to_window_shown() for _ in range(window_runs)]
+        print(f'\nTime to window shown: median {statistics.median(timings) * 1000:.0f}ms, '
+              f'best {min(timings) * 1000:.0f}ms ({window_runs} runs)')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Startup profiling of the GUI and CLI entry points.')
+    parser.add_argument('--slowest', type=int, default=10, help='list the N slowest imports of each entry point')
+    parser.add_argument('--runs', type=int, default=0, help='measure the time to window shown of the GUI N times')
+    parser.add_argument('--budget', type=float,
+                        help='fail if the median time to window shown exceeds this many seconds')
+    args = parser.parse_args(argv)
+
+    if args.budget is None:
+        startup_report(slowest=args.slowest, window_runs=args.runs)
+        return 0
+
+    timings = [time_to_window_shown() for _ in range(max(args.runs, 1))]
+    median = statistics.median(timings)
+    print(f'Time to window shown: median {median * 1000:.0f}ms, budget {args.budget * 1000:.0f}ms')
+    return 0 if median <= args.budget else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
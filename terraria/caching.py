@@ -0,0 +1,31 @@
+import functools
+import threading
+from typing import Callable, Sequence, TypeVar
+
+from terraria.npcs import NPC
+
+T = TypeVar('T')
+
+
+def last_result_cache(factory: Callable[[Sequence[NPC]], T]) -> Callable[[Sequence[NPC]], T]:
+    """Wrap factory, a function of a set of NPCs, so that its result for the last set of NPCs it was called with is
+    reused. A set of NPCs is the same if it holds the same NPC objects in the same order (they are compared by
+    identity, not by value). The wrapper is thread-safe: concurrent calls with the same new set of NPCs call factory
+    once."""
+
+    lock = threading.Lock()
+    cached_npcs = ()
+    cached_result = None
+
+    @functools.wraps(factory)
+    def wrapper(npcs: Sequence[NPC]) -> T:
+        nonlocal cached_npcs, cached_result
+
+        npcs = tuple(npcs)
+        with lock:
+            if cached_result is None or len(npcs) != len(cached_npcs) or \
+                    any(npc is not cached for npc, cached in zip(npcs, cached_npcs)):
+                cached_npcs, cached_result = npcs, factory(npcs)
+            return cached_result
+
+    return wrapper
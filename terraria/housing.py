@@ -0,0 +1,194 @@
+import math
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from terraria.npcs import NPC
+
+
+# Price modifier applied per liked / disliked biome or neighbor, by liking level
+LIKING_MODIFIERS = {'Loves': 0.88, 'Likes': 0.94, 'Dislikes': 1.06, 'Hates': 1.12}
+
+# Crowding: an NPC with at most SOLITUDE_MAX_OTHERS other NPCs nearby gets a bonus, and every NPC nearby beyond
+# CROWDING_MAX_OTHERS adds a penalty
+SOLITUDE_MAX_OTHERS = 2
+SOLITUDE_MODIFIER = 0.95
+CROWDING_MAX_OTHERS = 3
+CROWDING_MODIFIER = 1.05
+
+# The game clamps the final price modifier to this range
+MIN_MODIFIER = 0.75
+MAX_MODIFIER = 1.5
+
+
+class HousingPlan(NamedTuple):
+    """A grouping of NPCs into houses. The NPCs of a house live next to each other, in the house's biome."""
+    houses: Tuple[Tuple[str, Tuple[str, ...]], ...]  # (biome, NPC names) per house
+    modifiers: Dict[str, float]  # The resulting price modifier of each NPC
+    total: float  # The sum of all price modifiers (lower is better)
+
+
+class HousingProblem:
+    """The score matrices of a housing problem, indexed by integer NPC and biome ids.
+
+    All modifiers are kept as logarithms, so that the modifier of an NPC is the exponent of a sum: its biome score in
+    the house's biome, plus its neighbor score for each housemate, plus the crowding score for the house size."""
+
+    def __init__(self, npcs: Iterable[NPC], biomes: Optional[Sequence[str]] = None):
+        # NPCs without living preferences don't take part in housing
+        npcs = [npc for npc in npcs if npc.liking_levels]
+
+        if biomes is None:  # Default to every biome any NPC has a preference for
+            biomes = sorted({biome for npc in npcs for level in npc.liking_levels
+                             for biome in npc.preferences_at(level).biomes if biome != NPC.not_available})
+
+        self.names = [npc.name for npc in npcs]
+        self.biomes = list(biomes)
+
+        npc_ids = {name: i for i, name in enumerate(self.names)}
+        biome_ids = {biome: i for i, biome in enumerate(self.biomes)}
+
+        self.biome_log = np.zeros((len(self.names), len(self.biomes)))  # [npc, biome]
+        self.neighbor_log = np.zeros((len(self.names), len(self.names)))  # [npc, neighbor]
+        for i, npc in enumerate(npcs):
+            for level in npc.liking_levels:
+                modifier = LIKING_MODIFIERS.get(level)
+                if modifier is None:
+                    continue
+                preferences = npc.preferences_at(level)
+                for biome in preferences.biomes:
+                    if biome in biome_ids:
+                        self.biome_log[i, biome_ids[biome]] += math.log(modifier)
+                for neighbor in preferences.neighbors:
+                    if neighbor in npc_ids and npc_ids[neighbor] != i:
+                        self.neighbor_log[i, npc_ids[neighbor]] += math.log(modifier)
+
+        # Crowding score by house size (the other NPCs in the house are the ones nearby)
+        others = np.arange(len(self.names) + 2) - 1
+        self.crowding_log = np.where(others <= SOLITUDE_MAX_OTHERS, math.log(SOLITUDE_MODIFIER), 0.0) + \
+            np.maximum(others - CROWDING_MAX_OTHERS, 0) * math.log(CROWDING_MODIFIER)
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def modifier(log):
+        """Convert log modifiers to clamped price modifiers."""
+        return np.clip(np.exp(log), MIN_MODIFIER, MAX_MODIFIER)
+
+    def npc_logs(self, assignment: np.ndarray, house_biomes: np.ndarray) -> np.ndarray:
+        """Return the log modifier of each NPC, given the house of each NPC and the biome of each house."""
+
+        housemates = assignment[:, None] == assignment[None, :]
+        np.fill_diagonal(housemates, False)
+        sizes = np.bincount(assignment, minlength=len(house_biomes))
+        return (self.biome_log[np.arange(len(self)), house_biomes[assignment]]
+                + (self.neighbor_log * housemates).sum(axis=1)
+                + self.crowding_log[sizes[assignment]])
+
+    def total(self, assignment: np.ndarray, house_biomes: np.ndarray) -> float:
+        return float(self.modifier(self.npc_logs(assignment, house_biomes)).sum())
+
+
+def _best_biomes(problem: HousingProblem, assignment: np.ndarray, house_biomes: np.ndarray, logs: np.ndarray):
+    """Move every house to the biome that minimizes the sum of its NPCs' modifiers."""
+
+    for house in np.unique(assignment):
+        members = np.flatnonzero(assignment == house)
+        base = logs[members] - problem.biome_log[members, house_biomes[house]]  # Scores without the biome
+        costs = problem.modifier(base[:, None] + problem.biome_log[members]).sum(axis=0)  # Cost per biome
+        house_biomes[house] = int(np.argmin(costs))
+
+
+def _local_search(problem: HousingProblem, assignment: np.ndarray, house_biomes: np.ndarray,
+                  max_house_size: Optional[int], rng: np.random.Generator, max_sweeps: int):
+    """Improve a housing plan by moving single NPCs to the house where they add the least cost, and re-picking the
+    biome of each house, until no move improves the plan."""
+
+    n = len(problem)
+
+    for _ in range(max_sweeps):
+        improved = False
+
+        for npc in rng.permutation(n):
+            logs = problem.npc_logs(assignment, house_biomes)
+            current = assignment[npc]
+
+            # Candidate houses: the occupied ones, plus a single empty one (all empty houses are equivalent)
+            occupied = np.unique(assignment)
+            empty = np.setdiff1d(np.arange(n), occupied, assume_unique=True)
+            houses = np.concatenate((occupied, empty[:1]))
+
+            # Take the NPC out of its house, and adjust the scores of its former housemates accordingly
+            members = houses[:, None] == assignment[None, :]  # [candidate house, npc]
+            members[:, npc] = False
+            sizes = members.sum(axis=1)
+            slot = int(np.flatnonzero(houses == current)[0])
+            former = members[slot]
+            logs[former] += -problem.neighbor_log[former, npc] \
+                - problem.crowding_log[sizes[slot] + 1] + problem.crowding_log[sizes[slot]]
+
+            # Cost of every candidate house without the NPC, and with it
+            crowding_delta = problem.crowding_log[sizes + 1] - problem.crowding_log[sizes]
+            with_npc = logs[None, :] + problem.neighbor_log[:, npc][None, :] + crowding_delta[:, None]
+            cost_with = (problem.modifier(with_npc) * members).sum(axis=1)
+            cost_without = (problem.modifier(logs)[None, :] * members).sum(axis=1)
+
+            # The NPC itself: in an empty house it gets its best biome, otherwise the house's biome
+            biomes = np.where(sizes == 0, np.argmin(problem.biome_log[npc]), house_biomes[houses])
+            own = problem.biome_log[npc, biomes] + members @ problem.neighbor_log[npc] + problem.crowding_log[sizes + 1]
+            delta = cost_with + problem.modifier(own) - cost_without
+
+            if max_house_size is not None:
+                delta[sizes >= max_house_size] = np.inf
+
+            best = int(np.argmin(delta))
+            if best != slot and delta[best] < delta[slot] - 1e-12:
+                assignment[npc] = houses[best]
+                if sizes[best] == 0:
+                    house_biomes[houses[best]] = biomes[best]
+                improved = True
+
+        _best_biomes(problem, assignment, house_biomes, problem.npc_logs(assignment, house_biomes))
+        if not improved:
+            break
+
+
+def optimize_housing(npcs: Iterable[NPC], biomes: Optional[Sequence[str]] = None, max_house_size: Optional[int] = None,
+                     restarts: int = 8, max_sweeps: int = 50, seed: int = 0) -> HousingPlan:
+    """Group the NPCs into houses, and pick the biome of each house, so that the sum of the NPCs' price modifiers is
+    as low as possible. Takes every liking level of the biome and neighbor preferences into account, as well as the
+    crowding rules. The search is a local search from several random starting plans; the best plan found is returned.
+
+    NPCs without living preferences are left out of the plan. Biomes default to every biome any NPC has a preference
+    for; max_house_size optionally limits the amount of NPCs per house."""
+
+    problem = HousingProblem(npcs, biomes)
+    n = len(problem)
+    if n == 0 or not problem.biomes:
+        return HousingPlan(houses=(), modifiers={}, total=0.0)
+
+    rng = np.random.default_rng(seed)
+    best = None
+
+    for _ in range(max(restarts, 1)):
+        # Start from random houses of three, the largest size that still gets the solitude bonus
+        group_size = min(SOLITUDE_MAX_OTHERS + 1, max_house_size or n)
+        assignment = rng.permutation(n) // group_size
+        house_biomes = np.zeros(n, dtype=int)
+        _best_biomes(problem, assignment, house_biomes, problem.npc_logs(assignment, house_biomes))
+
+        _local_search(problem, assignment, house_biomes, max_house_size, rng, max_sweeps)
+
+        total = problem.total(assignment, house_biomes)
+        if best is None or total < best[0]:
+            best = (total, assignment.copy(), house_biomes.copy())
+
+    total, assignment, house_biomes = best
+    modifiers = problem.modifier(problem.npc_logs(assignment, house_biomes))
+    houses = tuple(
+        (problem.biomes[house_biomes[house]], tuple(problem.names[i] for i in np.flatnonzero(assignment == house)))
+        for house in np.unique(assignment)
+    )
+    return HousingPlan(houses=houses, modifiers={name: float(m) for name, m in zip(problem.names, modifiers)},
+                       total=total)
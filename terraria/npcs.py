@@ -1,60 +1,289 @@
+import threading
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 
-from typing import Optional
-from pandas import DataFrame
+if TYPE_CHECKING:
+	from pandas import DataFrame
+
+# NumPy and pandas are only imported once a DataFrame (or a NumPy snapshot of a store) is asked for, so that NPCs can
+# be loaded from a snapshot and displayed without importing the data stack.
+
+
+class LivingPreferences(NamedTuple):
+	"""The biomes and neighbors an NPC has at a single liking level."""
+	biomes: Tuple[str, ...]
+	neighbors: Tuple[str, ...]
+
+
+class NPCRecord(NamedTuple):
+	"""The compact, picklable form of an NPC: its name and its (level, kind, target) preference records, without any
+	DataFrame. Cheap to send between processes; NPC.from_record() adds it to a preference store."""
+	name: str
+	levels: Optional[Tuple[str, ...]]  # The liking levels, in table order (None if the NPC has no living preferences)
+	kinds: Tuple[str, ...]  # The preference kinds (table columns)
+	records: Tuple[Tuple[str, str, str], ...]
+
+	@classmethod
+	def from_table(cls, name: str, living_preferences: Optional['DataFrame']) -> 'NPCRecord':
+		"""Build the record of a living preferences table (liking levels x preference kinds, as normalized by the
+		scraper)."""
+
+		if living_preferences is None:
+			return cls(name, None, (), ())
+
+		records = []
+		for level in living_preferences.index:
+			for kind in living_preferences.columns:
+				cell = living_preferences.at[level, kind]
+				if isinstance(cell, str) and cell != NPC.not_available:
+					records.extend((level, kind, target.strip()) for target in cell.split(', '))
+		return cls(name, tuple(living_preferences.index), tuple(living_preferences.columns), tuple(records))
+
+
+class PreferenceStore:
+	"""A columnar store of the living preferences of many NPCs.
+
+	Every distinct string (liking level, preference kind, biome or NPC name) is interned once into an integer id, and
+	each preference is stored as one (npc, level, kind, target) row of ids across four typed arrays. An NPC only keeps
+	the range of its rows, so no per-NPC DataFrame is kept alive. Rows are only ever appended, so a store lives as
+	long as the NPCs over it: each scrape (or snapshot) builds its NPCs into a store of its own. Safe to use from
+	multiple threads.
+
+	A store pickles as a new, empty store: pickled NPCs carry their own records, and add them back to it when they are
+	unpickled. The NPCs of a store that are pickled together thus share a store again once unpickled."""
+
+	def __init__(self):
+		self.strings: List[str] = []  # id -> string
+		self._ids: Dict[str, int] = {}  # string -> id
+		self.npc_ids = array('i')
+		self.level_ids = array('i')
+		self.kind_ids = array('i')
+		self.target_ids = array('i')
+		self._npc_count = 0
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.target_ids)
+
+	def __reduce__(self):
+		return PreferenceStore, ()
+
+	@classmethod
+	def from_columns(cls, strings: List[str], npc_ids: array, level_ids: array, kind_ids: array, target_ids: array,
+					 npc_count: int) -> 'PreferenceStore':
+		"""Build a store over existing columns (e.g. read from a snapshot file): a string table, and the four id arrays
+		of the rows of npc_count NPCs."""
+
+		store = cls()
+		store.strings = strings
+		store._ids = {string: string_id for string_id, string in enumerate(strings)}
+		store.npc_ids, store.level_ids, store.kind_ids, store.target_ids = npc_ids, level_ids, kind_ids, target_ids
+		store._npc_count = npc_count
+		return store
+
+	def _intern(self, string: str) -> int:
+		string_id = self._ids.get(string)
+		if string_id is None:
+			string_id = self._ids[string] = len(self.strings)
+			self.strings.append(string)
+		return string_id
+
+	def add(self, levels: Sequence[str], kinds: Sequence[str], records: Sequence[Tuple[str, str, str]]):
+		"""Append the (level, kind, target) records of one NPC. Returns a tuple of the NPC's (start, stop) row range
+		and its level and kind ids."""
+
+		with self._lock:
+			npc_id = self._npc_count
+			self._npc_count += 1
+			level_ids = tuple(self._intern(level) for level in levels)
+			kind_ids = tuple(self._intern(kind) for kind in kinds)
+			start = len(self.target_ids)
+			for level, kind, target in records:
+				self.npc_ids.append(npc_id)
+				self.level_ids.append(self._intern(level))
+				self.kind_ids.append(self._intern(kind))
+				self.target_ids.append(self._intern(target))
+			return start, len(self.target_ids), level_ids, kind_ids
+
+	def records(self, start: int, stop: int) -> Iterator[Tuple[str, str, str]]:
+		"""Iterate over the (level, kind, target) records of the rows in the passed range."""
+
+		strings = self.strings
+		for i in range(start, stop):
+			yield strings[self.level_ids[i]], strings[self.kind_ids[i]], strings[self.target_ids[i]]
+
+	def columns(self):
+		"""Return a consistent snapshot of the store: a copy of the string table, and NumPy copies of the level, kind
+		and target id columns."""
+
+		import numpy as np
+
+		with self._lock:
+			# Copy while holding the lock (the arrays cannot grow while their buffers are exported)
+			return (list(self.strings), *(np.frombuffer(column, dtype=np.int32).copy() for column in
+										  (self.level_ids, self.kind_ids, self.target_ids)))
+
+	def nbytes(self) -> int:
+		"""The amount of memory taken by the row arrays (the string table is not included)."""
+		return sum(column.itemsize * len(column) for column in
+				   (self.npc_ids, self.level_ids, self.kind_ids, self.target_ids))
 
 
 class NPC:
+	"""A Terraria NPC and its living preferences.
+
+	The preferences are kept in a PreferenceStore shared with other NPCs (e.g. those of the same scrape), or in a store
+	of the NPC's own if none is passed, and the living_preferences DataFrame is only built on demand, when it is
+	accessed."""
+
+	__slots__ = ('name', '_store', '_start', '_stop', '_levels', '_kinds', '_preferences')
 
-	def __init__(self, name: str, living_preferences: Optional[DataFrame] = None):
+	# The value of a living preferences cell with no biomes or neighbors in it
+	not_available = 'N/A'
+
+	def __init__(self, name: str, living_preferences: Optional['DataFrame'] = None, store: PreferenceStore = None):
 		self.name = name
-		self.living_preferences = living_preferences
+		self._store = store if store is not None else PreferenceStore()
+		record = NPCRecord.from_table(name, living_preferences)
+		self._set_records(record.levels, record.kinds, record.records)
 
 	@property
-	def favorite_biomes(self):
-		if self.living_preferences is not None:
-			liking_scale = list(self.living_preferences.index)
-			for liking in liking_scale:
-				biome = self.living_preferences['Biome'][liking]
-				if biome != 'N/A':
-					favorite = [s.strip() for s in biome.split(', ')]
-					return favorite
-		return ['N/A']
+	def living_preferences(self) -> Optional['DataFrame']:
+		"""A DataFrame view of the NPC's living preferences (liking levels x preference kinds), built on each access.
+		None if the NPC has no living preferences."""
+
+		if self._levels is None:
+			return None
+
+		strings = self._store.strings
+		levels = [strings[level] for level in self._levels]
+		kinds = [strings[kind] for kind in self._kinds]
+		cells = {(level, kind): [] for level in levels for kind in kinds}
+		for level, kind, target in self._store.records(self._start, self._stop):
+			cells[level, kind].append(target)
+
+		data = {kind: [', '.join(cells[level, kind]) or self.not_available for level in levels] for kind in kinds}
+		from pandas import DataFrame
+		return DataFrame(data, index=levels, columns=kinds, dtype=object)
+
+	@living_preferences.setter
+	def living_preferences(self, value: Optional['DataFrame']):
+		# Reassigning the table moves the NPC to a store of its own, so that a store shared with other NPCs never grows
+		# with tables replacing each other (the rows of the previous table go with the store they are in), and
+		# invalidates the preferences parsed from the previous table
+		self._store = PreferenceStore()
+		record = NPCRecord.from_table(self.name, value)
+		self._set_records(record.levels, record.kinds, record.records)
+
+	def _set_records(self, levels: Optional[Sequence[str]], kinds: Sequence[str], records):
+		if levels is None:
+			self._start = self._stop = 0
+			self._levels = self._kinds = None
+		else:
+			self._start, self._stop, self._levels, self._kinds = self._store.add(levels, kinds, records)
+		self._preferences = None
 
 	@property
-	def favorite_neighbors(self):
-		if self.living_preferences is not None:
-			liking_scale = list(self.living_preferences.index)
-			for liking in liking_scale:
-				neighbor = self.living_preferences['Neighbor'][liking]
-				if neighbor != 'N/A':
-					favorite = [s.strip() for s in neighbor.split(', ')]
-					return favorite
-		return ['N/A']
+	def preference_rows(self) -> Tuple[PreferenceStore, int, int]:
+		"""The store holding the NPC's preferences, and the (start, stop) range of the NPC's rows in it."""
+		return self._store, self._start, self._stop
 
 	@property
-	def least_favorite_biomes(self):
-		if self.living_preferences is not None:
-			disliking_scale = reversed(list(self.living_preferences.index))
-			for disliking in disliking_scale:
-				biome = self.living_preferences['Biome'][disliking]
-				if biome != 'N/A':
-					least_favorite = [s.strip() for s in biome.split(', ')]
-					return least_favorite
-		return ['N/A']
+	def record(self) -> NPCRecord:
+		"""The NPC's compact, picklable record."""
+		if self._levels is None:
+			return NPCRecord(self.name, None, (), ())
+		strings = self._store.strings
+		return NPCRecord(self.name, tuple(strings[level] for level in self._levels),
+						 tuple(strings[kind] for kind in self._kinds), tuple(self._store.records(self._start, self._stop)))
+
+	@classmethod
+	def from_rows(cls, name: str, store: PreferenceStore, start: int, stop: int, levels: Optional[Tuple[int, ...]],
+				  kinds: Tuple[int, ...]) -> 'NPC':
+		"""Build an NPC over rows already in the store (e.g. loaded from a snapshot file). levels and kinds are the
+		string ids of the NPC's liking levels and preference kinds; levels is None if it has no living preferences."""
+
+		npc = cls.__new__(cls)
+		npc.name = name
+		npc._store = store
+		npc._start, npc._stop = (start, stop) if levels is not None else (0, 0)
+		npc._levels = levels
+		npc._kinds = kinds if levels is not None else None
+		npc._preferences = None
+		return npc
+
+	@classmethod
+	def from_record(cls, record: NPCRecord, store: PreferenceStore = None) -> 'NPC':
+		"""Build an NPC from its record, adding the records to the passed store (or to a store of its own)."""
+		npc = cls(record.name, store=store)
+		npc._set_records(record.levels, record.kinds, record.records)
+		return npc
+
+	def __reduce__(self):
+		# Pickle the NPC's own records rather than the whole shared store, which pickles as a new empty store (once per
+		# pickle, so the NPCs sharing it still share one once unpickled)
+		return _unpickle_npc, (self._store, *self.record)
+
+	def _parse_preferences(self):
+		"""Group the NPC's stored records into a mapping of liking level -> LivingPreferences, and find the favorite and
+		least favorite biomes and neighbors. Every accessor reads the grouped result afterwards."""
+
+		levels = {}
+		if self._levels is not None:
+			strings = self._store.strings
+			targets = {(strings[level], kind): [] for level in self._levels for kind in ('Biome', 'Neighbor')}
+			for level, kind, target in self._store.records(self._start, self._stop):
+				targets.setdefault((level, kind), []).append(target)
+			for level in self._levels:
+				level = strings[level]
+				levels[level] = LivingPreferences(biomes=tuple(targets[level, 'Biome']) or (self.not_available,),
+												  neighbors=tuple(targets[level, 'Neighbor']) or (self.not_available,))
+
+		not_available = (self.not_available,)
+		biomes = [p.biomes for p in levels.values() if p.biomes != not_available]
+		neighbors = [p.neighbors for p in levels.values() if p.neighbors != not_available]
+
+		self._preferences = {
+			'levels': levels,
+			'favorite_biomes': biomes[0] if biomes else not_available,
+			'favorite_neighbors': neighbors[0] if neighbors else not_available,
+			'least_favorite_biomes': biomes[-1] if biomes else not_available,
+			'least_favorite_neighbors': neighbors[-1] if neighbors else not_available,
+		}
+		return self._preferences
+
+	def _parsed(self, key: str):
+		preferences = self._preferences if self._preferences is not None else self._parse_preferences()
+		return preferences[key]
+
+	@property
+	def liking_levels(self) -> Tuple[str, ...]:
+		"""The liking levels of the living preferences table, from the most liked to the most disliked."""
+		return tuple(self._parsed('levels'))
+
+	def preferences_at(self, level: str) -> LivingPreferences:
+		"""Return the biomes and neighbors at the passed liking level (e.g. 'Loves'). Missing levels are 'N/A'."""
+		not_available = (self.not_available,)
+		return self._parsed('levels').get(level, LivingPreferences(biomes=not_available, neighbors=not_available))
+
+	@property
+	def favorite_biomes(self) -> Tuple[str, ...]:
+		return self._parsed('favorite_biomes')
 
 	@property
-	def least_favorite_neighbors(self):
-		if self.living_preferences is not None:
-			disliking_scale = reversed(list(self.living_preferences.index))
-			for disliking in disliking_scale:
-				neighbor = self.living_preferences['Neighbor'][disliking]
-				if neighbor != 'N/A':
-					least_favorite = [s.strip() for s in neighbor.split(', ')]
-					return least_favorite
-		return ['N/A']
+	def favorite_neighbors(self) -> Tuple[str, ...]:
+		return self._parsed('favorite_neighbors')
+
+	@property
+	def least_favorite_biomes(self) -> Tuple[str, ...]:
+		return self._parsed('least_favorite_biomes')
+
+	@property
+	def least_favorite_neighbors(self) -> Tuple[str, ...]:
+		return self._parsed('least_favorite_neighbors')
 
 	def __repr__(self):
-		if self.living_preferences is not None:
+		if self._levels is not None:
 			preferences = self.living_preferences
 		else:
 			preferences = 'No living preferences.'
@@ -74,4 +303,10 @@ class NPC:
 			'Town Dog',
 			'Town Bunny',
 			'Confused'
-		)
\ No newline at end of file
+		)
+
+
+def _unpickle_npc(store: PreferenceStore, name: str, levels: Optional[Tuple[str, ...]], kinds: Tuple[str, ...],
+				  records) -> NPC:
+	"""Rebuild a pickled NPC into the (new) store unpickled with it."""
+	return NPC.from_record(NPCRecord(name, levels, kinds, records), store)
@@ -0,0 +1,170 @@
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence
+
+from terraria.npcs import NPC
+from terraria.caching import last_result_cache
+
+
+# Liking levels, from the most liked to the most disliked
+LIKING_LEVELS = ('Loves', 'Likes', 'Dislikes', 'Hates')
+
+# Preference kinds (living preferences table columns)
+BIOME = 'Biome'
+NEIGHBOR = 'Neighbor'
+
+_NO_NPCS: FrozenSet[str] = frozenset()
+
+# Separates the clauses of a search (see PreferenceIndex.search())
+_CLAUSES = re.compile(r'\s*[,;&]\s*|\s+and\s+', re.IGNORECASE)
+
+
+def all_of(*sets: Iterable[str]) -> FrozenSet[str]:
+    """The NPCs in every passed set (their intersection)."""
+    return frozenset.intersection(*map(frozenset, sets)) if sets else _NO_NPCS
+
+
+def any_of(*sets: Iterable[str]) -> FrozenSet[str]:
+    """The NPCs in any of the passed sets (their union)."""
+    return frozenset().union(*sets)
+
+
+class PreferenceIndex:
+    """Inverted indexes of the living preferences of a set of NPCs, for answering cross-NPC questions ("who loves the
+    Hallow?", "who hates the Guide?") without looping over the NPCs.
+
+    The indexes are built in one pass over the NPCs' rows in their PreferenceStore:
+
+    - biomes: biome -> {NPC name: liking level}
+    - neighbors: neighbor -> {NPC name: liking level}, i.e. the reversed neighbor graph (who feels what about whom)
+    - opinions: NPC name -> {neighbor: liking level}, the neighbor graph itself
+
+    plus a frozen set of NPC names per (kind, target, level), so that every query is a dictionary lookup returning a set
+    of NPC names. Sets compose with & (intersection), | (union) and - (difference), or with all_of() and any_of().
+    Usable without Qt."""
+
+    def __init__(self, npcs: Sequence[NPC]):
+        self.npcs: Dict[str, NPC] = {npc.name: npc for npc in npcs}
+        self.biomes: Dict[str, Dict[str, str]] = {}
+        self.neighbors: Dict[str, Dict[str, str]] = {}
+        self.opinions: Dict[str, Dict[str, str]] = {name: {} for name in self.npcs}
+
+        targets = {BIOME: self.biomes, NEIGHBOR: self.neighbors}
+        by_level = {}  # (kind, target, level) -> NPC names
+        by_npc_level = {}  # level -> NPC names with any preference at it
+        for npc in npcs:
+            store, start, stop = npc.preference_rows
+            for level, kind, target in store.records(start, stop):
+                index = targets.get(kind)
+                if index is None:
+                    continue
+                index.setdefault(target, {})[npc.name] = level
+                by_level.setdefault((kind, target, level), set()).add(npc.name)
+                by_npc_level.setdefault(level, set()).add(npc.name)
+                if kind == NEIGHBOR:
+                    self.opinions[npc.name][target] = level
+
+        self._by_level = {key: frozenset(names) for key, names in by_level.items()}
+        self._by_npc_level = {level: frozenset(names) for level, names in by_npc_level.items()}
+        self._by_target = {(kind, target): frozenset(likings) for kind, index in targets.items()
+                           for target, likings in index.items()}
+        self._all = frozenset(self.npcs)
+
+        # Lower case names, for the case insensitive matching of search()
+        self._lowered_targets = [(target.lower(), kind, target) for kind, target in self._by_target]
+        self._lowered_names = [(name.lower(), name) for name in self.npcs]
+
+    def __len__(self):
+        return len(self.npcs)
+
+    @property
+    def all(self) -> FrozenSet[str]:
+        """The names of every indexed NPC."""
+        return self._all
+
+    def who(self, level: Optional[str] = None, biome: Optional[str] = None,
+            neighbor: Optional[str] = None) -> FrozenSet[str]:
+        """The NPCs that have the biome (or the neighbor) at the liking level, e.g. who('Loves', biome='Hallow').
+        Without a level, the NPCs that have any preference for the target; without a target, the NPCs that have any
+        preference at the level; without either, every NPC."""
+
+        if biome is not None and neighbor is not None:
+            return self.who(level, biome=biome) & self.who(level, neighbor=neighbor)
+        kind, target = (BIOME, biome) if biome is not None else (NEIGHBOR, neighbor)
+        if target is None:
+            return self._all if level is None else self._by_npc_level.get(level, _NO_NPCS)
+        if level is None:
+            return self._by_target.get((kind, target), _NO_NPCS)
+        return self._by_level.get((kind, target, level), _NO_NPCS)
+
+    def loves(self, biome: Optional[str] = None, neighbor: Optional[str] = None) -> FrozenSet[str]:
+        return self.who('Loves', biome, neighbor)
+
+    def likes(self, biome: Optional[str] = None, neighbor: Optional[str] = None) -> FrozenSet[str]:
+        return self.who('Likes', biome, neighbor)
+
+    def dislikes(self, biome: Optional[str] = None, neighbor: Optional[str] = None) -> FrozenSet[str]:
+        return self.who('Dislikes', biome, neighbor)
+
+    def hates(self, biome: Optional[str] = None, neighbor: Optional[str] = None) -> FrozenSet[str]:
+        return self.who('Hates', biome, neighbor)
+
+    def liking(self, npc: str, biome: Optional[str] = None, neighbor: Optional[str] = None) -> Optional[str]:
+        """The liking level the NPC has for the biome (or the neighbor), None if it has no preference for it."""
+        index = self.biomes.get(biome) if biome is not None else self.neighbors.get(neighbor)
+        return index.get(npc) if index is not None else None
+
+    def mutual(self, level: str) -> List[FrozenSet[str]]:
+        """The pairs of NPCs that both have each other as a neighbor at the liking level (e.g. mutual 'Loves')."""
+
+        pairs = set()
+        for npc, opinions in self.opinions.items():
+            for neighbor, liking in opinions.items():
+                if liking == level and self.opinions.get(neighbor, {}).get(npc) == level:
+                    pairs.add(frozenset((npc, neighbor)))
+        return sorted(pairs, key=sorted)
+
+    def _targets_matching(self, text: str):
+        """The (kind, target) of every indexed biome and neighbor whose name contains the text (case insensitive)."""
+        text = text.lower()
+        return [(kind, target) for lowered, kind, target in self._lowered_targets if text in lowered]
+
+    def search(self, text: str) -> FrozenSet[str]:
+        """The NPCs matching a free text query, as typed in the tables screen's search box.
+
+        A query is made of clauses separated by commas (or 'and'), all of which must match. A clause is a target
+        (part of a biome or NPC name) optionally preceded by a liking level: 'loves hallow' matches the NPCs that love
+        the Hallow, 'hates guide, likes forest' the NPCs that hate the Guide and like the Forest. A clause with a
+        level only ('hates') matches the NPCs with any preference at that level, and a clause with a target only
+        matches the NPCs with any preference for it, as well as the NPCs whose own name contains it. An empty query
+        matches every NPC."""
+
+        levels = {level.lower(): level for level in LIKING_LEVELS}
+        results = []
+        for clause in _CLAUSES.split(text.strip()):
+            if not clause:
+                continue
+            words = clause.split(maxsplit=1)
+            level = levels.get(words[0].lower())
+            if level is None:
+                target = clause
+            else:
+                target = words[1] if len(words) > 1 else None
+
+            if target is None:
+                results.append(self.who(level))
+                continue
+
+            matching = [self.who(level, **{kind.lower(): name}) for kind, name in self._targets_matching(target)]
+            if level is None:
+                text = target.lower()
+                matching.append(frozenset(name for lowered, name in self._lowered_names if text in lowered))
+            results.append(any_of(*matching))
+
+        return all_of(*results) if results else self._all
+
+
+@last_result_cache
+def preference_index(npcs: Sequence[NPC]) -> PreferenceIndex:
+    """Return the PreferenceIndex of the passed NPCs. The result is cached, and only rebuilt when called with a
+    different set of NPCs."""
+    return PreferenceIndex(npcs)
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import zlib
+import struct
+import threading
+from array import array
+from typing import List, Optional, Sequence
+
+from terraria.npcs import NPC, PreferenceStore
+
+
+# Where the gui keeps the snapshot of its last scrape (next to the scraper's caches)
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'terraria_living_preferences',
+                                     'npcs.snapshot')
+
+SNAPSHOT_MAGIC = b'TNPCSNAP'
+SNAPSHOT_VERSION = 1  # Bump whenever the layout changes; older snapshots are then rejected as stale
+
+# magic, version, flags (unused), npc count, string count, row count, id list length, creation time (Unix),
+# payload size, CRC32 of the payload
+_HEADER = struct.Struct('<8sHHIIIIdQI')
+
+# Per NPC: name string id, has living preferences (0 / 1), start of its level and kind ids in the id list, level
+# count, kind count, start and stop of its rows
+_NPC_FIELDS = 7
+
+_INT32 = 4
+
+
+class SnapshotError(RuntimeError):
+    """A snapshot file that cannot be loaded."""
+
+
+class CorruptSnapshotError(SnapshotError):
+    """A snapshot file that is damaged: not a snapshot, truncated, or not matching its checksum."""
+
+
+class StaleSnapshotError(SnapshotError):
+    """A valid snapshot file of another layout version, written by another version of the program."""
+
+
+def _int32_array(values=()) -> array:
+    column = array('i', values)
+    if column.itemsize != _INT32:
+        raise RuntimeError('Snapshots need 32 bit C ints.')
+    return column
+
+
+def _to_file(column: array) -> bytes:
+    # Snapshots are little endian
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _from_file(data) -> array:
+    column = _int32_array()
+    column.frombytes(data)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def write_snapshot(npcs: Sequence[NPC], path: str = DEFAULT_SNAPSHOT_PATH):
+    """Write the NPCs to a snapshot file, replacing the previous one atomically.
+
+    A snapshot holds an interned string table (every level, kind, biome and NPC name once), a fixed width entry per
+    NPC, and the preference rows as three columns of 32 bit string ids (level, kind and target), the columns a
+    PreferenceStore keeps in memory. Loading one (see Snapshot) is thus a single read and a few bulk copies rather than
+    a parse of every preference."""
+
+    # Re-intern the NPCs' preferences into a store of their own, so that the snapshot holds no unrelated strings
+    store = PreferenceStore()
+    entries = []
+    for npc in npcs:
+        record = npc.record
+        start, stop, levels, kinds = store.add(record.levels or (), record.kinds, record.records)
+        entries.append((record.name, record.levels is not None, levels, kinds, start, stop))
+
+    strings = list(store.strings)
+    string_ids = {string: string_id for string_id, string in enumerate(strings)}
+    for name, *_ in entries:
+        if name not in string_ids:
+            string_ids[name] = len(strings)
+            strings.append(name)
+
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = _int32_array([0])
+    for string in encoded:
+        offsets.append(offsets[-1] + len(string))
+    blob = b''.join(encoded)
+    blob += b'\0' * (-len(blob) % _INT32)
+
+    table = _int32_array()
+    ids = _int32_array()
+    for name, has_preferences, levels, kinds, start, stop in entries:
+        table.extend((string_ids[name], has_preferences, len(ids), len(levels), len(kinds), start, stop))
+        ids.extend(levels + kinds)
+
+    payload = b''.join((_to_file(offsets), _to_file(table), _to_file(ids),
+                        *(_to_file(column) for column in (store.level_ids, store.kind_ids, store.target_ids)), blob))
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(entries), len(strings), len(store), len(ids),
+                          time.time(), len(payload), zlib.crc32(payload))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(header)
+        file.write(payload)
+    os.replace(temp_path, path)
+
+
+class Snapshot:
+    """A snapshot file written by write_snapshot(), loaded in bulk.
+
+    Opening one reads the whole file at once (its checksum covers every byte anyway) and checks its integrity: a
+    wrong magic, a truncated file or a payload that does not match its checksum raises a CorruptSnapshotError, and a
+    snapshot of another layout version a StaleSnapshotError. Nothing is decoded until it is accessed: names only
+    decodes the NPC names, and npcs() builds the NPCs over a PreferenceStore copied from the file's columns in bulk.
+    The NPCs do not depend on the snapshot, and the file is closed once read, so it can be replaced while they are
+    displayed. Close the snapshot (or use it as a context manager) to drop its contents once done."""
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._data = file.read()
+        self._check()
+        self._names = None
+        self._npcs = None
+
+    def _check(self):
+        data = self._data
+        if len(data) < _HEADER.size:
+            raise CorruptSnapshotError(f'Corrupt snapshot {self.path}: truncated header.')
+
+        magic, version, _, npc_count, string_count, row_count, id_count, created, payload_size, checksum = \
+            _HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise CorruptSnapshotError(f'Corrupt snapshot {self.path}: not a snapshot file.')
+        if version != SNAPSHOT_VERSION:
+            raise StaleSnapshotError(f'Stale snapshot {self.path}: version {version}, expected {SNAPSHOT_VERSION}.')
+        if len(data) != _HEADER.size + payload_size:
+            raise CorruptSnapshotError(f'Corrupt snapshot {self.path}: {len(data) - _HEADER.size} payload bytes, '
+                                       f'expected {payload_size}.')
+        if zlib.crc32(memoryview(data)[_HEADER.size:]) != checksum:
+            raise CorruptSnapshotError(f'Corrupt snapshot {self.path}: checksum mismatch.')
+
+        self.npc_count = npc_count
+        self.row_count = row_count
+        self.created = created  # Unix time
+
+        # Section offsets, in int32 units from the start of the payload
+        sections = {}
+        position = 0
+        for section, length in (('offsets', string_count + 1), ('table', npc_count * _NPC_FIELDS), ('ids', id_count),
+                                ('level_ids', row_count), ('kind_ids', row_count), ('target_ids', row_count)):
+            sections[section] = (position, position + length)
+            position += length
+        self._sections = sections
+        self._blob_start = _HEADER.size + position * _INT32
+        if self._blob_start > len(data):
+            raise CorruptSnapshotError(f'Corrupt snapshot {self.path}: sections overrun the file.')
+
+    def __len__(self):
+        return self.npc_count
+
+    def age(self) -> float:
+        """Seconds since the snapshot was written."""
+        return time.time() - self.created
+
+    def is_stale(self, max_age: float) -> bool:
+        """Whether the snapshot was written more than max_age seconds ago."""
+        return self.age() > max_age
+
+    def _column(self, section: str) -> array:
+        start, stop = self._sections[section]
+        return _from_file(memoryview(self._data)[_HEADER.size + start * _INT32:_HEADER.size + stop * _INT32])
+
+    def _strings(self, offsets: array, string_ids) -> List[str]:
+        data = self._data
+        blob = self._blob_start
+        return [str(data[blob + offsets[i]:blob + offsets[i + 1]], 'utf-8') for i in string_ids]
+
+    @property
+    def names(self) -> List[str]:
+        """The names of the NPCs, in the order they were written (decoding nothing else)."""
+        if self._names is None:
+            table = self._column('table')
+            self._names = self._strings(self._column('offsets'), table[0::_NPC_FIELDS])
+        return self._names
+
+    def npcs(self) -> List[NPC]:
+        """Build the NPCs of the snapshot, over a new PreferenceStore holding its rows."""
+
+        if self._npcs is not None:
+            return self._npcs
+
+        offsets = self._column('offsets')
+        strings = self._strings(offsets, range(len(offsets) - 1))
+        table = self._column('table')
+        ids = self._column('ids')
+
+        # The NPC of each row follows from the row ranges of the NPCs, so it is not stored
+        npc_ids = _int32_array()
+        for npc_id, i in enumerate(range(0, len(table), _NPC_FIELDS)):
+            npc_ids.extend(array('i', (npc_id,)) * (table[i + 6] - table[i + 5]))
+        store = PreferenceStore.from_columns(strings, npc_ids, *(self._column(section) for section in
+                                                                 ('level_ids', 'kind_ids', 'target_ids')),
+                                             npc_count=self.npc_count)
+
+        npcs = []
+        for i in range(0, len(table), _NPC_FIELDS):
+            name_id, has_preferences, ids_start, level_count, kind_count, start, stop = table[i:i + _NPC_FIELDS]
+            levels = tuple(ids[ids_start:ids_start + level_count]) if has_preferences else None
+            kinds = tuple(ids[ids_start + level_count:ids_start + level_count + kind_count])
+            npcs.append(NPC.from_rows(strings[name_id], store, start, stop, levels, kinds))
+        self._npcs = npcs
+        return npcs
+
+    def close(self):
+        self._data = b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def load_snapshot(path: str = DEFAULT_SNAPSHOT_PATH) -> Optional[List[NPC]]:
+    """Return the NPCs of the snapshot file, or None if there is none. Raises a CorruptSnapshotError or a
+    StaleSnapshotError (both SnapshotErrors) if it is corrupt or stale."""
+
+    if not os.path.exists(path):
+        return None
+    with Snapshot(path) as snapshot:
+        return snapshot.npcs()
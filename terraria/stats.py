@@ -0,0 +1,197 @@
+from collections import Counter
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from terraria.npcs import NPC
+from terraria.caching import last_result_cache
+
+
+# Liking levels as small integer codes (0 means no preference)
+LIKING_CODES = {'Loves': 2, 'Likes': 1, 'Dislikes': -1, 'Hates': -2}
+
+
+class PreferenceStats:
+    """Shared statistics of the living preferences of a set of NPCs.
+
+    The preferences are gathered in one vectorized pass over the NPCs' rows in their PreferenceStore into two incidence
+    matrices of liking codes: NPC x biome and NPC x neighbor. Every statistic is then a vectorized reduction over these
+    matrices. Usable without Qt."""
+
+    def __init__(self, npcs: Sequence[NPC]):
+        self.npc_names: List[str] = [npc.name for npc in npcs]
+        self.biomes: List[str] = []  # Biome column names, in order of first appearance
+        self.neighbors: List[str] = []  # Neighbor column names, in order of first appearance
+
+        columns = {'Biome': ({}, self.biomes, ([], [], [])), 'Neighbor': ({}, self.neighbors, ([], [], []))}
+
+        # Group the row ranges of the NPCs by the store that holds them (normally all NPCs share one store)
+        ranges = {}
+        for row, npc in enumerate(npcs):
+            store, start, stop = npc.preference_rows
+            if stop > start:
+                ranges.setdefault(id(store), (store, []))[1].append((row, start, stop))
+
+        for store, store_ranges in ranges.values():
+            strings, level_ids, kind_ids, target_ids = store.columns()
+            rows, starts, stops = (np.array(values, dtype=np.intp) for values in zip(*store_ranges))
+
+            # Indices of all rows of all NPCs, and the NPC (matrix row) each of them belongs to
+            lengths = stops - starts
+            offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            indices = np.arange(lengths.sum()) - offsets + np.repeat(starts, lengths)
+            npc_rows = np.repeat(rows, lengths)
+
+            # Translate the level string ids into liking codes in one lookup
+            level_codes = np.array([LIKING_CODES.get(string, 0) for string in strings], dtype=np.int8)
+            codes = level_codes[level_ids[indices]]
+            kinds = kind_ids[indices]
+            targets = target_ids[indices]
+
+            for kind, (ids, names, entries) in columns.items():
+                if kind not in strings:
+                    continue
+                selected = (kinds == strings.index(kind)) & (codes != 0)
+
+                # Map the target string ids to matrix columns, in order of first appearance
+                unique, first = np.unique(targets[selected], return_index=True)
+                lookup = np.zeros(len(strings), dtype=np.intp)
+                for target in unique[np.argsort(first)]:
+                    name = strings[target]
+                    if name not in ids:
+                        ids[name] = len(names)
+                        names.append(name)
+                    lookup[target] = ids[name]
+
+                entries[0].append(npc_rows[selected])
+                entries[1].append(lookup[targets[selected]])
+                entries[2].append(codes[selected])
+
+        # The non-zero entries of the incidence matrices, as (npc rows, target columns, liking codes) arrays. The
+        # counts are reduced from these, so that they don't scale with the size of the dense matrices.
+        self._entries = {kind: tuple(np.concatenate(values) if values else np.zeros(0, dtype=np.intp)
+                                     for values in entries) for kind, (_, _, entries) in columns.items()}
+
+        # [npc, biome] and [npc, neighbor] matrices of liking codes
+        self.biome_matrix = self._incidence(len(self.biomes), self._entries['Biome'])
+        self.neighbor_matrix = self._incidence(len(self.neighbors), self._entries['Neighbor'])
+
+    def _incidence(self, columns: int, entries) -> np.ndarray:
+        matrix = np.zeros((len(self.npc_names), columns), dtype=np.int8)
+        matrix[entries[0], entries[1]] = entries[2]
+        return matrix
+
+    @staticmethod
+    def _counts(columns: np.ndarray, names: List[str]) -> Dict[str, int]:
+        """Count the occurrences of each column into a name -> count mapping, ordered by descending count."""
+        counts = np.bincount(columns, minlength=len(names))
+        return {names[j]: int(counts[j]) for j in np.argsort(-counts, kind='stable') if counts[j]}
+
+    def _extreme_counts(self, kind: str, favorite: bool) -> Dict[str, int]:
+        """Count how many NPCs have each target at their most liked (or least liked) listed level. NPCs without any
+        listed target are counted as 'N/A'."""
+
+        rows, columns, codes = self._entries[kind]
+        extreme = np.full(len(self.npc_names), -128 if favorite else 127, dtype=np.int8)
+        (np.maximum if favorite else np.minimum).at(extreme, rows, codes)  # Most / least liked level per NPC
+        counts = self._counts(columns[codes == extreme[rows]], self.biomes if kind == 'Biome' else self.neighbors)
+
+        missing = len(self.npc_names) - len(np.unique(rows))
+        if missing:
+            counts[NPC.not_available] = missing
+        return counts
+
+    @property
+    def favorite_biome_counts(self) -> Dict[str, int]:
+        return self._extreme_counts('Biome', favorite=True)
+
+    @property
+    def least_favorite_biome_counts(self) -> Dict[str, int]:
+        return self._extreme_counts('Biome', favorite=False)
+
+    @property
+    def favorite_neighbor_counts(self) -> Dict[str, int]:
+        return self._extreme_counts('Neighbor', favorite=True)
+
+    @property
+    def least_favorite_neighbor_counts(self) -> Dict[str, int]:
+        return self._extreme_counts('Neighbor', favorite=False)
+
+    def biome_counts(self, level: str) -> Dict[str, int]:
+        """Count how many NPCs have each biome at the passed liking level."""
+        _, columns, codes = self._entries['Biome']
+        return self._counts(columns[codes == LIKING_CODES[level]], self.biomes)
+
+    def neighbor_counts(self, level: str) -> Dict[str, int]:
+        """Count how many NPCs have each neighbor at the passed liking level."""
+        _, columns, codes = self._entries['Neighbor']
+        return self._counts(columns[codes == LIKING_CODES[level]], self.neighbors)
+
+    @property
+    def affinity_matrix(self) -> np.ndarray:
+        """NPC x NPC matrix of liking codes: [i, j] is how NPC i feels about NPC j as a neighbor."""
+
+        columns = {name: j for j, name in enumerate(self.neighbors)}
+        affinity = np.zeros((len(self.npc_names), len(self.npc_names)), dtype=np.int8)
+        known = [(i, columns[name]) for i, name in enumerate(self.npc_names) if name in columns]
+        if known:
+            rows, cols = np.array(known).T
+            affinity[:, rows] = self.neighbor_matrix[:, cols]
+        return affinity
+
+    @property
+    def mutual_affinity_matrix(self) -> np.ndarray:
+        """Symmetric NPC x NPC matrix: the sum of the liking codes two NPCs have for each other."""
+        affinity = self.affinity_matrix.astype(np.int16)
+        return affinity + affinity.T
+
+    @property
+    def biome_npc_matrix(self) -> np.ndarray:
+        """Biome x NPC matrix of liking codes."""
+        return self.biome_matrix.T
+
+
+class PreferenceCounts:
+    """The favorite and least favorite biome and neighbor counts of a growing set of NPCs (e.g. while they are being
+    scraped), with the same properties as PreferenceStats.
+
+    Which targets an NPC is counted for only depends on its own preferences, so the counts of a set of NPCs are the
+    sums of the counts of its parts: add() only computes the PreferenceStats of the new NPCs, and adds their counts to
+    the running totals. Its cost is thus proportional to the new NPCs, not to all the NPCs added so far."""
+
+    def __init__(self):
+        self._totals = {'favorite_biome_counts': Counter(), 'least_favorite_biome_counts': Counter(),
+                        'favorite_neighbor_counts': Counter(), 'least_favorite_neighbor_counts': Counter()}
+
+    def add(self, npcs: Sequence[NPC]):
+        if not npcs:
+            return
+        stats = PreferenceStats(npcs)
+        for name, totals in self._totals.items():
+            totals.update(getattr(stats, name))
+
+    def _counts(self, name: str) -> Dict[str, int]:
+        return dict(self._totals[name].most_common())  # By descending count, ties in order of first appearance
+
+    @property
+    def favorite_biome_counts(self) -> Dict[str, int]:
+        return self._counts('favorite_biome_counts')
+
+    @property
+    def least_favorite_biome_counts(self) -> Dict[str, int]:
+        return self._counts('least_favorite_biome_counts')
+
+    @property
+    def favorite_neighbor_counts(self) -> Dict[str, int]:
+        return self._counts('favorite_neighbor_counts')
+
+    @property
+    def least_favorite_neighbor_counts(self) -> Dict[str, int]:
+        return self._counts('least_favorite_neighbor_counts')
+
+
+@last_result_cache
+def preference_stats(npcs: Sequence[NPC]) -> PreferenceStats:
+    """Return the PreferenceStats of the passed NPCs. The result is cached, and only recomputed when called with a
+    different set of NPCs."""
+    return PreferenceStats(npcs)